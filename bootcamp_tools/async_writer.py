@@ -0,0 +1,135 @@
+# Batched CSV writer for the websocket recorders
+#
+# liqs.py, big_liqs.py and recent_trades.py used to open the CSV and write one
+# line per websocket message inside the event loop, so every message paid for
+# blocking disk I/O before the next recv(). BatchWriter.write only puts the
+# line on a queue; a background thread appends the lines in batches, once
+# `max_batch` lines are waiting or `max_delay_s` has passed, to one file per
+# UTC day of each line's timestamp. Whatever is queued is written when the
+# writer is closed, including at interpreter exit. A failed write is logged
+# and raised again from close().
+
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+stop = object()  # Queued by close() to tell the thread to finish
+
+class BatchWriter:
+    """Append CSV lines from the event loop without blocking it.
+
+    With `rotate_daily`, 'binance.csv' becomes 'binance_2024-07-19.csv': each
+    line goes to the file of the UTC day of its timestamp, which starts with
+    `header`. If appending a batch fails, the error is logged, its lines are
+    counted in `failed` and close() raises it once the rest is written.
+    """
+
+    def __init__(self, filename, header, max_batch=500, max_delay_s=1.0, rotate_daily=True):
+        self.filename = filename
+        self.header = header
+        self.max_batch = max_batch
+        self.max_delay_s = max_delay_s
+        self.rotate_daily = rotate_daily
+        self.queue = queue.SimpleQueue()
+        self.lines = 0
+        self.batches = 0
+        self.failed = 0
+        self.error = None
+        self.closed = False
+        self.thread = threading.Thread(target=self.run, name=f'writer {filename}', daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def write(self, line, timestamp_ms=None):
+        """Queue one line (ending in a newline) to be appended; never blocks.
+
+        `timestamp_ms` picks the day file, e.g. the event's exchange time; it
+        defaults to now. Raises RuntimeError if the writer thread has stopped.
+        """
+        if not self.thread.is_alive():
+            raise RuntimeError(f'{self.thread.name} has stopped') from self.error
+        self.queue.put((int(time.time() * 1000) if timestamp_ms is None else timestamp_ms, line))
+
+    def day_filename(self, timestamp_ms=None):
+        """Return the file lines with this millisecond timestamp (default now) go to."""
+        if not self.rotate_daily:
+            return self.filename
+        root, ext = os.path.splitext(self.filename)
+        now = None if timestamp_ms is None else timestamp_ms // 1000
+        return f"{root}_{time.strftime('%Y-%m-%d', time.gmtime(now))}{ext}"
+
+    def flush_batch(self, batch):
+        """Append a batch of (timestamp_ms, line) items in queued order, with one write per day file."""
+        days = {}
+        for timestamp_ms, line in batch:
+            days.setdefault(timestamp_ms // 86_400_000, []).append(line)
+        for day, lines in days.items():
+            filename = self.day_filename(day * 86_400_000)
+            try:
+                is_new = not os.path.isfile(filename) or os.path.getsize(filename) == 0
+                with open(filename, 'a') as f:
+                    if is_new:
+                        f.write(self.header)
+                    f.write(''.join(lines))
+            except Exception as e:
+                logger.exception('Could not append %d lines to %s', len(lines), filename)
+                self.failed += len(lines)
+                self.error = self.error or e
+                continue
+            self.lines += len(lines)
+        self.batches += 1
+
+    def run(self):
+        """Background thread: collect lines into batches and flush them on size or age."""
+        try:
+            self.collect()
+        except BaseException as e:
+            logger.exception('%s stopped', self.thread.name)
+            self.error = self.error or e
+
+    def collect(self):
+        """Take queued lines until close(), flushing a batch once it is full or old enough."""
+        batch = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            if item is stop:
+                if batch:
+                    self.flush_batch(batch)
+                return
+            if item is not None:
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.max_delay_s
+            if batch and (len(batch) >= self.max_batch or time.monotonic() >= deadline):
+                self.flush_batch(batch)
+                batch = []
+                deadline = None
+
+    def close(self):
+        """Write everything still queued and stop the thread. Safe to call more than once.
+
+        Raises RuntimeError if any line could not be written.
+        """
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.put(stop)
+        self.thread.join()
+        atexit.unregister(self.close)
+        if self.error is not None:
+            raise RuntimeError(f'{self.thread.name} failed, {self.failed} lines were not written') from self.error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
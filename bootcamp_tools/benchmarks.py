@@ -0,0 +1,454 @@
+# Offline benchmarks for the websocket recorders
+#
+# Seeded synthetic Binance payloads are fed straight into the message
+# handlers of liqs.py, big_liqs.py and recent_trades.py, so no network is
+# needed. Console output is discarded and files go to a temporary folder.
+# --decode times message decoding alone, before and after decode.py.
+# --multiplex reads many streams from a local fake_binance server, over one
+# connection per stream and through multiplex.py. --aggregator replays trades
+# second by second into huge_trades' aggregator, before and after the time wheel.
+# --funding reads markPrice streams the way funding.py did, with a lock held
+# across recv(), and through its queue. --check-writer checks BatchWriter's
+# day files and error reporting, --check-aggregator huge_trades' late trades.
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import pytz
+from websockets import connect
+
+import big_liqs
+import decode
+import huge_trades
+import liqs
+import recent_trades
+from async_writer import BatchWriter
+from fake_binance import FakeStreamServer
+from multiplex import StreamMultiplexer
+
+default_messages = 50_000
+default_streams = 300  # About the size of the USDT-M perpetual universe
+default_seconds = 900
+symbols = ['BTCUSDT', 'ETHUSDT', 'SOLUSDT', 'BNBUSDT', 'DOGEUSDT', 'WIFUSDT', '1000PEPEUSDT', 'ORDIUSDT']
+
+def synthetic_force_orders(n, seed=42, start_ms=1721385425559):
+    """Return n forceOrder messages shaped like the !forceOrder@arr stream."""
+    rng = np.random.default_rng(seed)
+    prices = rng.lognormal(3, 2, n)
+    quantities = rng.lognormal(6, 2, n) / prices
+    messages = []
+    for k in range(n):
+        symbol = symbols[k % len(symbols)]
+        trade_time = start_ms + k * 50
+        messages.append(json.dumps({'e': 'forceOrder', 'E': trade_time + 3, 'o': {
+            's': symbol, 'S': 'SELL' if k % 3 else 'BUY', 'o': 'LIMIT', 'f': 'IOC',
+            'q': f'{quantities[k]:.3f}', 'p': f'{prices[k]:.4f}', 'ap': f'{prices[k] * 1.001:.4f}', 'X': 'FILLED',
+            'l': f'{quantities[k]:.3f}', 'z': f'{quantities[k]:.3f}', 'T': trade_time}}))
+    return messages
+
+def synthetic_agg_trades(n, seed=42, start_ms=1721384299251):
+    """Return n aggTrade messages shaped like the <symbol>@aggTrade streams."""
+    rng = np.random.default_rng(seed)
+    prices = rng.lognormal(3, 2, n)
+    quantities = rng.lognormal(8, 2, n) / prices
+    messages = []
+    for k in range(n):
+        symbol = symbols[k % len(symbols)]
+        trade_time = start_ms + k * 5
+        messages.append(json.dumps({
+            'e': 'aggTrade', 'E': trade_time + 2, 's': symbol, 'a': 733222201 + k, 'p': f'{prices[k]:.4f}',
+            'q': f'{quantities[k]:.3f}', 'f': 1000 + 2 * k, 'l': 1001 + 2 * k, 'T': trade_time,
+            'm': bool(k % 2), 'M': True}))
+    return messages
+
+def synthetic_mark_prices(n, seed=42, start_ms=1721384299000):
+    """Return n markPrice messages shaped like the <symbol>@markPrice streams."""
+    rng = np.random.default_rng(seed)
+    prices = rng.lognormal(3, 2, n)
+    rates = rng.normal(0.0001, 0.0002, n)
+    return [json.dumps({
+        'e': 'markPriceUpdate', 'E': start_ms + k * 1000, 's': symbols[k % len(symbols)], 'p': f'{prices[k]:.8f}',
+        'i': f'{prices[k] * 0.999:.8f}', 'P': f'{prices[k] * 1.001:.8f}', 'r': f'{rates[k]:.8f}',
+        'T': start_ms + 28_800_000}) for k in range(n)]
+
+# The per-message work the handlers did before decode.py, without the printing and file writes
+def legacy_force_order(msg):
+    order_data = json.loads(msg)['o']
+    symbol = order_data['s'].replace('USDT', '')
+    side = order_data['S']
+    timestamp = int(order_data['T'])
+    filled_quantity = float(order_data['z'])
+    price = float(order_data['p'])
+    usd_size = filled_quantity * price
+    est = pytz.timezone("US/Eastern")
+    time_est = datetime.fromtimestamp(timestamp / 1000, est).strftime('%H:%M:%S')
+    msg_values = [str(order_data.get(key)) for key in ['s', 'S', 'o', 'f', 'q', 'p', 'ap', 'X', 'l', 'z', 'T']]
+    msg_values.append(str(usd_size))
+    trade_info = ','.join(msg_values) + '\n'
+    return trade_info.replace('USDT', '')
+
+def legacy_agg_trade(message):
+    data = json.loads(message)
+    event_time = int(data['E'])
+    agg_trade_id = data['a']
+    price = float(data['p'])
+    quantity = float(data['q'])
+    trade_time = int(data['T'])
+    is_buyer_maker = data['m']
+    est = pytz.timezone('US/Eastern')
+    readable_trade_time = datetime.fromtimestamp(trade_time / 1000, est).strftime('%H:%M:%S')
+    usd_size = price * quantity
+    display_symbol = data['s'].replace('USDT', '')
+    return f"{event_time}, {data['s']},{agg_trade_id},{price},{quantity},{trade_time},{is_buyer_maker}\n"
+
+def legacy_mark_price(message):
+    data = json.loads(message)
+    event_time = datetime.fromtimestamp(data['E'] / 1000).strftime("%H:%M:%S")
+    symbol_display = data['s'].replace('USDT', '')
+    funding_rate = float(data['r'])
+    return (funding_rate * 3 * 365) * 100
+
+# The same work with decode.py: times are only formatted for the lines a handler would print
+def record_force_order(msg):
+    order = decode.decode_force_order(msg)
+    if order.usd_size > 3000:
+        order.eastern_time()
+    return order.csv_line()
+
+def record_agg_trade(message):
+    trade = decode.decode_agg_trade(message)
+    if trade.usd_size > 14999:
+        trade.eastern_time()
+    return trade.csv_line()
+
+def record_mark_price(message):
+    return decode.decode_mark_price(message).yearly_funding_rate
+
+def time_per_message(func, messages, repeat=3):
+    """Return the best time per message, in nanoseconds, of calling func on every message."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for message in messages:
+            func(message)
+        best = min(best, time.perf_counter() - start)
+    return best / len(messages) * 1e9
+
+def bench_decode(n_messages):
+    """Print the per-message cost of the old decoding and of decode.py, with each JSON parser available."""
+    cases = [
+        ('forceOrder', synthetic_force_orders(n_messages), legacy_force_order, record_force_order),
+        ('aggTrade', synthetic_agg_trades(n_messages), legacy_agg_trade, record_agg_trade),
+        ('markPrice', synthetic_mark_prices(n_messages), legacy_mark_price, record_mark_price),
+    ]
+    parsers = [('json', json.loads)]
+    if decode.loads is not json.loads:
+        parsers.append(('orjson', decode.loads))
+    fast_loads = decode.loads
+    print(f"{'message':<12} {'decoder':<16} {'ns/msg':>10} {'speedup':>9}")
+    try:
+        for name, messages, legacy, record in cases:
+            # Both paths must produce the same output before their speed is compared
+            assert [legacy(m) for m in messages[:1000]] == [record(m) for m in messages[:1000]]
+            before = time_per_message(legacy, messages)
+            print(f"{name:<12} {'before':<16} {before:>10.0f} {'':>9}")
+            for parser_name, loads in parsers:
+                decode.loads = loads
+                after = time_per_message(record, messages)
+                print(f"{name:<12} {'decode/' + parser_name:<16} {after:>10.0f} {before / after:>8.1f}x")
+    finally:
+        decode.loads = fast_loads
+
+class AppendWriter:
+    """The recorders' previous behaviour: open the file, append one line and close it, per message."""
+
+    def __init__(self, filename, header):
+        self.filename = filename
+        with open(filename, 'w') as f:
+            f.write(header)
+
+    def write(self, line, timestamp_ms=None):
+        with open(self.filename, 'a') as f:
+            f.write(line)
+
+    def close(self):
+        pass
+
+class NullWriter:
+    """Discard every line, as an upper bound on handler throughput."""
+
+    def __init__(self, filename, header):
+        pass
+
+    def write(self, line, timestamp_ms=None):
+        pass
+
+    def close(self):
+        pass
+
+writers = {'append': AppendWriter, 'batch': BatchWriter, 'none': NullWriter}
+
+def handle_agg_trade(message, writer):
+    """recent_trades' handler, given the decoded trade as the multiplexer does."""
+    recent_trades.handle_trade(decode.decode_agg_trade(message), writer)
+
+def run_handler(handle, messages, writer):
+    """Feed every message to the handler; return (seconds, slowest message in seconds)."""
+    slowest = 0.0
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for args in messages:
+            before = time.perf_counter()
+            handle(*args, writer)
+            slowest = max(slowest, time.perf_counter() - before)
+    return time.perf_counter() - start, slowest
+
+def bench_writers(n_messages):
+    """Print messages/sec for each recorder's handler with each writer."""
+    force_orders = [(msg,) for msg in synthetic_force_orders(n_messages)]
+    agg_trades = [(msg,) for msg in synthetic_agg_trades(n_messages)]
+    handlers = [
+        ('liqs', liqs.handle_liquidation, force_orders, liqs.header),
+        ('big_liqs', big_liqs.handle_liquidation, force_orders, big_liqs.header),
+        ('recent_trades', handle_agg_trade, agg_trades, recent_trades.header),
+    ]
+    print(f"{'recorder':<14} {'writer':<8} {'msgs/s':>10} {'slowest (ms)':>13} {'lines':>8}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name, handle, messages, header in handlers:
+            for writer_name, writer_class in writers.items():
+                filename = os.path.join(tmp_dir, f'{name}_{writer_name}.csv')
+                writer = writer_class(filename, header)
+                seconds, slowest = run_handler(handle, messages, writer)
+                writer.close()  # Not timed: the batch writer flushes off the event loop
+                lines = sum(sum(1 for _ in open(os.path.join(tmp_dir, f))) - 1
+                            for f in os.listdir(tmp_dir) if f.startswith(f'{name}_{writer_name}'))
+                print(f'{name:<14} {writer_name:<8} {len(messages) / seconds:>10.0f} {slowest * 1000:>13.2f} {lines:>8}')
+
+async def time_streams(n_streams, messages_per_stream, multiplexed):
+    """Return (seconds, connections) to receive and decode every message of n_streams aggTrade streams."""
+    streams = [f'sym{k:03d}usdt@aggTrade' for k in range(n_streams)]
+    expected = n_streams * messages_per_stream
+    received = 0
+    done = asyncio.Event()
+
+    def count(trade):
+        nonlocal received
+        received += 1
+        if received == expected:
+            done.set()
+
+    async def one_stream(url):
+        # The scripts' previous loop: one connection and one task per symbol
+        async with connect(url) as websocket:
+            while True:
+                count(decode.decode_agg_trade(await websocket.recv()))
+
+    async with FakeStreamServer(messages_per_stream) as server:
+        start = time.perf_counter()
+        if multiplexed:
+            mux = StreamMultiplexer(server.combined_url)
+            for stream in streams:
+                mux.subscribe(stream, count)
+            task = asyncio.ensure_future(mux.run())
+        else:
+            task = asyncio.gather(*(one_stream(server.raw_url + stream) for stream in streams))
+        await done.wait()
+        seconds = time.perf_counter() - start
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+        return seconds, server.connections
+
+async def time_funding(n_streams, messages_per_stream, fan_in, timeout_s=10.0):
+    """Return (seconds, messages taken) for funding.py's readers on n_streams markPrice streams.
+
+    Gives up after timeout_s: a reader holding the lock on a socket with
+    nothing left to send stalls every other socket.
+    """
+    streams = [f'sym{k:03d}usdt@markPrice' for k in range(n_streams)]
+    expected = n_streams * messages_per_stream
+    received = 0
+    done = asyncio.Event()
+
+    def count(mark):
+        nonlocal received
+        received += 1
+        if received == expected:
+            done.set()
+
+    async def locked_stream(url, lock):
+        # The previous funding.py: each symbol's socket is read only while holding the shared print lock
+        async with connect(url) as websocket:
+            while True:
+                async with lock:
+                    count(decode.decode_mark_price(await websocket.recv()))
+
+    async with FakeStreamServer(messages_per_stream) as server:
+        start = time.perf_counter()
+        if fan_in:
+            queue = asyncio.Queue()
+            mux = StreamMultiplexer(server.combined_url)
+            for stream in streams:
+                mux.subscribe(stream, queue.put_nowait)
+
+            async def consume():
+                while True:
+                    count(await queue.get())
+            task = asyncio.gather(mux.run(), consume())
+        else:
+            lock = asyncio.Lock()
+            task = asyncio.gather(*(locked_stream(server.raw_url + stream, lock) for stream in streams))
+        with contextlib.suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(done.wait(), timeout_s)
+        seconds = time.perf_counter() - start
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+        return seconds, received
+
+def bench_funding(n_streams, messages_per_stream):
+    """Print messages/sec for funding.py's readers, locked per socket and fanned in to one queue."""
+    print(f"{'reader':<14} {'streams':>8} {'seconds':>8} {'received':>10} {'msgs/s':>10}")
+    for name, fan_in in [('locked recv', False), ('queue fan-in', True)]:
+        seconds, received = asyncio.run(time_funding(n_streams, messages_per_stream, fan_in))
+        print(f'{name:<14} {n_streams:>8} {seconds:>8.2f} {received:>10} {received / seconds:>10.0f}')
+
+def bench_multiplex(n_streams, messages_per_stream):
+    """Print messages/sec reading n_streams streams per connection and multiplexed."""
+    print(f"{'reader':<14} {'streams':>8} {'connections':>12} {'seconds':>8} {'msgs/s':>10}")
+    for name, multiplexed in [('per-stream', False), ('multiplexed', True)]:
+        seconds, connections = asyncio.run(time_streams(n_streams, messages_per_stream, multiplexed))
+        print(f'{name:<14} {n_streams:>8} {connections:>12} {seconds:>8.2f} '
+              f'{n_streams * messages_per_stream / seconds:>10.0f}')
+
+class LegacyTradeAggregator:
+    """huge_trades.TradeAggregator before the time wheel, without the printing."""
+
+    def __init__(self):
+        self.trade_buckets = {}
+
+    def add_trade(self, symbol, second, usd_size, is_buyer_maker):
+        trade_key = (symbol, second, is_buyer_maker)
+        self.trade_buckets[trade_key] = self.trade_buckets.get(trade_key, 0) + usd_size
+
+    def check_and_print_trades(self, now):
+        timestamp_now = decode.eastern_second(now)
+        deletetions = [trade_key for trade_key, usd_size in self.trade_buckets.items()
+                       if trade_key[1] < timestamp_now and usd_size > 500000]
+        for key in deletetions:
+            del self.trade_buckets[key]
+
+    def __len__(self):
+        return len(self.trade_buckets)
+
+def bench_aggregator(n_seconds, n_streams, trades_per_second=200, seed=42):
+    """Print the cost per trade and the buckets held after n_seconds of trades on n_streams symbols."""
+    rng = np.random.default_rng(seed)
+    names = [f'SYM{k:03d}' for k in range(n_streams)]
+    start_second = 1721433600
+    seconds = []
+    for k in range(n_seconds):
+        second = start_second + k
+        picks = rng.integers(0, n_streams, trades_per_second).tolist()
+        sizes = rng.lognormal(9, 2, trades_per_second).tolist()
+        sides = (rng.random(trades_per_second) < 0.5).tolist()
+        seconds.append((second, list(zip(picks, sizes, sides))))
+    cases = [
+        # The old keys were Eastern 'HH:MM:SS' strings, formatted for every trade
+        ('before', LegacyTradeAggregator(), decode.eastern_second),
+        ('time wheel', huge_trades.TradeAggregator(), int),
+    ]
+    print(f"{'aggregator':<12} {'seconds':>8} {'trades':>10} {'ns/trade':>10} {'buckets held':>13}")
+    for name, aggregator, key in cases:
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            for second, trades in seconds:
+                label = key(second)
+                for pick, usd_size, is_buyer_maker in trades:
+                    aggregator.add_trade(names[pick], label, usd_size, is_buyer_maker)
+                aggregator.check_and_print_trades(second + 1)
+        n_trades = n_seconds * trades_per_second
+        elapsed = time.perf_counter() - start
+        print(f'{name:<12} {n_seconds:>8} {n_trades:>10} {elapsed / n_trades * 1e9:>10.0f} {len(aggregator):>13}')
+
+def check_aggregator():
+    """Assert huge_trades closes seconds on the exchange's event times and reports the trades it drops."""
+    start_ms = 1721433600000  # Hours behind the local clock, as a badly skewed one would be
+    aggregator = huge_trades.TradeAggregator(delay_s=1)
+    with contextlib.redirect_stdout(io.StringIO()) as output:
+        for k in range(3):
+            aggregator.add_trade('BTC', start_ms // 1000 + k, 400000, False, start_ms + k * 1000 + 50)
+            aggregator.add_trade('BTC', start_ms // 1000 + k, 400000, False, start_ms + k * 1000 + 900)
+            aggregator.check_and_print_trades()
+    assert aggregator.late == 0 and output.getvalue().count('BUY BTC') == 1, (aggregator.late, output.getvalue())
+    aggregator.add_trade('BTC', start_ms // 1000, 1000, False, start_ms + 2950)
+    with contextlib.redirect_stdout(io.StringIO()):
+        aggregator.check_and_print_trades()
+    assert aggregator.late == 1 and aggregator.late_logged == 1
+    print('TradeAggregator: seconds close on exchange time, and late trades are counted and logged')
+
+def check_writer():
+    """Assert BatchWriter files each line by its own timestamp and raises write errors on close()."""
+    midnight_ms = 1721433600000  # 2024-07-20 00:00 UTC
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        filename = os.path.join(tmp_dir, 'trades.csv')
+        # One batch straddling midnight, queued after it: each line still lands in its own day's file
+        with BatchWriter(filename, 'header\n', max_delay_s=60) as writer:
+            for k in range(-3, 3):
+                writer.write(f'{k}\n', midnight_ms + k * 1000)
+        for day, lines in [('2024-07-19', '-3\n-2\n-1\n'), ('2024-07-20', '0\n1\n2\n')]:
+            with open(os.path.join(tmp_dir, f'trades_{day}.csv')) as f:
+                assert f.read() == 'header\n' + lines, day
+        assert writer.batches == 1 and writer.lines == 6
+
+        writer = BatchWriter(os.path.join(tmp_dir, 'missing', 'trades.csv'), 'header\n')
+        writer.write('0\n', midnight_ms)
+        try:
+            writer.close()
+        except RuntimeError as e:
+            assert isinstance(e.__cause__, OSError) and writer.failed == 1
+        else:
+            raise AssertionError('a failed write was not reported by close()')
+    print('BatchWriter: lines go to the file of their own day, and a failed write is raised by close()')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the websocket recorders offline.')
+    parser.add_argument('--messages', type=int, default=default_messages)
+    parser.add_argument('--decode', action='store_true',
+                        help='Time message decoding before and after decode.py instead of the writers')
+    parser.add_argument('--multiplex', action='store_true',
+                        help='Read --streams streams from a local server, per stream and multiplexed')
+    parser.add_argument('--streams', type=int, default=default_streams)
+    parser.add_argument('--aggregator', action='store_true',
+                        help="Replay --seconds of trades on --streams symbols into huge_trades' aggregator")
+    parser.add_argument('--seconds', type=int, default=default_seconds)
+    parser.add_argument('--funding', action='store_true',
+                        help='Read --streams markPrice streams as funding.py did and through its queue')
+    parser.add_argument('--check-aggregator', action='store_true',
+                        help='Check huge_trades closes seconds on exchange time and reports late trades instead')
+    parser.add_argument('--check-writer', action='store_true',
+                        help="Check BatchWriter's day files and error reporting instead")
+    args = parser.parse_args()
+
+    if args.check_aggregator:
+        check_aggregator()
+    elif args.check_writer:
+        check_writer()
+    elif args.decode:
+        bench_decode(args.messages)
+    elif args.aggregator:
+        bench_aggregator(args.seconds, args.streams)
+    elif args.funding:
+        bench_funding(args.streams, max(args.messages // args.streams, 1))
+    elif args.multiplex:
+        bench_multiplex(args.streams, max(args.messages // args.streams, 1))
+    else:
+        bench_writers(args.messages)
@@ -0,0 +1,104 @@
+# Local stand-in for the Binance futures websocket endpoints
+#
+# FakeStreamServer listens on localhost and answers both URL styles the
+# tools use: /ws/<stream> sends bare payloads and /stream?streams=a/b sends
+# {'stream': ..., 'data': ...} envelopes, like fstream.binance.com. Payloads
+# are synthetic aggTrade / markPriceUpdate / forceOrder events, so the
+# multiplexer and the scripts' handlers can be checked and benchmarked offline.
+
+import json
+from urllib.parse import parse_qs, urlsplit
+
+from websockets import serve
+
+start_ms = 1721384299000
+
+def agg_trade_payload(symbol, k):
+    price = 100.0 + k % 50
+    return {'e': 'aggTrade', 'E': start_ms + k * 10 + 2, 's': symbol.upper(), 'a': 733222201 + k, 'p': f'{price:.4f}',
+            'q': f'{(k % 7 + 1) * 150.0:.3f}', 'f': 1000 + 2 * k, 'l': 1001 + 2 * k, 'T': start_ms + k * 10,
+            'm': bool(k % 2), 'M': True}
+
+def mark_price_payload(symbol, k):
+    rate = 0.0001 * (k % 5 - 1)
+    return {'e': 'markPriceUpdate', 'E': start_ms + k * 1000, 's': symbol.upper(), 'p': f'{100.0 + k:.8f}',
+            'i': f'{99.9 + k:.8f}', 'P': f'{100.1 + k:.8f}', 'r': f'{rate:.8f}', 'T': start_ms + 28_800_000}
+
+def force_order_payload(symbol, k):
+    return {'e': 'forceOrder', 'E': start_ms + k * 50 + 3, 'o': {
+        's': symbol.upper(), 'S': 'SELL' if k % 3 else 'BUY', 'o': 'LIMIT', 'f': 'IOC', 'q': '1.500', 'p': '100.0000',
+        'ap': '100.1000', 'X': 'FILLED', 'l': '1.500', 'z': '1.500', 'T': start_ms + k * 50}}
+
+payload_makers = {
+    'aggTrade': agg_trade_payload,
+    'markPrice': mark_price_payload,
+    'forceOrder': force_order_payload,
+}
+
+def stream_payload(stream, k):
+    """Return the k-th synthetic payload of a stream name such as 'btcusdt@aggTrade' or 'btcusdt@markPrice@1s'."""
+    symbol, event = stream.split('@')[:2]
+    return payload_makers[event](symbol, k)
+
+class FakeStreamServer:
+    """Serve `messages_per_stream` synthetic messages on every stream a client subscribes to.
+
+    With `close_after_send` the server hangs up once a connection's messages
+    are sent, so clients' reconnects can be exercised; otherwise the
+    connection is kept open until the client leaves. `connections` counts the
+    connections accepted and `sent` the messages sent.
+
+        async with FakeStreamServer(100) as server:
+            mux = StreamMultiplexer(server.combined_url)
+    """
+
+    def __init__(self, messages_per_stream=100, host='127.0.0.1', port=0, close_after_send=False):
+        self.messages_per_stream = messages_per_stream
+        self.host = host
+        self.port = port
+        self.close_after_send = close_after_send
+        self.server = None
+        self.connections = 0
+        self.sent = 0
+
+    @property
+    def combined_url(self):
+        return f'ws://{self.host}:{self.port}/stream'
+
+    @property
+    def raw_url(self):
+        return f'ws://{self.host}:{self.port}/ws/'
+
+    async def handle(self, websocket, path=None):
+        # Older websockets pass the path as an argument (or websocket.path), newer ones on the request
+        path = path or getattr(websocket, 'path', None) or websocket.request.path
+        url = urlsplit(path)
+        if url.path == '/stream':
+            streams = parse_qs(url.query)['streams'][0].split('/')
+            combined = True
+        else:
+            streams = [url.path[len('/ws/'):]]
+            combined = False
+        self.connections += 1
+        for k in range(self.messages_per_stream):
+            for stream in streams:
+                data = stream_payload(stream, k)
+                await websocket.send(json.dumps({'stream': stream, 'data': data} if combined else data))
+                self.sent += 1
+        if not self.close_after_send:
+            await websocket.wait_closed()
+
+    async def start(self):
+        self.server = await serve(self.handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc_info):
+        await self.stop()
@@ -1,54 +1,68 @@
+import argparse
 import asyncio
-import json 
-from datetime import datetime 
-from websockets import connect 
-from termcolor import cprint 
-import random 
+from termcolor import colored
+from decode import local_second
+from multiplex import StreamMultiplexer, combined_stream_url, usdt_m_symbols
 
+# list of symbols you want to track (--all tracks every USDT-M perpetual)
 symbols = ['btcusdt', 'ethusdt', 'solusdt', 'wifusdt']
-websocket_url_base = 'wss://fstream.binance.com/ws/'
-
-shared_symbol_counter = {'count':0}
-print_lock = asyncio.Lock()
-
-async def binance_funding_stream(symbol, shared_counter):
-    global print_lock 
-    websocket_url = f'{websocket_url_base}{symbol}@markPrice'
-    async with connect(websocket_url) as websocket:
-        while True:
-            try:
-                async with print_lock:
-                    message = await websocket.recv()
-                    data = json.loads(message)
-                    event_time = datetime.fromtimestamp(data['E'] / 1000).strftime("%H:%M:%S")
-                    symbol_display = data['s'].replace('USDT', '')
-                    funding_rate = float(data['r'])
-                    yearly_funding_rate = (funding_rate * 3 * 365) * 100 
-
-                    if yearly_funding_rate > 50:
-                        text_color, back_color = 'black', 'on_red'
-                    elif yearly_funding_rate > 30:
-                        text_color, back_color = 'black', 'on_yellow'
-                    elif yearly_funding_rate > 5:
-                        text_color, back_color = 'black', 'on_cyan'
-                    elif yearly_funding_rate < -10:
-                        text_color, back_color = 'black', 'on_green'
-                    else:
-                        text_color, back_color = 'black', 'on_light_green'
-
-                    cprint(f"{symbol_display} funding: {yearly_funding_rate:.2f}%", text_color, back_color)
-
-                    shared_counter['count'] += 1 
-
-                    if shared_counter['count'] >= len(symbol):
-                        cprint(f"{event_time} yrly fund", 'white', 'on_black')
-                        shared_counter['count'] = 0 
-
-            except:
-                await asyncio.sleep(5)
-
-async def main():
-    tasks = [binance_funding_stream(symbol, shared_symbol_counter) for symbol in symbols]
-    await asyncio.gather(*tasks)
-
-asyncio.run(main())
+tick_s = 3  # Binance sends <symbol>@markPrice every 3 seconds
+
+def funding_colors(yearly_funding_rate):
+    if yearly_funding_rate > 50:
+        return 'black', 'on_red'
+    elif yearly_funding_rate > 30:
+        return 'black', 'on_yellow'
+    elif yearly_funding_rate > 5:
+        return 'black', 'on_cyan'
+    elif yearly_funding_rate < -10:
+        return 'black', 'on_green'
+    else:
+        return 'black', 'on_light_green'
+
+def render_snapshot(marks, symbols=symbols, top=None):
+    """Return the console text for the latest mark of each symbol, in `symbols` order.
+
+    With `top`, only the `top` symbols with the largest absolute yearly funding
+    rate are shown, largest first.
+    """
+    rows = [marks[symbol.upper()] for symbol in symbols if symbol.upper() in marks]
+    if top is not None:
+        rows = sorted(rows, key=lambda mark: abs(mark.yearly_funding_rate), reverse=True)[:top]
+    lines = []
+    for mark in rows:
+        yearly_funding_rate = mark.yearly_funding_rate
+        text_color, back_color = funding_colors(yearly_funding_rate)
+        lines.append(colored(f"{mark.display_symbol} funding: {yearly_funding_rate:.2f}%", text_color, back_color))
+    latest = max(mark.event_time for mark in marks.values())
+    lines.append(colored(f"{local_second(latest // 1000)} yrly fund", 'white', 'on_black'))
+    return '\n'.join(lines)
+
+async def render_snapshots(queue, symbols=symbols, interval_s=tick_s, top=None):
+    """The single consumer: every tick, fold the queued marks into the latest per symbol and print them once."""
+    marks = {}
+    while True:
+        await asyncio.sleep(interval_s)
+        updated = not queue.empty()
+        while not queue.empty():
+            mark = queue.get_nowait()
+            marks[mark.symbol] = mark
+        if updated:
+            print(render_snapshot(marks, symbols, top), flush=True)
+
+async def main(symbols=symbols, url=combined_stream_url, interval_s=tick_s, top=None):
+    # The connections only decode and enqueue, so a slow console never holds up a read
+    queue = asyncio.Queue()
+    mux = StreamMultiplexer(url)
+    for symbol in symbols:
+        mux.subscribe(f'{symbol}@markPrice', queue.put_nowait)
+    await asyncio.gather(mux.run(), render_snapshots(queue, symbols, interval_s, top))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Print yearly funding rates of Binance perpetuals.')
+    parser.add_argument('--all', action='store_true', help='Track every USDT-M perpetual instead of `symbols`')
+    parser.add_argument('--interval', type=float, default=tick_s, help='Seconds between snapshots')
+    parser.add_argument('--top', type=int, help='Only show the symbols with the largest absolute funding rates')
+    args = parser.parse_args()
+
+    asyncio.run(main(usdt_m_symbols() if args.all else symbols, interval_s=args.interval, top=args.top))
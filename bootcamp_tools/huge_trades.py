@@ -1,75 +1,145 @@
+import argparse
 import asyncio
-import json 
+import logging
 import os 
-from datetime import datetime
-import pytz 
-from websockets import connect 
+import time
 from termcolor import cprint 
+from decode import eastern_second
+from multiplex import StreamMultiplexer, combined_stream_url, usdt_m_symbols
 
-# list of symbols you want to track 
+# list of symbols you want to track (--all tracks every USDT-M perpetual)
 symbols = ['btcusdt', 'ethusdt', 'solusdt', 'bnbusdt', 'dogeusdt', 'wifusdt']
-websocket_url_base = 'wss://fstream.binance.com/ws/'
 trades_filename = 'binance_trades.csv'
-
-# check if the csv file exists
-if not os.path.isfile(trades_filename):
-    with open(trades_filename, 'w') as f:
-        f.write('Event Time, Symbol, Aggregate Trade ID, Price, Quantity, First Trade ID, Trade Time, Is Buyer Maker\n')
+logger = logging.getLogger(__name__)
 
 class TradeAggregator:
-    def __init__(self):
-        self.trade_buckets = {}
-
-    async def add_trade(self, symbol, second, usd_size, is_buyer_maker):
-        trade_key = (symbol, second, is_buyer_maker)
-        self.trade_buckets[trade_key] = self.trade_buckets.get(trade_key, 0) + usd_size
-
-    async def check_and_print_trades(self):
-        timestamp_now = datetime.utcnow().strftime("%H:%M:%S")
-        deletetions = []
-        for trade_key, usd_size in self.trade_buckets.items():
-            symbol, second, is_buyer_maker = trade_key
-            if second < timestamp_now and usd_size > 500000:
-                attrs = ['bold']
-                back_color = 'on_blue' if not is_buyer_maker else 'on_magenta'
-                trade_type = "BUY" if not is_buyer_maker else 'SELL'
-                if usd_size > 3000000:
-                    usd_size = usd_size / 1000000
-                    cprint(f"\033[5m{trade_type} {symbol} {second} ${usd_size:.2f}m\033[0m", 'white', back_color, attrs=attrs)
-                else:
-                    usd_size = usd_size / 1000000
-                    cprint(f"{trade_type} {symbol} {second} ${usd_size:.2f}m", 'white', back_color, attrs=attrs)
-                deletetions.append(trade_key)
-
-        for key in deletetions:
-            del self.trade_buckets[key]
+    """USD traded per (symbol, side) in each epoch second, kept in a time wheel.
 
-trade_aggregator = TradeAggregator()
+    Second `s` lives in slot `s % window_s`, a dict of {(symbol, is_buyer_maker):
+    usd_size}, so adding a trade is one dict update. `expire` closes every
+    second before a given one by visiting only those slots, reports the
+    buckets above `threshold` and clears them; at most `window_s` seconds are
+    ever held, however long the process runs.
+
+    Seconds are closed on the exchange's clock: the latest event time passed
+    to add_trade, moved on by the local time elapsed since it arrived, so a
+    skewed local clock neither drops trades nor holds seconds open. Trades for
+    a second already closed are counted in `late`, dropped and logged.
+    """
+
+    def __init__(self, window_s=64, threshold=500000, delay_s=1):
+        self.window_s = window_s
+        self.threshold = threshold
+        self.delay_s = delay_s  # Seconds to wait for late trades before a second is closed
+        self.seconds = [None] * window_s
+        self.buckets = [{} for _ in range(window_s)]
+        self.next_second = None  # Oldest second not yet closed
+        self.ready = []
+        self.late = 0
+        self.late_logged = 0
+        self.event_ms = None  # Latest exchange event time seen, and the local monotonic time it arrived
+        self.event_received = None
+
+    def add_trade(self, symbol, second, usd_size, is_buyer_maker, event_ms=None):
+        if event_ms is not None and (self.event_ms is None or event_ms > self.event_ms):
+            self.event_ms = event_ms
+            self.event_received = time.monotonic()
+        if self.next_second is None:
+            self.next_second = second
+        elif second < self.next_second:
+            self.late += 1
+            return
+        if second - self.next_second >= self.window_s:
+            # The wheel is full: close the seconds this one is about to take the slot of
+            self.ready.extend(self.expire(second - self.window_s + 1))
+        slot = second % self.window_s
+        self.seconds[slot] = second
+        bucket = self.buckets[slot]
+        trade_key = (symbol, is_buyer_maker)
+        bucket[trade_key] = bucket.get(trade_key, 0) + usd_size
+
+    def expire(self, until_second):
+        """Close every second before until_second; return its buckets above the threshold, oldest first.
 
-async def binance_trade_stream(uri, symbol, filename, aggregator):
-    async with connect(uri) as websocket:
-        while True:
-            try:
-                message = await websocket.recv()
-                data = json.loads(message)
-                usd_size = float(data['p']) * float(data['q'])
-                trade_time = datetime.fromtimestamp(data['T']/1000, pytz.timezone('US/Eastern'))
-                readable_trade_time = trade_time.strftime('%H:%M:%S')
+        Each is a (second, symbol, is_buyer_maker, usd_size) tuple.
+        """
+        if self.next_second is None or until_second <= self.next_second:
+            return []
+        if until_second - self.next_second >= self.window_s:
+            seconds = sorted(s for s in self.seconds if s is not None and s < until_second)
+        else:
+            seconds = range(self.next_second, until_second)
+        big_trades = []
+        for second in seconds:
+            slot = second % self.window_s
+            if self.seconds[slot] != second:
+                continue  # No trades in that second
+            for (symbol, is_buyer_maker), usd_size in self.buckets[slot].items():
+                if usd_size > self.threshold:
+                    big_trades.append((second, symbol, is_buyer_maker, usd_size))
+            self.buckets[slot].clear()
+            self.seconds[slot] = None
+        self.next_second = until_second
+        return big_trades
 
-                await aggregator.add_trade(symbol.upper().replace('USDT', ''), readable_trade_time, usd_size, data['m'])
+    def __len__(self):
+        """Number of (second, symbol, side) buckets currently held."""
+        return sum(len(bucket) for bucket in self.buckets)
 
-            except:
-                await asyncio.slep(5)
+    def exchange_now(self):
+        """Current epoch second on the exchange's clock, or the local one before any event time is seen."""
+        if self.event_ms is None:
+            return time.time()
+        return self.event_ms / 1000 + time.monotonic() - self.event_received
+
+    def check_and_print_trades(self, now=None):
+        now = int(self.exchange_now() if now is None else now)
+        big_trades = self.ready + self.expire(now - self.delay_s)
+        self.ready = []
+        if self.late > self.late_logged:
+            logger.warning('Dropped %d trades that arrived over %ss after their second closed (%d in total)',
+                           self.late - self.late_logged, self.delay_s, self.late)
+            self.late_logged = self.late
+        for second, symbol, is_buyer_maker, usd_size in big_trades:
+            attrs = ['bold']
+            back_color = 'on_blue' if not is_buyer_maker else 'on_magenta'
+            trade_type = "BUY" if not is_buyer_maker else 'SELL'
+            # Seconds are epoch integers; only the printed ones are formatted, in US/Eastern as before
+            second = eastern_second(second)
+            if usd_size > 3000000:
+                usd_size = usd_size / 1000000
+                cprint(f"\033[5m{trade_type} {symbol} {second} ${usd_size:.2f}m\033[0m", 'white', back_color, attrs=attrs)
+            else:
+                usd_size = usd_size / 1000000
+                cprint(f"{trade_type} {symbol} {second} ${usd_size:.2f}m", 'white', back_color, attrs=attrs)
+
+trade_aggregator = TradeAggregator()
+
+def handle_trade(trade, aggregator):
+    aggregator.add_trade(trade.display_symbol, trade.trade_time // 1000, trade.usd_size, trade.is_buyer_maker,
+                         trade.event_time)
 
 async def print_aggregated_trades_every_second(aggregator):
     while True:
         await asyncio.sleep(1)
-        await aggregator.check_and_print_trades()
+        aggregator.check_and_print_trades()
 
-async def main():
-    filename = 'binance_trades_big.csv'
-    trade_stream_tasks = [binance_trade_stream(f"{websocket_url_base}{symbol}@aggTrade", symbol, filename, trade_aggregator) for symbol in symbols]
+async def main(symbols=symbols, url=combined_stream_url):
+    # every symbol's trades arrive over a few combined-stream connections
+    mux = StreamMultiplexer(url)
+    for symbol in symbols:
+        mux.subscribe(f'{symbol}@aggTrade', lambda trade: handle_trade(trade, trade_aggregator))
     print_task = asyncio.create_task(print_aggregated_trades_every_second(trade_aggregator))
-    await asyncio.gather(*trade_stream_tasks, print_task)
+    await asyncio.gather(mux.run(), print_task)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Print trades aggregated per second above $500k.')
+    parser.add_argument('--all', action='store_true', help='Track every USDT-M perpetual instead of `symbols`')
+    args = parser.parse_args()
+
+    # check if the csv file exists
+    if not os.path.isfile(trades_filename):
+        with open(trades_filename, 'w') as f:
+            f.write('Event Time, Symbol, Aggregate Trade ID, Price, Quantity, First Trade ID, Trade Time, Is Buyer Maker\n')
 
-asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main(usdt_m_symbols() if args.all else symbols))
@@ -0,0 +1,96 @@
+# Combined-stream multiplexer for the Binance futures websockets
+#
+# recent_trades.py, huge_trades.py and funding.py used to open one connection
+# (and one task) per symbol, so hundreds of symbols meant hundreds of sockets.
+# StreamMultiplexer subscribes every stream over a few combined-stream
+# connections (/stream?streams=a/b/...), at most `streams_per_connection`
+# each, decodes each message once with decode.py and calls the handlers
+# registered for its stream. A dropped connection is reopened with backoff
+# without disturbing the others.
+
+import asyncio
+import inspect
+import urllib.request
+
+from websockets import connect
+
+import decode
+
+combined_stream_url = 'wss://fstream.binance.com/stream'
+exchange_info_url = 'https://fapi.binance.com/fapi/v1/exchangeInfo'
+default_streams_per_connection = 200  # Binance accepts up to 1024; smaller connections lose less on a reconnect
+
+def usdt_m_symbols(url=exchange_info_url):
+    """Return the lower-case symbols of every trading USDT-margined perpetual."""
+    with urllib.request.urlopen(url, timeout=10) as response:
+        info = decode.loads(response.read())
+    return [s['symbol'].lower() for s in info['symbols']
+            if s.get('contractType') == 'PERPETUAL' and s.get('quoteAsset') == 'USDT' and s.get('status') == 'TRADING']
+
+class StreamMultiplexer:
+    """Route the messages of many Binance streams, read over a few connections, to per-stream handlers.
+
+    Handlers receive the decode.py record (AggTrade, MarkPrice, ForceOrder) and
+    may be plain functions or coroutine functions. They run one message at a
+    time per connection, so they need no locks; an exception in a handler is
+    counted in `errors` and the stream carries on.
+    """
+
+    def __init__(self, url=combined_stream_url, streams_per_connection=default_streams_per_connection,
+                 reconnect_delay_s=1.0, max_reconnect_delay_s=30.0):
+        self.url = url
+        self.streams_per_connection = streams_per_connection
+        self.reconnect_delay_s = reconnect_delay_s
+        self.max_reconnect_delay_s = max_reconnect_delay_s
+        self.handlers = {}
+        self.messages = 0
+        self.errors = 0
+        self.reconnects = 0
+
+    def subscribe(self, stream, handler):
+        """Call handler(record) for every message of `stream`, e.g. 'btcusdt@aggTrade'."""
+        self.handlers.setdefault(stream, []).append(handler)
+
+    def connection_urls(self):
+        """Return one combined-stream URL per group of `streams_per_connection` streams."""
+        streams = list(self.handlers)
+        n = self.streams_per_connection
+        return [f"{self.url}?streams={'/'.join(streams[i:i + n])}" for i in range(0, len(streams), n)]
+
+    async def dispatch(self, message):
+        """Decode one {'stream': ..., 'data': ...} message and pass it to the stream's handlers."""
+        envelope = decode.loads(message)
+        handlers = self.handlers.get(envelope.get('stream'))
+        if not handlers:
+            return
+        self.messages += 1
+        data = envelope['data']
+        # Array streams such as !markPrice@arr carry one payload per symbol
+        for payload in (data if isinstance(data, list) else [data]):
+            record = decode.decode_event(payload)
+            for handler in handlers:
+                try:
+                    result = handler(record)
+                    if inspect.isawaitable(result):
+                        await result
+                except Exception:
+                    self.errors += 1
+
+    async def run_connection(self, url):
+        """Read one connection forever, reconnecting with exponential backoff when it drops."""
+        delay = self.reconnect_delay_s
+        while True:
+            try:
+                async with connect(url) as websocket:
+                    delay = self.reconnect_delay_s
+                    async for message in websocket:
+                        await self.dispatch(message)
+            except Exception:
+                pass  # Closed or refused; cancellation is not an Exception and still stops the task
+            self.reconnects += 1
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_reconnect_delay_s)
+
+    async def run(self):
+        """Open every connection and dispatch messages until cancelled."""
+        await asyncio.gather(*(self.run_connection(url) for url in self.connection_urls()))
@@ -1,77 +1,57 @@
+import argparse
 import asyncio
-import json 
-import os 
-from datetime import datetime
-import pytz 
-from websockets import connect 
 from termcolor import cprint 
+from async_writer import BatchWriter
+from multiplex import StreamMultiplexer, combined_stream_url, usdt_m_symbols
 
-# list of symbols you want to track 
+# list of symbols you want to track (--all tracks every USDT-M perpetual)
 symbols = ['btcusdt', 'ethusdt', 'solusdt', 'bnbusdt', 'dogeusdt', 'wifusdt']
-websocket_url_base = 'wss://fstream.binance.com/ws/'
 trades_filename = 'binance_trades.csv'
 
-# check if the csv file exists
-if not os.path.isfile(trades_filename):
-    with open(trades_filename, 'w') as f:
-        f.write('Event Time, Symbol, Aggregate Trade ID, Price, Quantity, First Trade ID, Trade Time, Is Buyer Maker\n')
-
-async def binance_trade_stream(uri, symbol, filename):
-    async with connect(uri) as websocket:
-        while True:
-            try:
-                message = await websocket.recv()
-                data = json.loads(message)
-                event_time = int(data['E'])
-                agg_trade_id = data['a']
-                price = float(data['p'])
-                quantity = float(data['q'])
-                trade_time = int(data['T'])
-                is_buyer_maker = data['m']
-                est = pytz.timezone('US/Eastern')
-                readable_trade_time = datetime.fromtimestamp(trade_time / 1000, est).strftime('%H:%M:%S')
-                usd_size = price * quantity 
-                display_symbol = symbol.upper().replace('USDT', '')
-
-                if usd_size > 14999:
-                    trade_type = 'SELL' if is_buyer_maker else "BUY"
-                    color = 'red' if trade_type == 'SELL' else 'green'
-
-                    stars = ''
-                    attrs = ['bold'] if usd_size >= 50000 else []
-                    repeat_count = 1 
-                    if usd_size >= 500000:
-                        stars = '*' * 2
-                        repeat_count = 1 
-                        if trade_type == 'SELL':
-                            color = 'magenta'
-                        else:
-                            color = 'blue'
-                        
-                    elif usd_size >= 100000:
-                        stars = '*' * 1 
-                        repeat_count = 1 
-
-                    output = f"{stars} {trade_type} {display_symbol} {readable_trade_time} ${usd_size:,.0f} "
-                    for _ in range(repeat_count):
-                        cprint(output, 'white', f'on_{color}', attrs=attrs)
-
-                    # log to csv 
-                    with open(filename, 'a') as f:
-                        f.write(f"{event_time}, {symbol.upper()},{agg_trade_id},{price},{quantity},"
-                                f"{trade_time},{is_buyer_maker}\n")
-            except Exception as e:
-                await asyncio.sleep(5)
-
-async def main():
-    filename = 'binance_trades.csv'
-
-    # create a task for each symbol trade stream 
-    tasks = []
+header = 'Event Time, Symbol, Aggregate Trade ID, Price, Quantity, First Trade ID, Trade Time, Is Buyer Maker\n'
+
+def handle_trade(trade, writer):
+    is_buyer_maker = trade.is_buyer_maker
+    usd_size = trade.usd_size
+
+    if usd_size > 14999:
+        trade_type = 'SELL' if is_buyer_maker else "BUY"
+        color = 'red' if trade_type == 'SELL' else 'green'
+
+        stars = ''
+        attrs = ['bold'] if usd_size >= 50000 else []
+        repeat_count = 1 
+        if usd_size >= 500000:
+            stars = '*' * 2
+            repeat_count = 1 
+            if trade_type == 'SELL':
+                color = 'magenta'
+            else:
+                color = 'blue'
+            
+        elif usd_size >= 100000:
+            stars = '*' * 1 
+            repeat_count = 1 
+
+        output = f"{stars} {trade_type} {trade.display_symbol} {trade.eastern_time()} ${usd_size:,.0f} "
+        for _ in range(repeat_count):
+            cprint(output, 'white', f'on_{color}', attrs=attrs)
+
+        # log to csv 
+        writer.write(trade.csv_line(), trade.trade_time)
+
+async def main(writer, symbols=symbols, url=combined_stream_url):
+    # every symbol's trades arrive over a few combined-stream connections
+    mux = StreamMultiplexer(url)
     for symbol in symbols:
-        stream_url = f"{websocket_url_base}{symbol}@aggTrade"
-        tasks.append(binance_trade_stream(stream_url, symbol, filename))
+        mux.subscribe(f'{symbol}@aggTrade', lambda trade: handle_trade(trade, writer))
+    await mux.run()
 
-    await asyncio.gather(*tasks)
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Print and record large Binance futures trades.')
+    parser.add_argument('--all', action='store_true', help='Track every USDT-M perpetual instead of `symbols`')
+    args = parser.parse_args()
 
-asyncio.run(main())
+    # Every stream shares one writer, which appends in batches to one file per day
+    with BatchWriter(trades_filename, header) as writer:
+        asyncio.run(main(writer, usdt_m_symbols() if args.all else symbols))
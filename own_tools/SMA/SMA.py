@@ -2,9 +2,14 @@
 
 import ccxt
 import key_file as k
-import pandas as pd
+import os
+import sys
 import time
 
+# Streaming indicators live next to the batch back-test they are checked against
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'ta_lib_BT_tool'))
+from streaming_indicators import StreamingSMA
+
 # Initialize Binance exchange
 binance = ccxt.binance({
     'enableRateLimit': True,
@@ -16,25 +21,41 @@ symbol = 'BTC/USDT'
 timeframe = '15m'
 sma_period = 20
 usd_amount = 1  # Amount in USD for the order size, must be greater than $5.00
+timeframe_ms = binance.parse_timeframe(timeframe) * 1000
+
+# SMA state carried between runs; only bars closed since the last run are fed in
+sma = StreamingSMA(sma_period)
+last_bar_time = None
+last_close = None
 
 def fetch_ohlcv(symbol, timeframe, limit=100):
     """Fetch OHLCV data from Binance."""
-    bars = binance.fetch_ohlcv(symbol, timeframe=timeframe, limit=limit)
-    df = pd.DataFrame(bars, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
-    return df
+    return binance.fetch_ohlcv(symbol, timeframe=timeframe, limit=limit)
+
+def update_sma():
+    """Feed newly closed bars into the streaming SMA, fetching full history only to warm up."""
+    global sma, last_bar_time, last_close
+    bars = fetch_ohlcv(symbol, timeframe, limit=100 if last_bar_time is None else 5)
+    closed_bars = bars[:-1]  # The last bar is still forming
+
+    # The bot was paused longer than the short fetch covers: rebuild from history
+    if last_bar_time is not None and closed_bars and closed_bars[0][0] > last_bar_time + timeframe_ms:
+        sma = StreamingSMA(sma_period)
+        last_bar_time = None
+        closed_bars = fetch_ohlcv(symbol, timeframe)[:-1]
 
-def calculate_sma(df, period):
-    """Calculate the Simple Moving Average (SMA)."""
-    df[f'sma_{period}'] = df['close'].rolling(window=period).mean()
-    return df
+    for bar in closed_bars:
+        if last_bar_time is None or bar[0] > last_bar_time:
+            sma.update(bar[4])
+            last_bar_time = bar[0]
+            last_close = bar[4]
+    return sma.value
 
-def get_signal(df, sma_period):
+def get_signal():
     """Generate trading signal based on SMA."""
-    latest_data = df.iloc[-1]
-    if latest_data['close'] > latest_data[f'sma_{sma_period}']:
+    if last_close > sma.value:
         return 'BUY'
-    elif latest_data['close'] < latest_data[f'sma_{sma_period}']:
+    elif last_close < sma.value:
         return 'SELL'
     else:
         return 'HOLD'
@@ -64,9 +85,8 @@ def place_order(symbol, side, amount):
 
 def run_bot():
     """Run the trading bot."""
-    df = fetch_ohlcv(symbol, timeframe)
-    df = calculate_sma(df, sma_period)
-    signal = get_signal(df, sma_period)
+    update_sma()
+    signal = get_signal()
     usdt_balance = check_balance()
     order_size = get_order_size(usd_amount)
     
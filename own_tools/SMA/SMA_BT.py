@@ -42,23 +42,27 @@ def simulate_trades(df, usd_per_trade):
     """Simulate trades based on the signals."""
     balance_usdt = initial_usdt_balance  # Starting balance in USDT
     balance_btc = initial_btc_balance  # Starting balance in BTC
-    df['balance_usdt'] = balance_usdt
-    df['balance_btc'] = balance_btc
+    prices = df['close'].tolist()
+    signals = df['signal'].tolist()
+    usdt_out = [balance_usdt] * len(df)
+    btc_out = [balance_btc] * len(df)
 
     for i in range(1, len(df)):
-        if df.loc[i, 'signal'] == 1 and df.loc[i-1, 'signal'] != 1:  # Buy signal
-            btc_to_buy = usd_per_trade / df.loc[i, 'close']
+        if signals[i] == 1 and signals[i-1] != 1:  # Buy signal
+            btc_to_buy = usd_per_trade / prices[i]
             if balance_usdt >= usd_per_trade:
                 balance_btc += btc_to_buy
                 balance_usdt -= usd_per_trade
-        elif df.loc[i, 'signal'] == -1 and df.loc[i-1, 'signal'] != -1:  # Sell signal
-            usdt_to_sell = balance_btc * df.loc[i, 'close']
+        elif signals[i] == -1 and signals[i-1] != -1:  # Sell signal
+            usdt_to_sell = balance_btc * prices[i]
             balance_usdt += usdt_to_sell
             balance_btc = 0
 
-        df.loc[i, 'balance_usdt'] = balance_usdt
-        df.loc[i, 'balance_btc'] = balance_btc
+        usdt_out[i] = balance_usdt
+        btc_out[i] = balance_btc
 
+    df['balance_usdt'] = usdt_out
+    df['balance_btc'] = btc_out
     df['total_balance'] = df['balance_usdt'] + df['balance_btc'] * df['close']
     return df
 
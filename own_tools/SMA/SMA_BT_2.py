@@ -2,10 +2,17 @@
 
 import ccxt
 import key_file as k
+import numpy as np
+import os
 import pandas as pd
+import sys
 import matplotlib.pyplot as plt
 from datetime import datetime, timedelta
 
+# The fixed $5 trade loop runs as a compiled kernel when Numba is installed (see ta_lib_BT_tool/kernels.py)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'ta_lib_BT_tool'))
+from kernels import simulate_fixed_steps
+
 # Initialize Binance exchange
 binance = ccxt.binance({
     'enableRateLimit': True,
@@ -38,25 +45,18 @@ df['SMA20'] = calculate_sma(df, 20)
 # Backtest strategy
 initial_balance_usdt = 1000
 initial_balance_btc = 1000
-balance_usdt = initial_balance_usdt
-balance_btc = initial_balance_btc
 btc_price = df['close'].iloc[0]
-positions = []
+signal = np.zeros(len(df), dtype=np.int8)
+signal[df['close'] > df['SMA20']] = 1  # Buy signal
+signal[df['close'] < df['SMA20']] = -1 # Sell signal
 
-for i in range(20, len(df)):
-    if df['close'].iloc[i] > df['SMA20'].iloc[i]:  # Buy signal
-        if balance_usdt >= 5:
-            btc_amount = 5 / df['close'].iloc[i]
-            balance_btc += btc_amount
-            balance_usdt -= 5
-            positions.append((df['timestamp'].iloc[i], 'Buy', df['close'].iloc[i], balance_usdt, balance_btc))
-    elif df['close'].iloc[i] < df['SMA20'].iloc[i]:  # Sell signal
-        if balance_btc * df['close'].iloc[i] >= 5:
-            usdt_amount = 5
-            btc_amount = 5 / df['close'].iloc[i]
-            balance_btc -= btc_amount
-            balance_usdt += usdt_amount
-            positions.append((df['timestamp'].iloc[i], 'Sell', df['close'].iloc[i], balance_usdt, balance_btc))
+# Buy $5 on every buy-signal bar while USDT lasts, sell $5 on every sell-signal bar while BTC lasts
+balance_usdt, balance_btc, action = simulate_fixed_steps(
+    df['close'].to_numpy(), signal, trade_usd=5, start=20,
+    initial_usdt_balance=initial_balance_usdt, initial_btc_balance=initial_balance_btc)
+rows = np.flatnonzero(action)
+positions = list(zip(df['timestamp'].iloc[rows], np.where(action[rows] == 1, 'Buy', 'Sell'),
+                     df['close'].iloc[rows], balance_usdt[rows], balance_btc[rows]))
 
 # Create a DataFrame for positions
 positions_df = pd.DataFrame(positions, columns=['timestamp', 'action', 'price', 'balance_usdt', 'balance_btc'])
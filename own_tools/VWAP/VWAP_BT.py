@@ -2,8 +2,15 @@
 
 import ccxt
 import key_file as k
+import os
 import pandas as pd
 import matplotlib.pyplot as plt
+import sys
+
+# The portfolio back-test is shared with the TA-Lib back-test tool
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'ta_lib_BT_tool'))
+from ohlcv_cache import frame_to_bars
+from portfolio import run_portfolio
 
 # Initialize Binance exchange
 binance = ccxt.binance({
@@ -16,6 +23,7 @@ symbols = ['BTC/USDT', 'ETH/USDT', 'SOL/USDT']
 timeframe = '1h'  # Hourly data
 initial_usdt_balance = 1000  # Starting balance in USDT
 usd_per_trade = 100  # Amount in USD per trade
+portfolio = False  # True back-tests all symbols together, trading from one shared USDT balance
 
 def fetch_ohlcv(symbol, timeframe, since):
     """Fetch OHLCV data from Binance."""
@@ -42,23 +50,27 @@ def simulate_trades(df, usd_per_trade, initial_usdt_balance):
     """Simulate trades based on the signals."""
     balance_usdt = initial_usdt_balance  # Starting balance in USDT
     balance_btc = 0  # Starting balance in BTC (or ETH, or SOL)
-    df['balance_usdt'] = balance_usdt
-    df['balance_btc'] = balance_btc
+    prices = df['close'].tolist()
+    signals = df['signal'].tolist()
+    usdt_out = [balance_usdt] * len(df)
+    btc_out = [balance_btc] * len(df)
 
     for i in range(1, len(df)):
-        if df.loc[i, 'signal'] == 1 and df.loc[i-1, 'signal'] != 1:  # Buy signal
-            btc_to_buy = usd_per_trade / df.loc[i, 'close']
+        if signals[i] == 1 and signals[i-1] != 1:  # Buy signal
+            btc_to_buy = usd_per_trade / prices[i]
             if balance_usdt >= usd_per_trade:
                 balance_btc += btc_to_buy
                 balance_usdt -= usd_per_trade
-        elif df.loc[i, 'signal'] == -1 and df.loc[i-1, 'signal'] != -1:  # Sell signal
-            usdt_to_sell = balance_btc * df.loc[i, 'close']
+        elif signals[i] == -1 and signals[i-1] != -1:  # Sell signal
+            usdt_to_sell = balance_btc * prices[i]
             balance_usdt += usdt_to_sell
             balance_btc = 0
 
-        df.loc[i, 'balance_usdt'] = balance_usdt
-        df.loc[i, 'balance_btc'] = balance_btc
+        usdt_out[i] = balance_usdt
+        btc_out[i] = balance_btc
 
+    df['balance_usdt'] = usdt_out
+    df['balance_btc'] = btc_out
     df['total_balance'] = df['balance_usdt'] + df['balance_btc'] * df['close']
     return df
 
@@ -108,6 +120,36 @@ def backtest_vwap(symbol):
     
     plt.show()
 
+def backtest_vwap_portfolio(symbols):
+    """Run the VWAP back-test for all symbols at once, trading from one shared USDT balance."""
+    since = binance.parse8601('2023-06-01T00:00:00Z')  # Fetch data from one month back
+    bars = {symbol: frame_to_bars(fetch_ohlcv(symbol, timeframe, since)) for symbol in symbols}
+    # Aligned on the timestamps every symbol has, with VWAP and signals for every symbol in one pass
+    df, _, _ = run_portfolio(bars, 'VWAP', None, usd_per_trade, initial_usdt_balance, label='vwap')
+
+    # Export to CSV
+    csv_filename = 'vwap_portfolio_results.csv'
+    df.to_csv(csv_filename, index=False)
+    print(f'Portfolio back-test results exported to {csv_filename}')
+
+    # Plot the shared balance
+    fig, ax = plt.subplots(figsize=(12, 6))
+    ax.plot(df['timestamp'], df['total_balance'], label='Total Balance')
+    ax.legend()
+    ax.set_title(f'VWAP Portfolio Balance Over Time for {", ".join(symbols)}')
+    ax.set_xlabel('Date')
+    ax.set_ylabel('Total Balance')
+    ax.grid()
+
+    plt_filename_balance = 'vwap_portfolio_results_balance.png'
+    plt.savefig(plt_filename_balance)
+    print(f'Portfolio balance chart saved to {plt_filename_balance}')
+
+    plt.show()
+
 if __name__ == '__main__':
-    for symbol in symbols:
-        backtest_vwap(symbol)
+    if portfolio:
+        backtest_vwap_portfolio(symbols)
+    else:
+        for symbol in symbols:
+            backtest_vwap(symbol)
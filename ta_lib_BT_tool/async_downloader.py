@@ -0,0 +1,220 @@
+# Concurrent historical backfill into the bar cache with ccxt's asyncio support
+#
+# Many (symbol, timeframe, range) jobs are split into chunks of a few pages
+# and fetched concurrently, while one token bucket shared by every task keeps
+# the request rate under the exchange limit. Each finished chunk is merged
+# into the bar cache and added to its coverage.json, which doubles as the
+# checkpoint: an interrupted backfill re-run only fetches what is still missing.
+
+import argparse
+import asyncio
+import time
+
+from ohlcv_cache import (bar_open, bars_from_list, default_cache_dir, load_cached_bars, merge_bars, merge_ranges,
+                         missing_ranges, page_limit, save_cached_bars, timeframe_to_ms)
+
+default_rate = 10  # Requests per second; Binance allows far more weight, this leaves room for live bots
+default_concurrency = 8
+default_pages_per_chunk = 20
+
+class TokenBucket:
+    """Rate limiter shared by every download task: `rate` tokens per second, bursts of up to `capacity`.
+
+    Waiting tasks are served in arrival order.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = None
+        self.lock = None
+        self.waited = 0.0
+
+    async def acquire(self, cost=1):
+        """Wait until `cost` tokens are available and take them."""
+        if self.lock is None:
+            self.lock = asyncio.Lock()  # Created here so it belongs to the running loop
+        async with self.lock:
+            now = asyncio.get_running_loop().time()
+            if self.updated is not None:
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < cost:
+                delay = (cost - self.tokens) / self.rate
+                await asyncio.sleep(delay)
+                self.waited += delay
+                self.tokens = cost
+                self.updated = now + delay
+            self.tokens -= cost
+
+def transient_errors():
+    """Return the exception types worth retrying: network failures, plus ccxt's when it is installed."""
+    errors = (ConnectionError, asyncio.TimeoutError)
+    try:
+        import ccxt
+        errors += (ccxt.NetworkError,)
+    except ImportError:
+        pass
+    return errors
+
+def plan_chunks(coverage, since_ms, until_ms, timeframe_ms, last_closed_ms, chunk_ms):
+    """Split the uncovered parts of [since_ms, until_ms] into [start, end] chunks of at most chunk_ms.
+
+    Chunks are [first, last] bar open times, like the coverage they are
+    checkpointed into, so consecutive chunks are adjacent and none skips a bar.
+    `chunk_ms` should be a whole number of bars.
+    """
+    chunks = []
+    # Never mark the still-forming candle (or the future) as covered
+    last_closed_ms = bar_open(last_closed_ms, timeframe_ms)
+    for start, end in missing_ranges(coverage, since_ms, until_ms, timeframe_ms):
+        end = min(end, last_closed_ms)
+        for chunk_start in range(start, end + 1, chunk_ms):
+            chunks.append([chunk_start, min(chunk_start + chunk_ms - timeframe_ms, end)])
+    return chunks
+
+async def fetch_page(exchange, bucket, symbol, timeframe, since_ms, limit, retries, stats):
+    """Fetch one page of klines, retrying transient errors with exponential backoff."""
+    errors = transient_errors()
+    for attempt in range(retries + 1):
+        await bucket.acquire()
+        try:
+            page = await exchange.fetch_ohlcv(symbol, timeframe=timeframe, since=since_ms, limit=limit)
+            stats['pages'] += 1
+            return page
+        except errors:
+            stats['retries'] += 1
+            if attempt == retries:
+                raise
+            await asyncio.sleep(0.5 * 2 ** attempt)
+
+async def fetch_chunk(exchange, bucket, symbol, timeframe, since_ms, until_ms, limit, retries, stats):
+    """Download every bar in [since_ms, until_ms] page by page, like ohlcv_cache.fetch_range."""
+    timeframe_ms = timeframe_to_ms(timeframe)
+    bars = []
+    cursor = since_ms
+    while cursor <= until_ms:
+        page = await fetch_page(exchange, bucket, symbol, timeframe, cursor, limit, retries, stats)
+        if not page:
+            break
+        bars.extend(bar for bar in page if bar[0] <= until_ms)
+        next_cursor = page[-1][0] + timeframe_ms
+        if next_cursor <= cursor or len(page) < limit:
+            break  # Reached the most recent bar
+        cursor = next_cursor
+    return bars
+
+def checkpoint(series, exchange_id, symbol, timeframe, raw_bars, chunk, cache_dir):
+    """Merge a finished chunk into the series and write the bar cache with the chunk marked as covered.
+
+    The chunk is already [first, last] bar opens; merge_ranges joins it to the
+    adjacent coverage on those bar opens.
+    """
+    if raw_bars:
+        series['bars'] = merge_bars(series['bars'], bars_from_list(raw_bars))
+    elif series['bars'] is None:
+        series['bars'] = bars_from_list([])
+    series['coverage'] = merge_ranges(series['coverage'] + [chunk], timeframe_to_ms(timeframe))
+    save_cached_bars(exchange_id, symbol, timeframe, series['bars'], series['coverage'], cache_dir)
+
+async def backfill(exchange, jobs, exchange_id='binance', cache_dir=default_cache_dir, rate=default_rate,
+                   capacity=None, concurrency=default_concurrency, pages_per_chunk=default_pages_per_chunk,
+                   limit=page_limit, retries=3, progress=None):
+    """Download every (symbol, timeframe, since_ms, until_ms) job into the bar cache concurrently.
+
+    Ranges already covered are skipped, so calling this again after an
+    interruption resumes the backfill. Chunks that still fail after `retries`
+    are reported in the returned stats and fetched again on the next call.
+    `progress`, if given, is called with (symbol, timeframe, chunk, bars) as
+    each chunk is saved.
+    """
+    bucket = TokenBucket(rate, capacity)
+    semaphore = asyncio.Semaphore(concurrency)
+    loop = asyncio.get_running_loop()
+    stats = {'chunks': 0, 'pages': 0, 'bars': 0, 'retries': 0, 'failed': []}
+
+    ranges = {}
+    for symbol, timeframe, since_ms, until_ms in jobs:
+        ranges.setdefault((symbol, timeframe), []).append([since_ms, until_ms])
+
+    async def run_chunk(series, symbol, timeframe, chunk):
+        async with semaphore:
+            raw_bars = await fetch_chunk(exchange, bucket, symbol, timeframe, chunk[0], chunk[1], limit, retries, stats)
+        async with series['lock']:
+            # Merging and writing the cache is blocking work, so it runs off the event loop
+            await loop.run_in_executor(None, checkpoint, series, exchange_id, symbol, timeframe, raw_bars, chunk,
+                                       cache_dir)
+        stats['chunks'] += 1
+        stats['bars'] += len(raw_bars)
+        if progress is not None:
+            progress(symbol, timeframe, chunk, len(raw_bars))
+
+    tasks = []
+    labels = []
+    for (symbol, timeframe), job_ranges in ranges.items():
+        timeframe_ms = timeframe_to_ms(timeframe)
+        bars, coverage = await loop.run_in_executor(None, load_cached_bars, exchange_id, symbol, timeframe, cache_dir)
+        series = {'bars': bars, 'coverage': coverage, 'lock': asyncio.Lock()}
+        last_closed_ms = bar_open(exchange.milliseconds(), timeframe_ms) - timeframe_ms
+        for since_ms, until_ms in merge_ranges(job_ranges, timeframe_ms):
+            for chunk in plan_chunks(coverage, since_ms, until_ms, timeframe_ms, last_closed_ms,
+                                     pages_per_chunk * limit * timeframe_ms):
+                tasks.append(run_chunk(series, symbol, timeframe, chunk))
+                labels.append((symbol, timeframe, chunk))
+
+    for label, result in zip(labels, await asyncio.gather(*tasks, return_exceptions=True)):
+        if isinstance(result, BaseException):
+            stats['failed'].append((*label, repr(result)))
+    return stats
+
+def create_async_exchange():
+    """Create the asyncio Binance client; rate limiting is left to the shared token bucket."""
+    import ccxt.async_support as ccxt_async
+    import key_file as k
+    return ccxt_async.binance({
+        'enableRateLimit': False,
+        'apiKey': k.binance_api_key,
+        'secret': k.binance_api_secret
+    })
+
+async def run_backfill(jobs, **kwargs):
+    """Create the exchange, backfill the jobs and always close the client's connections."""
+    exchange = create_async_exchange()
+    try:
+        return await backfill(exchange, jobs, **kwargs)
+    finally:
+        await exchange.close()
+
+if __name__ == '__main__':
+    import ta_lib_backtest as bt
+
+    parser = argparse.ArgumentParser(description='Backfill the bar cache concurrently.')
+    parser.add_argument('--symbols', nargs='+', default=['BTC/USDT', 'ETH/USDT', 'SOL/USDT'])
+    parser.add_argument('--timeframes', nargs='+', default=['1m'])
+    parser.add_argument('--start', default='2024-01-01')
+    parser.add_argument('--end', default='2024-06-30')
+    parser.add_argument('--rate', type=float, default=default_rate, help='Requests per second, shared by all tasks')
+    parser.add_argument('--concurrency', type=int, default=default_concurrency, help='Chunks downloading at once')
+    parser.add_argument('--pages-per-chunk', type=int, default=default_pages_per_chunk,
+                        help='Pages fetched between checkpoints')
+    parser.add_argument('--cache-dir', default=bt.cache_dir)
+    args = parser.parse_args()
+
+    since_ms, until_ms = bt.date_range_ms(args.start, args.end)
+    jobs = [(symbol, timeframe, since_ms, until_ms) for symbol in args.symbols for timeframe in args.timeframes]
+
+    def report(symbol, timeframe, chunk, n_bars):
+        print(f'{symbol} {timeframe}: saved {n_bars} bars from {chunk[0]} to {chunk[1]}')
+
+    start = time.perf_counter()
+    stats = asyncio.run(run_backfill(jobs, exchange_id=bt.exchange_id, cache_dir=args.cache_dir, rate=args.rate,
+                                     concurrency=args.concurrency, pages_per_chunk=args.pages_per_chunk,
+                                     progress=report))
+    print(f"Backfilled {stats['bars']} bars in {stats['pages']} pages and {stats['chunks']} chunks "
+          f"({stats['retries']} retries) in {time.perf_counter() - start:.1f}s")
+    for symbol, timeframe, chunk, error in stats['failed']:
+        print(f'Failed: {symbol} {timeframe} {chunk}: {error}')
+    if stats['failed']:
+        print('Run the same command again to resume the failed chunks.')
+        raise SystemExit(1)
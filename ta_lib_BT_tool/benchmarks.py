@@ -0,0 +1,353 @@
+# Offline benchmarks for the TA-Lib back-test pipeline
+#
+# Every stage runs on seeded synthetic bars (synthetic.py) served from a
+# temporary bar cache, so no keys or network are needed. Results can be saved
+# as a JSON baseline and compared against later runs to spot regressions.
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+import async_downloader
+import kernels
+import sweep
+import ta_lib_backtest as bt
+from metrics import performance_metrics
+from ohlcv_cache import fetch_bars, frame_to_bars, load_cached_bars, load_coverage, save_cached_bars, timeframe_to_ms
+from resample import resample_bars
+from results_io import save_results
+from streaming_indicators import StreamingEMA, StreamingRSI, StreamingSMA
+from simulation import signal_transitions, simulate_balances, simulate_balances_sparse, simulate_trades_loop
+from order_book import OrderBookStore, fill_orders, simulate_book_fills
+from synthetic import SyntheticClient, SyntheticExchange, synthetic_order_book, synthetic_ohlcv
+
+initial_usdt_balance = 1000  # Starting balance in USDT
+usd_per_trade = 100  # Amount in USD per trade
+
+benchmark_symbol = 'SYN/USDT'
+benchmark_timeframe = '1m'
+default_sizes = [10_000, 100_000, 1_000_000]
+stages = ['cli_startup', 'cli_run', 'fetch', 'resample_1h', 'calculate_indicator', 'generate_signals', 'simulate_trades', 'metrics',
+          'export_csv', 'export_npz', 'export_summary']
+tool_dir = os.path.dirname(os.path.abspath(__file__))
+
+def sma_signals(df, period=20):
+    """Build SMA crossover signals the same way generate_signals does."""
+    sma = df['close'].rolling(window=period).mean()
+    df['signal'] = 0
+    df.loc[df['close'] > sma, 'signal'] = 1  # Buy signal
+    df.loc[df['close'] < sma, 'signal'] = -1 # Sell signal
+    return df
+
+def time_call(func, *args, repeat=1):
+    """Return the best wall-clock time of func(*args) over `repeat` runs."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def check_equivalence(df, engine):
+    """Assert an array engine reproduces the df.loc loop column for column."""
+    reference = simulate_trades_loop(df.copy(), usd_per_trade, initial_usdt_balance)
+    balance_usdt, balance_btc, total_balance = engine(
+        df['close'].to_numpy(), df['signal'].to_numpy(), usd_per_trade, initial_usdt_balance)
+    assert np.array_equal(reference['balance_usdt'].to_numpy(), balance_usdt)
+    assert np.array_equal(reference['balance_btc'].to_numpy(), balance_btc)
+    assert np.array_equal(reference['total_balance'].to_numpy(), total_balance)
+
+def bench_simulation(sizes, legacy_max):
+    """Time the df.loc loop against the per-bar and event-driven array engines for each data size."""
+    print(f"{'bars':>10} {'trades':>8} {'loop (s)':>12} {'array (s)':>12} {'sparse (s)':>12} {'speedup':>10}")
+    for n_bars in sizes:
+        df = sma_signals(synthetic_ohlcv(n_bars))
+        close = df['close'].to_numpy()
+        signal = df['signal'].to_numpy()
+        buys, sells = signal_transitions(signal)
+        trades = int(buys.sum() + sells.sum())
+        array_time = time_call(simulate_balances, close, signal, usd_per_trade, initial_usdt_balance, repeat=3)
+        sparse_time = time_call(simulate_balances_sparse, close, signal, usd_per_trade, initial_usdt_balance, repeat=3)
+
+        if n_bars <= legacy_max:
+            check_equivalence(df, simulate_balances)
+            check_equivalence(df, simulate_balances_sparse)
+            loop_time = time_call(simulate_trades_loop, df.copy(), usd_per_trade, initial_usdt_balance)
+            print(f'{n_bars:>10} {trades:>8} {loop_time:>12.4f} {array_time:>12.4f} {sparse_time:>12.4f} '
+                  f'{loop_time / sparse_time:>9.1f}x')
+        else:
+            print(f"{n_bars:>10} {trades:>8} {'skipped':>12} {array_time:>12.4f} {sparse_time:>12.4f} {'-':>10}")
+
+def bench_kernels(sizes):
+    """Time every available simulation kernel engine and print the cost per bar."""
+    print(f"{'kernel':<16} {'engine':<8} {'bars':>10} {'seconds':>10} {'ns/bar':>10}")
+    for n_bars in sizes:
+        df = sma_signals(synthetic_ohlcv(n_bars))
+        close = df['close'].to_numpy()
+        signal = df['signal'].to_numpy()
+        reference = None
+        for engine in kernels.engines:
+            kernels.simulate_fixed_steps(close[:100], signal[:100], engine=engine)  # Compile outside the timing
+            kernels.simulate_flips(close[:100], signal[:100], usd_per_trade, initial_usdt_balance, engine=engine)
+            results = [kernels.simulate_flips(close, signal, usd_per_trade, initial_usdt_balance, engine=engine),
+                       kernels.simulate_fixed_steps(close, signal, engine=engine)]
+            if reference is None:
+                reference = results
+            # The engines must agree bit for bit
+            assert all(np.array_equal(a, b) for got, want in zip(results, reference) for a, b in zip(got, want))
+            for name, func, args in [
+                    ('flips', kernels.simulate_flips, (close, signal, usd_per_trade, initial_usdt_balance)),
+                    ('fixed_steps', kernels.simulate_fixed_steps, (close, signal))]:
+                seconds = time_call(lambda: func(*args, engine=engine), repeat=3)
+                print(f'{name:<16} {engine:<8} {n_bars:>10} {seconds:>10.4f} {seconds / n_bars * 1e9:>10.1f}')
+
+def bench_book(sizes, depth=20):
+    """Time book-walking fills: n random orders against n synthetic snapshots, then a back-test on them."""
+    print(f"{'orders':>10} {'snapshots':>10} {'fill (s)':>10} {'us/order':>10} {'backtest (s)':>13}")
+    for n in sizes:
+        df = sma_signals(synthetic_ohlcv(n))
+        close = df['close'].to_numpy()
+        timestamps = df['timestamp'].to_numpy().astype('datetime64[ms]').astype(np.int64)
+        store = OrderBookStore(depth)
+        store.arrays = synthetic_order_book(timestamps, close, depth)
+        rng = np.random.default_rng(42)
+        order_times = rng.integers(timestamps[0], timestamps[-1], n)
+        sides = rng.choice([1, -1], n)
+        amounts = np.where(sides == 1, usd_per_trade, usd_per_trade / close.mean())  # USDT buys, BTC sells
+        fill_time = time_call(fill_orders, store, order_times, sides, amounts, sides == 1, repeat=3)
+        backtest_time = time_call(simulate_book_fills, timestamps, close, df['signal'].to_numpy(), store,
+                                  usd_per_trade, initial_usdt_balance, repeat=3)
+        print(f'{n:>10} {len(store):>10} {fill_time:>10.4f} {fill_time / n * 1e6:>10.2f} {backtest_time:>13.4f}')
+
+def bench_download(symbols=4, timeframes=('1m', '5m'), days=14, latency_s=0.05):
+    """Time a backfill from a synthetic exchange with `latency_s` per request, serially and concurrently."""
+    since_ms, until_ms = bt.date_range_ms('2024-06-01', f'2024-06-{days:02d}')
+    jobs = [(f'SYN{j}/USDT', timeframe, since_ms, until_ms) for j in range(symbols) for timeframe in timeframes]
+    print(f"{'concurrency':>12} {'pages':>8} {'bars':>10} {'seconds':>10} {'pages/s':>10}")
+    for concurrency in [1, async_downloader.default_concurrency]:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            exchange = SyntheticExchange(until_ms + 86_400_000, latency_s=latency_s)
+            start = time.perf_counter()
+            stats = asyncio.run(async_downloader.backfill(exchange, jobs, cache_dir=tmp_dir, rate=1000,
+                                                          concurrency=concurrency, pages_per_chunk=2))
+            seconds = time.perf_counter() - start
+        print(f"{concurrency:>12} {stats['pages']:>8} {stats['bars']:>10} {seconds:>10.2f} {stats['pages'] / seconds:>10.1f}")
+
+def check_cache_ranges():
+    """Assert overlapping, adjacent and live-edge requests return every bar exactly once, fetching each once."""
+    timeframe_ms = timeframe_to_ms('1h')
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        exchange = SyntheticClient(bt.date_range_ms('2024-08-01', '2024-08-01')[0])
+
+        def fetch(start_date, end_date, since_offset_ms=0):
+            since_ms, until_ms = bt.date_range_ms(start_date, end_date)
+            bars = fetch_bars(exchange, 'SYN/USDT', '1h', since_ms + since_offset_ms, until_ms, cache_dir=tmp_dir)
+            first = -(-(since_ms + since_offset_ms) // timeframe_ms) * timeframe_ms
+            expected = np.arange(first, until_ms + 1, timeframe_ms)
+            assert np.array_equal(bars['timestamp'], expected), (start_date, end_date, len(bars['timestamp']))
+            return bars
+
+        fetch('2024-06-01', '2024-06-30')
+        assert len(fetch('2024-06-15', '2024-07-15')['timestamp']) == 744  # Overlapping: 07-01 00:00 included
+        fetch('2024-07-16', '2024-07-20')  # Adjacent
+        fetch('2024-06-03', '2024-06-05', since_offset_ms=30 * 60_000)  # Starting mid-bar
+        calls = exchange.calls
+        fetch('2024-06-01', '2024-07-20')
+        assert exchange.calls == calls, 'a covered range was downloaded again'
+        assert load_coverage(bt.exchange_id, 'SYN/USDT', '1h', tmp_dir) == [
+            [bt.date_range_ms('2024-06-01', '2024-06-01')[0], bt.date_range_ms('2024-07-20', '2024-07-20')[1] + 1000 - timeframe_ms]]
+
+        # Live edge: the forming bar is left out, then fetched once it has closed
+        exchange.now_ms = bt.date_range_ms('2024-07-21', '2024-07-21')[0] + 10 * timeframe_ms + 30 * 60_000
+        bars = fetch_bars(exchange, 'SYN/USDT', '1h', *bt.date_range_ms('2024-07-21', '2024-07-21'), cache_dir=tmp_dir)
+        assert len(bars['timestamp']) == 10
+        exchange.now_ms += 3 * timeframe_ms
+        bars = fetch_bars(exchange, 'SYN/USDT', '1h', *bt.date_range_ms('2024-07-21', '2024-07-21'), cache_dir=tmp_dir)
+        assert np.array_equal(np.diff(bars['timestamp']), np.full(12, timeframe_ms))
+
+        # The concurrent backfill: mid-bar start, small chunks and a mid-bar live edge, then resumed
+        exchange = SyntheticExchange(bt.date_range_ms('2024-08-02', '2024-08-02')[0] + 30 * 60_000)
+        since_ms, until_ms = bt.date_range_ms('2024-08-01', '2024-08-01')
+        jobs = [('SYN/USDT', '1h', since_ms + 30 * 60_000, until_ms + 86_400_000)]
+        asyncio.run(async_downloader.backfill(exchange, jobs, cache_dir=tmp_dir, limit=5, pages_per_chunk=1))
+        bars, coverage = load_cached_bars(bt.exchange_id, 'SYN/USDT', '1h', tmp_dir)
+        assert coverage[-1][1] == until_ms + 1000 - timeframe_ms, coverage
+        exchange.now_ms += 5 * timeframe_ms
+        asyncio.run(async_downloader.backfill(exchange, jobs, cache_dir=tmp_dir, limit=5, pages_per_chunk=1))
+        bars, coverage = load_cached_bars(bt.exchange_id, 'SYN/USDT', '1h', tmp_dir)
+        expected = np.arange(since_ms + timeframe_ms, until_ms + 1000 + 5 * timeframe_ms, timeframe_ms)
+        assert np.array_equal(bars['timestamp'][-len(expected):], expected), len(bars['timestamp'])
+        assert coverage[-1] == [expected[0], expected[-1]], coverage
+    print('Bar cache ranges: overlapping, adjacent, mid-bar and live-edge fetches and backfills are complete')
+
+def check_resampled_sweep(n_bars=20_000):
+    """Assert a sweep over 1h bars resampled from cached 1m bars gives the workers the resampled bars."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        bt.cache_dir, bt.offline, bt.resample_from = tmp_dir, True, benchmark_timeframe
+        start_date, end_date = cache_synthetic_bars(n_bars, tmp_dir)
+        expected = len(bt.load_bars(benchmark_symbol, '1h', *bt.date_range_ms(start_date, end_date))['timestamp'])
+        summary = sweep.run_sweep([benchmark_symbol], '1h', ['SMA', 'VWAP'], [10, 20], start_date, end_date, workers=2)
+        assert expected > 0 and (summary['bars'] == expected).all(), (expected, summary['bars'].tolist())
+    print(f'Resampled sweep: every worker back-tested the {expected} resampled 1h bars')
+
+def check_streaming(periods=range(2, 201), n_bars=2000):
+    """Assert the streaming SMA, EMA and RSI equal TA-Lib exactly, for every period and several price scales."""
+    import talib
+    streams = [('SMA', StreamingSMA, talib.SMA), ('EMA', StreamingEMA, talib.EMA), ('RSI', StreamingRSI, talib.RSI)]
+    for scale in [1e-6, 0.5, 60000.0, 1e7]:
+        close = synthetic_ohlcv(n_bars, start_price=scale)['close'].to_numpy(dtype=np.float64)
+        closes = close.tolist()
+        for name, stream_class, batch in streams:
+            for period in periods:
+                stream = stream_class(period)
+                values = np.array([stream.update(c) for c in closes])
+                assert np.array_equal(values, batch(close, timeperiod=period), equal_nan=True), (name, period, scale)
+    print(f'Streaming SMA, EMA and RSI equal TA-Lib for periods {periods.start}-{periods.stop - 1}')
+
+def cache_synthetic_bars(n_bars, cache_dir):
+    """Write n_bars synthetic bars into a bar cache and return the dates they span."""
+    df = synthetic_ohlcv(n_bars, timeframe_ms=timeframe_to_ms(benchmark_timeframe))
+    bars = {col: df[col].to_numpy() for col in ['open', 'high', 'low', 'close', 'volume']}
+    bars['timestamp'] = df['timestamp'].to_numpy().astype('datetime64[ms]').astype(np.int64)
+    start_date = df['timestamp'].iloc[0].strftime('%Y-%m-%d')
+    end_date = df['timestamp'].iloc[-1].strftime('%Y-%m-%d')
+    # Mark whole days as downloaded so fetch_ohlcv's day bounds are served from the cache
+    coverage = [list(bt.date_range_ms(start_date, end_date))]
+    save_cached_bars(bt.exchange_id, benchmark_symbol, benchmark_timeframe, bars, coverage, cache_dir)
+    return start_date, end_date
+
+def run_python(args, cwd):
+    """Run a fresh interpreter with this folder importable, failing loudly if it errors."""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [tool_dir, os.environ.get('PYTHONPATH')])))
+    subprocess.run([sys.executable, *args], cwd=cwd, env=env, check=True, stdout=subprocess.DEVNULL)
+
+def bench_stages(sizes, indicator='SMA', period=20, repeat=3):
+    """Time each pipeline stage separately and return {stage: {n_bars: seconds}}."""
+    results = {stage: {} for stage in stages}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        bt.cache_dir = tmp_dir
+        for n_bars in sizes:
+            start_date, end_date = cache_synthetic_bars(n_bars, tmp_dir)
+            df = bt.fetch_ohlcv(benchmark_symbol, benchmark_timeframe, start_date, end_date)
+
+            def calculate():
+                bt.indicator_cache.clear()  # Time a cold computation, not a cache hit
+                bt.calculate_indicator(df, indicator, period)
+
+            results_filename = os.path.join(tmp_dir, 'results')
+            cli_args = [os.path.join(tool_dir, 'run_backtest.py'), '--symbol', benchmark_symbol,
+                        '--timeframe', benchmark_timeframe, '--indicator', indicator, '--period', str(period),
+                        '--start', start_date, '--end', end_date, '--format', 'summary',
+                        '--offline', '--cache-dir', tmp_dir]
+            # Fresh processes: the import cost of the CLI, then a whole offline run from the cache
+            results['cli_startup'][str(n_bars)] = time_call(run_python, ['-c', 'import run_backtest'], tmp_dir,
+                                                            repeat=repeat)
+            results['cli_run'][str(n_bars)] = time_call(run_python, cli_args, tmp_dir, repeat=repeat)
+            results['fetch'][str(n_bars)] = time_call(
+                bt.fetch_ohlcv, benchmark_symbol, benchmark_timeframe, start_date, end_date, repeat=repeat)
+            results['resample_1h'][str(n_bars)] = time_call(resample_bars, frame_to_bars(df), '1h', repeat=repeat)
+            results['calculate_indicator'][str(n_bars)] = time_call(calculate, repeat=repeat)
+            results['generate_signals'][str(n_bars)] = time_call(bt.generate_signals, df, indicator, repeat=repeat)
+            results['simulate_trades'][str(n_bars)] = time_call(
+                bt.simulate_trades, df, usd_per_trade, initial_usdt_balance, repeat=repeat)
+            results['metrics'][str(n_bars)] = time_call(
+                performance_metrics, df['balance_usdt'], df['balance_btc'], df['total_balance'], repeat=repeat)
+            for results_format in ['csv', 'npz', 'summary']:
+                results[f'export_{results_format}'][str(n_bars)] = time_call(
+                    save_results, df, results_filename, results_format)
+    return results
+
+def print_stages(results, baseline=None, threshold=1.2):
+    """Print the stage table, with ratios to a baseline if given, and return the regressions."""
+    regressions = []
+    sizes = list(results[stages[0]])
+    print(f"{'stage':<22}" + ''.join(f'{n:>22}' for n in sizes))
+    for stage in stages:
+        cells = []
+        for n in sizes:
+            cell = f'{results[stage][n]:.4f}s'
+            base = (baseline or {}).get(stage, {}).get(n)
+            if base:
+                ratio = results[stage][n] / base
+                cell += f' ({ratio:.2f}x)'
+                if ratio > threshold:
+                    regressions.append((stage, n, ratio))
+            cells.append(cell)
+        print(f'{stage:<22}' + ''.join(f'{c:>22}' for c in cells))
+    return regressions
+
+def save_baseline(results, path):
+    """Write stage timings plus the versions they were measured with to a JSON file."""
+    payload = {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'stages': results,
+    }
+    with open(path, 'w') as f:
+        json.dump(payload, f, indent=2)
+    print(f'Benchmark baseline saved to {path}')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the back-test pipeline offline.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=default_sizes)
+    parser.add_argument('--indicator', default='SMA', choices=list(bt.indicator_inputs))
+    parser.add_argument('--period', type=int, default=20)
+    parser.add_argument('--save', metavar='JSON', help='Save the stage timings as a baseline')
+    parser.add_argument('--compare', metavar='JSON', help='Compare the stage timings with a saved baseline')
+    parser.add_argument('--threshold', type=float, default=1.2,
+                        help='Slowdown ratio against the baseline that counts as a regression')
+    parser.add_argument('--loop', action='store_true',
+                        help='Compare the array engine with the original df.loc loop instead')
+    parser.add_argument('--kernels', action='store_true',
+                        help='Time the Numba and pure-Python simulation kernels per bar instead')
+    parser.add_argument('--book', action='store_true',
+                        help='Time order-book fills against synthetic L2 snapshots instead')
+    parser.add_argument('--download', action='store_true',
+                        help='Time a serial and a concurrent backfill from a synthetic exchange instead')
+    parser.add_argument('--check-cache', action='store_true',
+                        help='Check the bar cache returns every bar across overlapping and adjacent fetches instead')
+    parser.add_argument('--check-sweep', action='store_true',
+                        help='Check a sweep with resample_from runs on the resampled bars instead')
+    parser.add_argument('--check-streaming', action='store_true',
+                        help='Check the streaming indicators equal TA-Lib exactly instead')
+    parser.add_argument('--legacy-max', type=int, default=100_000,
+                        help='Largest size to run (and check) the df.loc loop on')
+    args = parser.parse_args()
+
+    if args.loop:
+        bench_simulation(args.sizes, args.legacy_max)
+    elif args.kernels:
+        bench_kernels(args.sizes)
+    elif args.book:
+        bench_book(args.sizes)
+    elif args.download:
+        bench_download()
+    elif args.check_cache:
+        check_cache_ranges()
+    elif args.check_sweep:
+        check_resampled_sweep()
+    elif args.check_streaming:
+        check_streaming()
+    else:
+        results = bench_stages(args.sizes, args.indicator, args.period)
+        baseline = None
+        if args.compare:
+            with open(args.compare) as f:
+                baseline = json.load(f)['stages']
+        regressions = print_stages(results, baseline, args.threshold)
+        if args.save:
+            save_baseline(results, args.save)
+        for stage, n, ratio in regressions:
+            print(f'Regression: {stage} at {n} bars took {ratio:.2f}x the baseline')
+        if regressions:
+            raise SystemExit(1)
@@ -0,0 +1,73 @@
+# Chart rendering for TA-Lib back-test results
+
+import os
+
+import matplotlib.pyplot as plt
+
+from results_io import load_results
+
+def chart_filenames(output_dir, symbol, timeframe, indicator, start_date, end_date):
+    """Return the (price, balance) PNG paths for one back-test."""
+    suffix = f'{symbol.replace("/", "_")}_{timeframe}_{start_date}_{end_date}.png'
+    return (os.path.join(output_dir, f'{indicator}_backtest_results_price_{suffix}'),
+            os.path.join(output_dir, f'{indicator}_backtest_results_balance_{suffix}'))
+
+def build_figures(df, symbol, timeframe, indicator):
+    """Build the price/indicator and balance figures for a back-test DataFrame."""
+    fig_price, ax1 = plt.subplots(figsize=(12, 6))
+
+    # Plot price and indicator in the first chart
+    ax1.plot(df['timestamp'], df['close'], label='Close Price')
+    ax1.plot(df['timestamp'], df['indicator'], label=indicator)
+
+    # Plot buy signals
+    buy_signals = df[df['signal'] == 1]
+    ax1.plot(buy_signals['timestamp'], buy_signals['close'], '^', markersize=10, color='g', label='Buy Signal')
+
+    # Plot sell signals
+    sell_signals = df[df['signal'] == -1]
+    ax1.plot(sell_signals['timestamp'], sell_signals['close'], 'v', markersize=10, color='r', label='Sell Signal')
+
+    ax1.legend()
+    ax1.set_title(f'{indicator} Back-Test Results for {symbol} ({timeframe})')
+    ax1.set_xlabel('Date')
+    ax1.set_ylabel('Price')
+    ax1.grid()
+
+    # Plot total balance in a separate chart
+    fig_balance, ax2 = plt.subplots(figsize=(12, 6))
+    ax2.plot(df['timestamp'], df['total_balance'], label='Total Balance')
+    ax2.legend()
+    ax2.set_title(f'Balance Over Time for {symbol} ({timeframe})')
+    ax2.set_xlabel('Date')
+    ax2.set_ylabel('Total Balance')
+    ax2.grid()
+
+    return fig_price, fig_balance
+
+def plot_backtest(df, symbol, timeframe, indicator, start_date, end_date, output_dir, show=True):
+    """Save both charts for a back-test, optionally show them, and free the figures."""
+    plt_filename_price, plt_filename_balance = chart_filenames(output_dir, symbol, timeframe, indicator, start_date, end_date)
+    fig_price, fig_balance = build_figures(df, symbol, timeframe, indicator)
+
+    fig_price.savefig(plt_filename_price)
+    print(f'Back-test price chart saved to {plt_filename_price}')
+    fig_balance.savefig(plt_filename_balance)
+    print(f'Back-test balance chart saved to {plt_filename_balance}')
+
+    if show:
+        plt.show()
+    plt.close(fig_price)
+    plt.close(fig_balance)
+    return plt_filename_price, plt_filename_balance
+
+def render_from_results(results_filename, symbol, timeframe, indicator, start_date, end_date, output_dir):
+    """Render the charts from an exported CSV or .npz results file; meant to run in a chart worker process."""
+    plt.switch_backend('Agg')
+    df = load_results(results_filename)
+    return plot_backtest(df, symbol, timeframe, indicator, start_date, end_date, output_dir, show=False)
+
+def report_chart_failure(future):
+    """Done-callback for deferred renders: print the error instead of dropping it silently."""
+    if future.exception() is not None:
+        print(f'Back-test chart rendering failed: {future.exception()!r}')
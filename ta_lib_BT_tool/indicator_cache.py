@@ -0,0 +1,86 @@
+# Memory-bounded LRU cache for computed indicator columns
+
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
+
+default_max_bytes = 256 * 1024 * 1024  # 256 MB of indicator arrays
+
+def data_fingerprint(*arrays):
+    """Return a content hash identifying the given input arrays."""
+    digest = hashlib.sha256()
+    for arr in arrays:
+        arr = np.ascontiguousarray(arr)
+        digest.update(f'{arr.dtype.str}{arr.shape}'.encode())
+        digest.update(memoryview(arr).cast('B'))
+    return digest.hexdigest()
+
+class IndicatorCache:
+    """LRU cache of {column name: array} results keyed by (fingerprint, indicator, params).
+
+    Entries are evicted least-recently-used first once the cached arrays exceed
+    `max_bytes`. Cached arrays are marked read-only since they are shared
+    between every caller that hits the same key.
+    """
+
+    def __init__(self, max_bytes=default_max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Return the cached columns for key (marking them recently used), or None."""
+        columns = self.entries.get(key)
+        if columns is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return columns
+
+    def put(self, key, columns):
+        """Store columns under key, evicting old entries to stay within max_bytes."""
+        size = sum(arr.nbytes for arr in columns.values())
+        if size > self.max_bytes:
+            return columns  # Too large to ever fit, hand it back uncached
+        if key in self.entries:
+            self.nbytes -= sum(arr.nbytes for arr in self.entries.pop(key).values())
+        for arr in columns.values():
+            arr.flags.writeable = False
+        self.entries[key] = columns
+        self.nbytes += size
+        while self.nbytes > self.max_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.nbytes -= sum(arr.nbytes for arr in evicted.values())
+            self.evictions += 1
+        return columns
+
+    def get_or_compute(self, key, compute):
+        """Return the cached columns for key, calling compute() and caching on a miss."""
+        columns = self.get(key)
+        if columns is None:
+            columns = self.put(key, compute())
+        return columns
+
+    def clear(self):
+        """Drop every entry and reset the statistics."""
+        self.entries.clear()
+        self.nbytes = 0
+        self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        """Return hit/miss counters and memory use as a dict."""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'entries': len(self.entries),
+            'bytes': self.nbytes,
+            'max_bytes': self.max_bytes,
+        }
@@ -0,0 +1,63 @@
+# Multi-period indicators computed as one (bars x periods) matrix
+
+import numpy as np
+
+matrix_indicators = ['SMA', 'EMA', 'RSI']
+
+def sma_matrix(close, periods):
+    """Return SMAs for every period from one prefix sum, shape (bars, len(periods)).
+
+    Matches talib.SMA up to floating-point rounding. The series is centred on
+    its first value before summing so the prefix sums stay small.
+    """
+    close = np.asarray(close, dtype=np.float64)
+    periods = np.asarray(periods, dtype=np.int64)
+    n = len(close)
+    matrix = np.full((n, len(periods)), np.nan)
+    if n == 0:
+        return matrix
+
+    offset = close[0]
+    prefix = np.zeros(n + 1)
+    np.cumsum(close - offset, out=prefix[1:])
+
+    rows = np.arange(n)[:, None]
+    starts = rows + 1 - periods[None, :]
+    valid = starts >= 0
+    window_sums = prefix[rows + 1] - prefix[np.where(valid, starts, 0)]
+    matrix[valid] = (window_sums / periods[None, :] + offset)[valid]
+    return matrix
+
+def indicator_matrix(close, indicator, periods):
+    """Compute `indicator` for every period into a float64 (bars x periods) matrix."""
+    close = np.asarray(close, dtype=np.float64)
+    if indicator == 'SMA':
+        return sma_matrix(close, periods)
+    if indicator not in matrix_indicators:
+        raise ValueError(f"Unsupported indicator for a period matrix: {indicator}")
+
+    # EMA and RSI are recursive, so each column comes straight from TA-Lib into the matrix
+    import talib
+    func = talib.EMA if indicator == 'EMA' else talib.RSI
+    matrix = np.empty((len(close), len(periods)))
+    for j, period in enumerate(periods):
+        matrix[:, j] = func(close, timeperiod=int(period))
+    return matrix
+
+def signal_matrix(close, matrix, indicator):
+    """Generate buy (1) / sell (-1) / hold (0) signals for every column of an indicator matrix.
+
+    `close` is either one series shared by every column (periods of one
+    symbol) or a matrix shaped like `matrix` (one column per symbol).
+    """
+    close = np.asarray(close, dtype=np.float64)
+    if close.ndim == 1:
+        close = close[:, None]
+    signals = np.zeros(matrix.shape, dtype=np.int8)
+    if indicator in ['SMA', 'EMA', 'VWAP', 'VWMA']:
+        signals[close > matrix] = 1  # Buy signal
+        signals[close < matrix] = -1 # Sell signal
+    elif indicator == 'RSI':
+        signals[matrix < 30] = 1  # Buy signal
+        signals[matrix > 70] = -1 # Sell signal
+    return signals
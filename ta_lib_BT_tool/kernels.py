@@ -0,0 +1,103 @@
+# Pluggable per-bar trade simulation kernels, JIT-compiled when Numba is installed
+#
+# Some trade rules are path dependent (the cash check before a buy, the fixed
+# $5 steps of SMA_BT_2.py and RSI_BT.py), so they are written as plain loops
+# over the bars. Each loop is compiled with numba.njit when Numba is available;
+# otherwise the same function runs as a Python loop over lists. Both engines do
+# the same float64 operations in the same order, so their results are identical.
+
+import numpy as np
+
+try:
+    import numba
+except ImportError:  # Numba is optional
+    numba = None
+
+engines = ['numba', 'python'] if numba is not None else ['python']
+default_engine = engines[0]
+
+def flip_loop(close, signal, usd_per_trade, balance_usdt, balance_btc, usdt_out, btc_out):
+    """simulate_trades rules: buy usd_per_trade when the signal flips to 1, sell everything when it flips to -1."""
+    usdt_out[0] = balance_usdt
+    btc_out[0] = balance_btc
+    for i in range(1, len(close)):
+        if signal[i] == 1 and signal[i - 1] != 1:  # Buy signal
+            btc_to_buy = usd_per_trade / close[i]
+            if balance_usdt >= usd_per_trade:
+                balance_btc += btc_to_buy
+                balance_usdt -= usd_per_trade
+        elif signal[i] == -1 and signal[i - 1] != -1:  # Sell signal
+            usdt_to_sell = balance_btc * close[i]
+            balance_usdt += usdt_to_sell
+            balance_btc = 0.0
+        usdt_out[i] = balance_usdt
+        btc_out[i] = balance_btc
+
+def fixed_step_loop(close, signal, trade_usd, start, balance_usdt, balance_btc, usdt_out, btc_out, action_out):
+    """SMA_BT_2 / RSI_BT rules: on every bar from `start`, buy or sell a fixed `trade_usd` while the signal holds."""
+    for i in range(len(close)):
+        action_out[i] = 0
+        if i >= start:
+            if signal[i] == 1:  # Buy signal
+                if balance_usdt >= trade_usd:
+                    btc_amount = trade_usd / close[i]
+                    balance_btc += btc_amount
+                    balance_usdt -= trade_usd
+                    action_out[i] = 1
+            elif signal[i] == -1:  # Sell signal
+                if balance_btc * close[i] >= trade_usd:
+                    usdt_amount = trade_usd
+                    btc_amount = trade_usd / close[i]
+                    balance_btc -= btc_amount
+                    balance_usdt += usdt_amount
+                    action_out[i] = -1
+        usdt_out[i] = balance_usdt
+        btc_out[i] = balance_btc
+
+compiled = {}
+if numba is not None:
+    compiled['flip_loop'] = numba.njit(cache=True)(flip_loop)
+    compiled['fixed_step_loop'] = numba.njit(cache=True)(fixed_step_loop)
+
+def run_kernel(name, engine, arrays, scalars, n_out, out_dtypes):
+    """Run kernel `name` on the chosen engine and return its output arrays."""
+    engine = engine or default_engine
+    if engine not in engines:
+        raise ValueError(f"Unsupported simulation engine: {engine} (available: {', '.join(engines)})")
+    n = len(arrays[0])
+    if engine == 'numba':
+        outputs = [np.empty(n, dtype=dtype) for dtype in out_dtypes]
+        compiled[name](*arrays, *scalars, *outputs)
+        return outputs
+    # Python floats and lists keep the fallback loop fast and do the same float64 arithmetic
+    outputs = [[0] * n for _ in range(n_out)]
+    globals()[name](*(arr.tolist() for arr in arrays), *scalars, *outputs)
+    return [np.array(out, dtype=dtype) for out, dtype in zip(outputs, out_dtypes)]
+
+def simulate_flips(close, signal, usd_per_trade, initial_usdt_balance, initial_btc_balance=0, engine=None):
+    """Kernel version of simulation.simulate_balances; returns (balance_usdt, balance_btc, total_balance)."""
+    close = np.ascontiguousarray(close, dtype=np.float64)
+    signal = np.ascontiguousarray(signal, dtype=np.int64)
+    if not len(close):
+        return np.empty(0), np.empty(0), np.empty(0)
+    balance_usdt, balance_btc = run_kernel(
+        'flip_loop', engine, [close, signal],
+        [float(usd_per_trade), float(initial_usdt_balance), float(initial_btc_balance)],
+        2, [np.float64, np.float64])
+    return balance_usdt, balance_btc, balance_usdt + balance_btc * close
+
+def simulate_fixed_steps(close, signal, trade_usd=5, start=0, initial_usdt_balance=1000, initial_btc_balance=0,
+                         engine=None):
+    """Simulate the fixed-size trades of SMA_BT_2.py and RSI_BT.py.
+
+    Returns (balance_usdt, balance_btc, action) per bar, where action is 1 for
+    an executed buy, -1 for an executed sell and 0 otherwise.
+    """
+    close = np.ascontiguousarray(close, dtype=np.float64)
+    signal = np.ascontiguousarray(signal, dtype=np.int64)
+    if not len(close):
+        return np.empty(0), np.empty(0), np.empty(0, dtype=np.int8)
+    return run_kernel(
+        'fixed_step_loop', engine, [close, signal],
+        [float(trade_usd), int(start), float(initial_usdt_balance), float(initial_btc_balance)],
+        3, [np.float64, np.float64, np.int8])
@@ -0,0 +1,114 @@
+# Vectorized performance metrics for simulated balances
+#
+# Every function takes the balance arrays returned by the simulation engines,
+# either one run (1D, one value per bar) or a sweep matrix (2D, bars x runs),
+# and computes its metric with whole-array NumPy operations along the bar
+# axis. For 1D input a scalar is returned, for 2D input one value per run.
+
+import numpy as np
+
+from ohlcv_cache import timeframe_to_ms
+
+year_ms = 365 * 24 * 60 * 60 * 1000
+
+def periods_per_year(timeframe):
+    """Return how many bars of a ccxt timeframe fit in a year, for annualizing."""
+    return year_ms / timeframe_to_ms(timeframe)
+
+def as_matrix(values):
+    """Return values as a float64 (bars x runs) matrix and whether the input was 1D."""
+    values = np.asarray(values, dtype=np.float64)
+    if values.ndim == 1:
+        return values[:, None], True
+    return values, False
+
+def per_run(values, single):
+    """Unwrap a per-run result back to a scalar for 1D input."""
+    return values[0].item() if single else values
+
+def bar_returns(total_balance):
+    """Return the simple per-bar returns of the equity curves, one row shorter."""
+    total, _ = as_matrix(total_balance)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.diff(total, axis=0) / total[:-1]
+
+def sharpe_ratio(total_balance, periods_per_year=1.0):
+    """Annualized Sharpe ratio of the per-bar returns (zero risk-free rate); NaN for a flat curve."""
+    total, single = as_matrix(total_balance)
+    runs = total.shape[1]
+    if len(total) < 3:
+        return per_run(np.full(runs, np.nan), single)
+    returns = bar_returns(total)
+    mean = returns.mean(axis=0)
+    std = returns.std(axis=0, ddof=1)
+    sharpe = np.full(runs, np.nan)
+    np.divide(mean, std, out=sharpe, where=std > 0)
+    return per_run(sharpe * np.sqrt(periods_per_year), single)
+
+def max_drawdown_pct(total_balance):
+    """Largest peak-to-trough fall of the equity curves, in percent of the peak."""
+    total, single = as_matrix(total_balance)
+    if not len(total):
+        return per_run(np.zeros(total.shape[1]), single)
+    peak = np.maximum.accumulate(total, axis=0)
+    return per_run((1 - (total / peak).min(axis=0)) * 100, single)
+
+def exposure_pct(balance_btc):
+    """Share of bars spent holding a position, in percent."""
+    btc, single = as_matrix(balance_btc)
+    if not len(btc):
+        return per_run(np.zeros(btc.shape[1]), single)
+    return per_run((btc != 0).mean(axis=0) * 100, single)
+
+def trade_count(balance_btc):
+    """Number of executed buys and sells (bars where the position changed)."""
+    btc, single = as_matrix(balance_btc)
+    return per_run(np.count_nonzero(btc[1:] != btc[:-1], axis=0), single)
+
+def round_trips(balance_usdt, balance_btc):
+    """Return (closed positions, winning positions) per run.
+
+    A position runs from the first buy after being flat to the sell that
+    empties it; it wins if the USDT balance after the sell is above the USDT
+    balance right before that first buy.
+    """
+    usdt, single = as_matrix(balance_usdt)
+    btc, _ = as_matrix(balance_btc)
+    flat = btc == 0
+    closes = ~flat[:-1] & flat[1:]
+    # Close events ordered run by run; a flat account's USDT only changes at a close, so
+    # each position started from the previous close's USDT (or the first bar's)
+    runs, rows = np.nonzero(closes.T)
+    exit_usdt = usdt[rows + 1, runs]
+    entry_usdt = np.empty_like(exit_usdt)
+    entry_usdt[1:] = exit_usdt[:-1]
+    if len(runs):
+        first = np.ones(len(runs), dtype=bool)
+        first[1:] = runs[1:] != runs[:-1]
+        entry_usdt[first] = usdt[0, runs[first]]
+    wins = np.bincount(runs, weights=exit_usdt > entry_usdt, minlength=usdt.shape[1]).astype(np.int64)
+    closed = np.bincount(runs, minlength=usdt.shape[1])
+    return per_run(closed, single), per_run(wins, single)
+
+def win_rate_pct(balance_usdt, balance_btc):
+    """Share of closed positions that made money, in percent; NaN if none were closed."""
+    return percent_of(*round_trips(balance_usdt, balance_btc)[::-1])
+
+def percent_of(part, whole):
+    """part / whole in percent, element-wise, with NaN where whole is zero."""
+    part, whole = np.asarray(part, dtype=np.float64), np.asarray(whole, dtype=np.float64)
+    rate = np.full(whole.shape, np.nan)
+    np.divide(part * 100, whole, out=rate, where=whole > 0)
+    return rate.item() if rate.ndim == 0 else rate
+
+def performance_metrics(balance_usdt, balance_btc, total_balance, periods_per_year=1.0):
+    """Compute every metric for one run (scalars) or a bars x runs matrix (one array per metric)."""
+    closed, wins = round_trips(balance_usdt, balance_btc)
+    return {
+        'sharpe': sharpe_ratio(total_balance, periods_per_year),
+        'max_drawdown_pct': max_drawdown_pct(total_balance),
+        'exposure_pct': exposure_pct(balance_btc),
+        'win_rate_pct': percent_of(wins, closed),
+        'trades': trade_count(balance_btc),
+        'round_trips': closed,
+    }
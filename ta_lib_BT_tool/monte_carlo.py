@@ -0,0 +1,131 @@
+# Monte Carlo robustness runs over resampled price paths
+#
+# Thousands of alternative close series are derived from one cached series,
+# either by block-bootstrapping its log returns or by adding noise to them,
+# and stacked as one (bars x paths) matrix. Indicators, signals and trades are
+# then evaluated for every path at once, giving distributions of the final
+# balance and the maximum drawdown instead of a single outcome.
+
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+import ta_lib_backtest as bt
+from indicator_matrix import signal_matrix
+from metrics import max_drawdown_pct, trade_count
+from ohlcv_cache import bars_to_frame
+from portfolio import portfolio_indicator
+from simulation import simulate_balances_matrix
+
+path_methods = ['bootstrap', 'noise']
+quantiles = [0.05, 0.25, 0.5, 0.75, 0.95]
+
+def bootstrap_paths(close, n_paths, block_size=24, seed=42):
+    """Return a (bars x n_paths) matrix of closes rebuilt from randomly drawn blocks of log returns.
+
+    Blocks keep short-range structure (volatility clusters, trends) that
+    drawing single returns would destroy. Every path starts at close[0].
+    """
+    close = np.asarray(close, dtype=np.float64)
+    returns = np.diff(np.log(close))
+    n_returns = len(returns)
+    block_size = max(1, min(block_size, n_returns))
+    rng = np.random.default_rng(seed)
+    n_blocks = -(-n_returns // block_size)
+    starts = rng.integers(0, n_returns - block_size + 1, size=(n_blocks, n_paths))
+    rows = (starts[:, None, :] + np.arange(block_size)[None, :, None]).reshape(-1, n_paths)[:n_returns]
+    return returns_to_paths(close[0], returns[rows])
+
+def noise_paths(close, n_paths, noise_scale=0.5, seed=42):
+    """Return a (bars x n_paths) matrix of closes whose log returns get Gaussian noise added.
+
+    The noise standard deviation is `noise_scale` times that of the returns.
+    """
+    close = np.asarray(close, dtype=np.float64)
+    returns = np.diff(np.log(close))
+    rng = np.random.default_rng(seed)
+    noise = rng.normal(0.0, noise_scale * returns.std(), size=(len(returns), n_paths))
+    return returns_to_paths(close[0], returns[:, None] + noise)
+
+def returns_to_paths(start_price, returns):
+    """Turn a (bars - 1 x paths) log-return matrix into closes starting at start_price."""
+    paths = np.empty((len(returns) + 1, returns.shape[1]))
+    paths[0] = start_price
+    np.cumsum(returns, axis=0, out=paths[1:])
+    np.exp(paths[1:], out=paths[1:])
+    paths[1:] *= start_price
+    return paths
+
+def evaluate_paths(paths, indicator, period, usd_per_trade, initial_usdt_balance):
+    """Back-test every path column at once; returns final balance, drawdown and trades per path."""
+    matrix = portfolio_indicator({'close': paths}, indicator, period)
+    signals = signal_matrix(paths, matrix, indicator)
+    _, balance_btc, total_balance = simulate_balances_matrix(paths, signals, usd_per_trade, initial_usdt_balance)
+    return {
+        'final_balance': total_balance[-1],
+        'max_drawdown_pct': max_drawdown_pct(total_balance),
+        'trades': trade_count(balance_btc),
+    }
+
+def monte_carlo(symbol, timeframe, indicator, period, start_date, end_date, n_paths=1000, method='bootstrap',
+                block_size=24, noise_scale=0.5, seed=42, paths_per_chunk=500):
+    """Run the strategy over n_paths resampled versions of the cached series.
+
+    Returns one row per path. Path 0 is the actual history, for reference.
+    Paths are generated and evaluated `paths_per_chunk` at a time to bound memory.
+    """
+    if indicator not in ['SMA', 'EMA', 'RSI']:
+        raise ValueError(f"Monte Carlo paths only carry closes; unsupported indicator: {indicator}")
+    since_ms, until_ms = bt.date_range_ms(start_date, end_date)
+    close = bars_to_frame(bt.load_bars(symbol, timeframe, since_ms, until_ms))['close'].to_numpy(dtype='float64')
+    if len(close) < 2:
+        raise ValueError(f"Need at least 2 bars for {symbol} {timeframe}, got {len(close)}")
+
+    results = [evaluate_paths(close[:, None], indicator, period, bt.usd_per_trade, bt.initial_usdt_balance)]
+    for chunk, first in enumerate(range(0, n_paths, paths_per_chunk)):
+        size = min(paths_per_chunk, n_paths - first)
+        if method == 'bootstrap':
+            paths = bootstrap_paths(close, size, block_size, seed=seed + chunk)
+        elif method == 'noise':
+            paths = noise_paths(close, size, noise_scale, seed=seed + chunk)
+        else:
+            raise ValueError(f"Unsupported path method: {method}")
+        results.append(evaluate_paths(paths, indicator, period, bt.usd_per_trade, bt.initial_usdt_balance))
+
+    runs = pd.DataFrame({key: np.concatenate([r[key] for r in results]) for key in results[0]})
+    runs.insert(0, 'path', range(len(runs)))
+    runs.insert(2, 'return_pct', (runs['final_balance'] / bt.initial_usdt_balance - 1) * 100)
+    return runs
+
+def distribution(runs):
+    """Summarize the simulated paths (excluding the actual history) as quantiles per column."""
+    return runs.iloc[1:][['final_balance', 'return_pct', 'max_drawdown_pct', 'trades']].quantile(quantiles)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Monte Carlo robustness runs over resampled price paths.')
+    parser.add_argument('--symbol', default='BTC/USDT')
+    parser.add_argument('--timeframe', default='1h')
+    parser.add_argument('--indicator', default='SMA', choices=['SMA', 'EMA', 'RSI'])
+    parser.add_argument('--period', type=int, default=20)
+    parser.add_argument('--start', default='2024-06-01')
+    parser.add_argument('--end', default='2024-06-30')
+    parser.add_argument('--paths', type=int, default=1000)
+    parser.add_argument('--method', default='bootstrap', choices=path_methods)
+    parser.add_argument('--block-size', type=int, default=24, help='Bars per bootstrap block')
+    parser.add_argument('--noise-scale', type=float, default=0.5, help='Noise std as a multiple of the return std')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    runs = monte_carlo(args.symbol, args.timeframe, args.indicator, args.period, args.start, args.end,
+                       n_paths=args.paths, method=args.method, block_size=args.block_size,
+                       noise_scale=args.noise_scale, seed=args.seed)
+
+    csv_filename = os.path.join(bt.output_dir, f'{args.indicator}_monte_carlo_{args.method}_{args.symbol.replace("/", "_")}_{args.timeframe}_{args.start}_{args.end}.csv')
+    runs.to_csv(csv_filename, index=False)
+    actual = runs.iloc[0]
+    print(f"Actual history: final balance {actual['final_balance']:.2f} USDT, max drawdown {actual['max_drawdown_pct']:.2f}%")
+    print(f'Distribution over {len(runs) - 1} {args.method} paths:')
+    print(distribution(runs).to_string())
+    print(f'Monte Carlo results exported to {csv_filename}')
@@ -0,0 +1,223 @@
+# Paginated OHLCV downloader backed by a local columnar bar cache
+#
+# Bars are stored per exchange/symbol/timeframe as one .npy file per column
+# plus a coverage.json listing the [start, end] millisecond ranges that have
+# already been downloaded. Only the parts of a request that are not covered
+# are fetched, so repeat back-tests run fully offline.
+
+import json
+import os
+from functools import reduce
+
+import numpy as np
+import pandas as pd
+
+columns = ['timestamp', 'open', 'high', 'low', 'close', 'volume']
+default_cache_dir = "data_cache"
+page_limit = 1000  # Binance returns at most 1000 klines per request
+
+timeframe_units = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800, 'M': 2592000}
+
+# Binance weekly candles open on Monday 00:00 UTC; the epoch was a Thursday
+week_anchor_ms = 4 * 86_400_000
+
+def timeframe_to_ms(timeframe):
+    """Convert a ccxt timeframe string such as '15m' or '1h' to milliseconds."""
+    amount, unit = timeframe[:-1], timeframe[-1]
+    if unit not in timeframe_units or not amount.isdigit():
+        raise ValueError(f"Unsupported timeframe: {timeframe}")
+    return int(amount) * timeframe_units[unit] * 1000
+
+def cache_path(exchange_id, symbol, timeframe, cache_dir=default_cache_dir):
+    """Return the cache directory for one exchange/symbol/timeframe series."""
+    return os.path.join(cache_dir, exchange_id, symbol.replace("/", "_"), timeframe)
+
+def load_cached_bars(exchange_id, symbol, timeframe, cache_dir=default_cache_dir, mmap=False):
+    """Load the cached bars and coverage, or (None, []) if nothing is cached yet."""
+    path = cache_path(exchange_id, symbol, timeframe, cache_dir)
+    coverage_file = os.path.join(path, 'coverage.json')
+    if not os.path.isfile(coverage_file):
+        return None, []
+    with open(coverage_file) as f:
+        coverage = json.load(f)
+    mmap_mode = 'r' if mmap else None
+    bars = {col: np.load(os.path.join(path, f'{col}.npy'), mmap_mode=mmap_mode) for col in columns}
+    return bars, coverage
+
+def load_coverage(exchange_id, symbol, timeframe, cache_dir=default_cache_dir):
+    """Return the cached [start, end] ranges without loading any bars."""
+    coverage_file = os.path.join(cache_path(exchange_id, symbol, timeframe, cache_dir), 'coverage.json')
+    if not os.path.isfile(coverage_file):
+        return []
+    with open(coverage_file) as f:
+        return json.load(f)
+
+def is_cached(exchange_id, symbol, timeframe, since_ms, until_ms, cache_dir=default_cache_dir):
+    """Return True if [since_ms, until_ms] is fully covered, so no exchange client is needed."""
+    coverage = load_coverage(exchange_id, symbol, timeframe, cache_dir)
+    return not missing_ranges(coverage, since_ms, until_ms, timeframe_to_ms(timeframe))
+
+def save_cached_bars(exchange_id, symbol, timeframe, bars, coverage, cache_dir=default_cache_dir):
+    """Write bars column by column and then the coverage file, replacing each atomically."""
+    path = cache_path(exchange_id, symbol, timeframe, cache_dir)
+    os.makedirs(path, exist_ok=True)
+    for col in columns:
+        tmp_file = os.path.join(path, f'{col}.tmp.npy')
+        np.save(tmp_file, bars[col])
+        os.replace(tmp_file, os.path.join(path, f'{col}.npy'))
+    # coverage.json goes last so a crash never advertises bars that were not written
+    tmp_file = os.path.join(path, 'coverage.json.tmp')
+    with open(tmp_file, 'w') as f:
+        json.dump(coverage, f)
+    os.replace(tmp_file, os.path.join(path, 'coverage.json'))
+
+def bar_open(timestamp, timeframe_ms):
+    """Return the open time of the bar a millisecond timestamp falls in."""
+    if timeframe_ms % timeframe_to_ms('1M') == 0:
+        return timestamp  # Months have no fixed length, so there is no grid to snap to
+    anchor_ms = week_anchor_ms if timeframe_ms % timeframe_to_ms('1w') == 0 else 0
+    return timestamp - (timestamp - anchor_ms) % timeframe_ms
+
+def bar_range(start, end, timeframe_ms):
+    """Return [first, last] bar open times inside [start, end], or None if no bar opens in it."""
+    first = bar_open(start + timeframe_ms - 1, timeframe_ms)
+    last = bar_open(end, timeframe_ms)
+    return [first, last] if first <= last else None
+
+def merge_ranges(ranges, timeframe_ms):
+    """Snap [start, end] ranges to the bar open times they contain and merge overlapping or adjacent ones.
+
+    Coverage is always kept as [first, last] bar opens, so the bar after a
+    range opens exactly at `last + timeframe_ms`.
+    """
+    merged = []
+    aligned = (bar_range(start, end, timeframe_ms) for start, end in ranges)
+    for start, end in sorted(r for r in aligned if r is not None):
+        if merged and start <= merged[-1][1] + timeframe_ms:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+def missing_ranges(coverage, since_ms, until_ms, timeframe_ms):
+    """Return [first, last] bar open times of the bars in [since_ms, until_ms] that are not in the coverage."""
+    wanted = bar_range(since_ms, until_ms, timeframe_ms)
+    if wanted is None:
+        return []
+    cursor, last = wanted
+    missing = []
+    # Older coverage files may hold unaligned ends (23:59:59, now - timeframe), so snap them first
+    for start, end in merge_ranges(coverage, timeframe_ms):
+        if end < cursor:
+            continue
+        if start > last:
+            break
+        if start > cursor:
+            missing.append([cursor, start - timeframe_ms])
+        cursor = max(cursor, end + timeframe_ms)  # The next bar open after the range
+        if cursor > last:
+            break
+    if cursor <= last:
+        missing.append([cursor, last])
+    return missing
+
+def fetch_range(exchange, symbol, timeframe, since_ms, until_ms, limit=page_limit):
+    """Download every bar in [since_ms, until_ms], one page of `limit` bars at a time."""
+    timeframe_ms = timeframe_to_ms(timeframe)
+    bars = []
+    cursor = since_ms
+    while cursor <= until_ms:
+        page = exchange.fetch_ohlcv(symbol, timeframe=timeframe, since=cursor, limit=limit)
+        if not page:
+            break
+        bars.extend(bar for bar in page if bar[0] <= until_ms)
+        next_cursor = page[-1][0] + timeframe_ms
+        if next_cursor <= cursor or len(page) < limit:
+            break  # Reached the most recent bar
+        cursor = next_cursor
+    return bars
+
+def bars_from_list(raw_bars):
+    """Turn a ccxt [[timestamp, o, h, l, c, v], ...] list into column arrays."""
+    raw = np.asarray(raw_bars, dtype=np.float64).reshape(-1, len(columns))
+    bars = {col: raw[:, i] for i, col in enumerate(columns)}
+    bars['timestamp'] = raw[:, 0].astype(np.int64)
+    return bars
+
+def merge_bars(old_bars, new_bars):
+    """Combine two column dicts, sorted by timestamp, newer values winning on duplicates."""
+    if old_bars is None:
+        combined = new_bars
+    else:
+        combined = {col: np.concatenate([new_bars[col], old_bars[col]]) for col in columns}
+    _, first = np.unique(combined['timestamp'], return_index=True)
+    return {col: np.ascontiguousarray(combined[col][first]) for col in columns}
+
+def slice_bars(bars, since_ms, until_ms):
+    """Return the column arrays restricted to since_ms <= timestamp <= until_ms."""
+    lo = np.searchsorted(bars['timestamp'], since_ms, side='left')
+    hi = np.searchsorted(bars['timestamp'], until_ms, side='right')
+    return {col: bars[col][lo:hi] for col in columns}
+
+def bars_to_frame(bars):
+    """Build the DataFrame layout that fetch_ohlcv has always returned."""
+    df = pd.DataFrame({col: np.asarray(bars[col]) for col in columns})
+    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
+    return df
+
+def frame_to_bars(df):
+    """Turn a fetch_ohlcv-style DataFrame back into column arrays with millisecond timestamps."""
+    bars = {col: df[col].to_numpy(dtype=np.float64) for col in columns[1:]}
+    bars['timestamp'] = df['timestamp'].to_numpy().astype('datetime64[ms]').astype(np.int64)
+    return bars
+
+def align_bars(bars_by_symbol):
+    """Align per-symbol column dicts on the timestamps every symbol has.
+
+    Returns (timestamp, {column: (bars x symbols) matrix}) with the symbols in
+    the order of `bars_by_symbol`.
+    """
+    timestamps = reduce(np.intersect1d, (np.asarray(bars['timestamp']) for bars in bars_by_symbol.values()))
+    matrices = {col: np.empty((len(timestamps), len(bars_by_symbol))) for col in columns[1:]}
+    for j, bars in enumerate(bars_by_symbol.values()):
+        rows = np.searchsorted(bars['timestamp'], timestamps)
+        for col in columns[1:]:
+            matrices[col][:, j] = np.asarray(bars[col])[rows]
+    return timestamps.astype(np.int64), matrices
+
+def fetch_bars(exchange, symbol, timeframe, since_ms, until_ms, exchange_id='binance',
+               cache_dir=default_cache_dir, mmap=False):
+    """Return cached column arrays for the range, downloading only the missing parts.
+
+    `exchange` is only touched when part of the range is not cached yet, so it
+    may be None for offline runs over data that was downloaded before.
+    """
+    timeframe_ms = timeframe_to_ms(timeframe)
+    bars, coverage = load_cached_bars(exchange_id, symbol, timeframe, cache_dir, mmap=mmap)
+    gaps = missing_ranges(coverage, since_ms, until_ms, timeframe_ms)
+
+    if gaps:
+        if exchange is None:
+            raise ValueError(f"{exchange_id} {symbol} {timeframe} is not fully cached and no exchange was given")
+        # Never mark the still-forming candle (or the future) as covered
+        last_closed_ms = bar_open(exchange.milliseconds(), timeframe_ms) - timeframe_ms
+        new_bars = []
+        fetched = []
+        for start, end in gaps:
+            end = min(end, last_closed_ms)
+            if start > end:
+                continue
+            new_bars.extend(bar for bar in fetch_range(exchange, symbol, timeframe, start, end)
+                            if bar[0] <= last_closed_ms)
+            fetched.append([start, end])
+        if fetched:
+            if new_bars:
+                bars = merge_bars(bars, bars_from_list(new_bars))
+            elif bars is None:
+                bars = bars_from_list([])
+            coverage = merge_ranges(coverage + fetched, timeframe_ms)
+            save_cached_bars(exchange_id, symbol, timeframe, bars, coverage, cache_dir)
+
+    if bars is None:
+        bars = bars_from_list([])
+    return slice_bars(bars, since_ms, until_ms)
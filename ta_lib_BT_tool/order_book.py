@@ -0,0 +1,243 @@
+# L2 order-book snapshots and fills that walk the book
+#
+# simulate_trades fills every order at the bar close. Here recorded L2 books
+# are used instead: record_snapshots polls fetch_order_book (as ask_bid in
+# bootcamp_tools/risk_management/5_risk.py does) into an OrderBookStore, which
+# keeps the snapshot timestamps sorted next to (snapshots x depth) price and
+# size matrices per side, saved as one .npy file per array like the bar cache.
+# fill_orders finds the book in effect for every order with one searchsorted
+# call and walks its levels for all orders at once.
+
+import argparse
+import os
+import time
+
+import numpy as np
+
+from simulation import signal_transitions
+
+book_columns = ['timestamp', 'bid_price', 'bid_size', 'ask_price', 'ask_size']
+default_book_dir = "book_cache"
+default_depth = 20
+
+def book_path(exchange_id, symbol, book_dir=default_book_dir):
+    """Return the store directory for one exchange/symbol."""
+    return os.path.join(book_dir, exchange_id, symbol.replace("/", "_"))
+
+def pad_levels(levels, depth):
+    """Return (prices, sizes) arrays of exactly `depth` levels; missing levels are NaN priced with size 0."""
+    prices = np.full(depth, np.nan)
+    sizes = np.zeros(depth)
+    levels = [level[:2] for level in levels[:depth]]
+    if levels:
+        prices[:len(levels)], sizes[:len(levels)] = np.asarray(levels, dtype=np.float64).T
+    return prices, sizes
+
+class OrderBookStore:
+    """Time-sorted L2 snapshots: `timestamp` (n,) and `bid_*` / `ask_*` (n x depth) arrays.
+
+    Appends are buffered and merged into the arrays the next time they are
+    read, so recording stays cheap. Snapshots arriving out of order are sorted
+    in (stably, so a repeated timestamp keeps its latest snapshot last).
+    """
+
+    def __init__(self, depth=default_depth):
+        self.depth = depth
+        self.arrays = {'timestamp': np.empty(0, dtype=np.int64)}
+        for col in book_columns[1:]:
+            self.arrays[col] = np.empty((0, depth))
+        self.pending = []
+
+    def __len__(self):
+        return len(self.arrays['timestamp']) + len(self.pending)
+
+    def append(self, timestamp, bids, asks):
+        """Buffer one snapshot given as [[price, size], ...] bid and ask levels, best first."""
+        self.pending.append((int(timestamp), *pad_levels(bids, self.depth), *pad_levels(asks, self.depth)))
+
+    def consolidate(self):
+        """Merge buffered snapshots into the sorted arrays and return them."""
+        if self.pending:
+            new = list(zip(*self.pending))
+            self.pending = []
+            arrays = {'timestamp': np.concatenate([self.arrays['timestamp'], np.array(new[0], dtype=np.int64)])}
+            for k, col in enumerate(book_columns[1:], start=1):
+                arrays[col] = np.concatenate([self.arrays[col], np.array(new[k])])
+            if np.any(np.diff(arrays['timestamp']) < 0):
+                order = np.argsort(arrays['timestamp'], kind='stable')
+                arrays = {col: arr[order] for col, arr in arrays.items()}
+            self.arrays = arrays
+        return self.arrays
+
+    def lookup(self, times_ms, max_age_ms=None):
+        """Return the row of the latest snapshot at or before each time, or -1 if there is none.
+
+        Only books already seen are used, never later ones, so fills carry no
+        look-ahead. With `max_age_ms`, snapshots older than that count as missing.
+        """
+        timestamps = self.consolidate()['timestamp']
+        times_ms = np.asarray(times_ms, dtype=np.int64)
+        rows = np.searchsorted(timestamps, times_ms, side='right') - 1
+        if max_age_ms is not None and len(timestamps):
+            stale = times_ms - timestamps[np.maximum(rows, 0)] > max_age_ms
+            rows[stale] = -1
+        return rows
+
+    def levels(self, rows, sides):
+        """Return (rows x depth) prices and sizes of the side each order trades against.
+
+        Buys (side 1) get the asks, sells the bids; a row of -1 gets an empty book.
+        """
+        arrays = self.consolidate()
+        rows = np.asarray(rows)
+        sides = np.broadcast_to(sides, rows.shape)
+        prices = np.full((len(rows), self.depth), np.nan)
+        sizes = np.zeros((len(rows), self.depth))
+        for side, mask in [('ask', (rows >= 0) & (sides == 1)), ('bid', (rows >= 0) & (sides != 1))]:
+            prices[mask] = arrays[f'{side}_price'][rows[mask]]
+            sizes[mask] = arrays[f'{side}_size'][rows[mask]]
+        return prices, sizes
+
+    def save(self, exchange_id, symbol, book_dir=default_book_dir):
+        """Write every array, replacing each file atomically; timestamps go last."""
+        arrays = self.consolidate()
+        path = book_path(exchange_id, symbol, book_dir)
+        os.makedirs(path, exist_ok=True)
+        for col in book_columns[1:] + book_columns[:1]:
+            tmp_file = os.path.join(path, f'{col}.tmp.npy')
+            np.save(tmp_file, arrays[col])
+            os.replace(tmp_file, os.path.join(path, f'{col}.npy'))
+
+    @classmethod
+    def load(cls, exchange_id, symbol, book_dir=default_book_dir, depth=default_depth, mmap=False):
+        """Load a saved store, or return an empty one if nothing was recorded yet."""
+        path = book_path(exchange_id, symbol, book_dir)
+        if not os.path.isfile(os.path.join(path, 'timestamp.npy')):
+            return cls(depth)
+        mmap_mode = 'r' if mmap else None
+        arrays = {col: np.load(os.path.join(path, f'{col}.npy'), mmap_mode=mmap_mode) for col in book_columns}
+        # A crash between writes can leave the level files a few rows longer than the timestamps
+        n = len(arrays['timestamp'])
+        store = cls(arrays['bid_price'].shape[1])
+        store.arrays = {col: arr[:n] for col, arr in arrays.items()}
+        return store
+
+def walk_levels(prices, sizes, amounts, in_quote=False):
+    """Fill each order row against its (orders x depth) levels, best level first.
+
+    `amounts` is the order size per row, in the base asset, or in the quote
+    asset (USDT) where `in_quote` is true. Returns (quantity, notional): the
+    base quantity and quote amount actually filled, which fall short of the
+    order when the book is not deep enough.
+    """
+    prices = np.nan_to_num(prices)
+    level_amounts = np.where(np.asarray(in_quote)[..., None], prices * sizes, sizes)
+    before = np.cumsum(level_amounts, axis=1) - level_amounts
+    taken = np.clip(np.asarray(amounts, dtype=np.float64)[:, None] - before, 0.0, level_amounts)
+    base_taken = np.where(np.asarray(in_quote)[..., None], sizes * np.divide(
+        taken, level_amounts, out=np.zeros_like(taken), where=level_amounts > 0), taken)
+    return base_taken.sum(axis=1), (base_taken * prices).sum(axis=1)
+
+def fill_orders(store, times_ms, sides, amounts, in_quote=False, max_age_ms=None):
+    """Simulate market orders against the recorded books.
+
+    Buys (side 1) walk the asks and sells (side -1) the bids of the latest
+    snapshot at or before each order. Returns a dict of arrays: `row` (the
+    snapshot used, -1 if none), `quantity`, `notional`, `price` (the average
+    fill price, NaN if nothing filled) and `complete` (the whole order filled).
+    """
+    amounts = np.asarray(amounts, dtype=np.float64)
+    rows = store.lookup(times_ms, max_age_ms)
+    prices, sizes = store.levels(rows, sides)
+    quantity, notional = walk_levels(prices, sizes, amounts, np.broadcast_to(in_quote, amounts.shape))
+    filled = np.where(np.broadcast_to(in_quote, amounts.shape), notional, quantity)
+    return {
+        'row': rows,
+        'quantity': quantity,
+        'notional': notional,
+        'price': np.divide(notional, quantity, out=np.full(len(quantity), np.nan), where=quantity > 0),
+        'complete': (rows >= 0) & np.isclose(filled, amounts),
+    }
+
+def simulate_book_fills(timestamps, close, signal, store, usd_per_trade, initial_usdt_balance,
+                        initial_btc_balance=0, max_age_ms=None):
+    """simulate_balances_sparse with buys and sells filled against the recorded books.
+
+    A buy spends up to usd_per_trade walking the asks, a sell offers the whole
+    BTC balance to the bids; whatever the book cannot absorb is left unfilled.
+    Orders with no snapshot (within `max_age_ms`) fill at the bar close as in
+    simulate_trades. Returns (balance_usdt, balance_btc, total_balance).
+    """
+    close = np.asarray(close, dtype=np.float64)
+    n = len(close)
+    buys, sells = signal_transitions(signal)
+    event_rows = np.flatnonzero(buys | sells)
+    book_rows = store.lookup(np.asarray(timestamps)[event_rows], max_age_ms)
+    bid_prices, bid_sizes = store.levels(book_rows, -1)
+
+    # Buys have a fixed size, so all of them are walked in one call up front
+    buy_qty, buy_cost = walk_levels(*store.levels(book_rows, 1), np.full(len(event_rows), float(usd_per_trade)), True)
+
+    balance_usdt = initial_usdt_balance  # Starting balance in USDT
+    balance_btc = initial_btc_balance  # Starting balance in BTC (or ETH, or SOL)
+    usdt_states = [balance_usdt]
+    btc_states = [balance_btc]
+
+    for k, i in enumerate(event_rows.tolist()):
+        book_row = book_rows[k]
+        if buys[i]:  # Buy signal
+            if balance_usdt >= usd_per_trade:
+                if book_row < 0:
+                    balance_btc += usd_per_trade / close[i]
+                    balance_usdt -= usd_per_trade
+                else:
+                    balance_btc += buy_qty[k]
+                    balance_usdt -= buy_cost[k]
+        else:  # Sell signal
+            if book_row < 0:
+                balance_usdt += balance_btc * close[i]
+                balance_btc = 0
+            elif balance_btc > 0:
+                sold, proceeds = walk_levels(bid_prices[k:k + 1], bid_sizes[k:k + 1], [balance_btc])
+                balance_usdt += proceeds[0]
+                balance_btc = max(balance_btc - sold[0], 0.0)
+
+        usdt_states.append(balance_usdt)
+        btc_states.append(balance_btc)
+
+    # State k holds from event k up to the bar before event k + 1
+    run_lengths = np.diff(np.concatenate(([0], event_rows, [n])))
+    balance_usdt = np.repeat(np.array(usdt_states, dtype=np.float64), run_lengths)
+    balance_btc = np.repeat(np.array(btc_states, dtype=np.float64), run_lengths)
+    total_balance = balance_usdt + balance_btc * close
+    return balance_usdt, balance_btc, total_balance
+
+def record_snapshots(exchange, symbol, store, count, interval_s=1.0, depth=default_depth,
+                     exchange_id='binance', book_dir=default_book_dir, save_every=60):
+    """Poll `count` L2 snapshots into `store`, saving it every `save_every` snapshots and at the end."""
+    try:
+        for k in range(1, count + 1):
+            ob = exchange.fetch_order_book(symbol, limit=depth)
+            store.append(ob.get('timestamp') or exchange.milliseconds(), ob['bids'], ob['asks'])
+            if k % save_every == 0:
+                store.save(exchange_id, symbol, book_dir)
+            if k < count:
+                time.sleep(interval_s)
+    finally:
+        store.save(exchange_id, symbol, book_dir)
+    return store
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Record L2 order-book snapshots for book-aware fills.')
+    parser.add_argument('--symbol', default='BTC/USDT')
+    parser.add_argument('--count', type=int, default=3600, help='Snapshots to record')
+    parser.add_argument('--interval', type=float, default=1.0, help='Seconds between snapshots')
+    parser.add_argument('--depth', type=int, default=default_depth, help='Levels kept per side')
+    parser.add_argument('--book-dir', default=default_book_dir)
+    args = parser.parse_args()
+
+    import ta_lib_backtest as bt
+    store = OrderBookStore.load(bt.exchange_id, args.symbol, args.book_dir, depth=args.depth)
+    record_snapshots(bt.get_exchange(), args.symbol, store, args.count, args.interval, args.depth,
+                     exchange_id=bt.exchange_id, book_dir=args.book_dir)
+    print(f'{len(store)} snapshots of {args.symbol} saved under {book_path(bt.exchange_id, args.symbol, args.book_dir)}')
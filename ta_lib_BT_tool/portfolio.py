@@ -0,0 +1,106 @@
+# Multi-symbol portfolio back-test on timestamp-aligned (bars x symbols) arrays
+#
+# The bars of every symbol are aligned onto one timestamp index, so each OHLCV
+# column becomes a matrix with one column per symbol. Indicators and signals
+# are computed for all symbols in single array passes and one shared USDT
+# balance is simulated across them (simulation.simulate_portfolio).
+
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+import ta_lib_backtest as bt
+from indicator_matrix import signal_matrix
+from metrics import max_drawdown_pct, periods_per_year, sharpe_ratio
+from ohlcv_cache import align_bars
+from simulation import simulate_portfolio
+
+portfolio_indicators = ['SMA', 'EMA', 'RSI', 'VWAP', 'VWMA']
+
+def portfolio_indicator(matrices, indicator, period):
+    """Compute `indicator` for every symbol column at once into a (bars x symbols) matrix."""
+    close = matrices['close']
+    if indicator == 'VWAP':
+        # Same steps as ta_lib_backtest.compute_indicator, down every column at once
+        typical_price = (matrices['high'] + matrices['low'] + close) / 3
+        return np.cumsum(typical_price * matrices['volume'], axis=0) / np.cumsum(matrices['volume'], axis=0)
+    if indicator == 'VWMA':
+        volume = pd.DataFrame(matrices['volume'])
+        cum_vol = volume.rolling(window=period).sum()
+        cum_vol_close = (volume * close).rolling(window=period).sum()
+        return (cum_vol_close / cum_vol).to_numpy()
+    if indicator not in portfolio_indicators:
+        raise ValueError(f"Unsupported indicator for a portfolio: {indicator}")
+
+    # TA-Lib works on one series at a time, so each symbol column is filled in place
+    import talib
+    func = {'SMA': talib.SMA, 'EMA': talib.EMA, 'RSI': talib.RSI}[indicator]
+    matrix = np.empty(close.shape)
+    for j in range(close.shape[1]):
+        matrix[:, j] = func(np.ascontiguousarray(close[:, j]), timeperiod=period)
+    return matrix
+
+def portfolio_frame(symbols, timestamps, close, indicators, signals, balance_usdt, holdings, total_balance,
+                    label='indicator'):
+    """Build one results DataFrame with per-symbol columns plus the shared balances."""
+    data = {'timestamp': pd.to_datetime(timestamps, unit='ms')}
+    for j, symbol in enumerate(symbols):
+        name = symbol.split('/')[0]
+        data[f'close_{name}'] = close[:, j]
+        data[f'{label}_{name}'] = indicators[:, j]
+        data[f'signal_{name}'] = signals[:, j]
+        data[f'holding_{name}'] = holdings[:, j]
+    data['balance_usdt'] = balance_usdt
+    data['total_balance'] = total_balance
+    return pd.DataFrame(data)
+
+def run_portfolio(bars_by_symbol, indicator, period, usd_per_trade, initial_usdt_balance, label='indicator'):
+    """Align the symbols' bars, compute indicators and signals and simulate the shared balance.
+
+    `bars_by_symbol` maps each symbol to its column arrays. Returns
+    (results DataFrame, holdings matrix, total balance); the indicator columns
+    are named `{label}_{symbol}`.
+    """
+    symbols = list(bars_by_symbol)
+    timestamps, matrices = align_bars(bars_by_symbol)
+    indicators = portfolio_indicator(matrices, indicator, period)
+    signals = signal_matrix(matrices['close'], indicators, indicator)
+    balance_usdt, holdings, total_balance = simulate_portfolio(
+        matrices['close'], signals, usd_per_trade, initial_usdt_balance)
+    df = portfolio_frame(symbols, timestamps, matrices['close'], indicators, signals,
+                         balance_usdt, holdings, total_balance, label)
+    return df, holdings, total_balance
+
+def backtest_portfolio(symbols, timeframe, indicator, period, start_date, end_date):
+    """Back-test `symbols` together with one shared USDT balance and export the results."""
+    since_ms, until_ms = bt.date_range_ms(start_date, end_date)
+    bars_by_symbol = {symbol: bt.load_bars(symbol, timeframe, since_ms, until_ms) for symbol in symbols}
+    df, holdings, total_balance = run_portfolio(bars_by_symbol, indicator, period, bt.usd_per_trade,
+                                                bt.initial_usdt_balance)
+
+    names = '_'.join(symbol.split('/')[0] for symbol in symbols)
+    csv_filename = os.path.join(bt.output_dir, f'{indicator}_portfolio_results_{names}_{timeframe}_{start_date}_{end_date}.csv')
+    df.to_csv(csv_filename, index=False)
+    print(f'Portfolio back-test results exported to {csv_filename}')
+
+    if len(df):
+        trades = int(np.count_nonzero(np.diff(holdings, axis=0)))
+        print(f'Final balance: {total_balance[-1]:.2f} USDT '
+              f'({(total_balance[-1] / bt.initial_usdt_balance - 1) * 100:.2f}%) over {len(df)} bars, {trades} trades')
+        print(f'Sharpe: {sharpe_ratio(total_balance, periods_per_year(timeframe)):.2f}, '
+              f'max drawdown: {max_drawdown_pct(total_balance):.2f}%')
+    return df
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Back-test several symbols with one shared USDT balance.')
+    parser.add_argument('--symbols', nargs='+', default=['BTC/USDT', 'ETH/USDT', 'SOL/USDT'])
+    parser.add_argument('--indicator', default='VWAP', choices=portfolio_indicators)
+    parser.add_argument('--period', type=int, default=20)
+    parser.add_argument('--timeframe', default='1h')
+    parser.add_argument('--start', default='2024-06-01')
+    parser.add_argument('--end', default='2024-06-30')
+    args = parser.parse_args()
+
+    backtest_portfolio(args.symbols, args.timeframe, args.indicator, args.period, args.start, args.end)
@@ -0,0 +1,134 @@
+# Higher timeframes derived from cached base bars
+#
+# Instead of downloading '15m', '1h', '4h' and '1d' klines separately, any of
+# them can be built from one cached '1m' series: bars are bucketed by their
+# open time and aggregated with first/max/min/last/sum in single array passes.
+# Derived series are kept in the bar cache under their own key, with their own
+# coverage, so multi-timeframe back-tests download the base series once and
+# never make extra API calls.
+
+import numpy as np
+
+from ohlcv_cache import (bars_from_list, columns, default_cache_dir, fetch_bars, load_cached_bars, load_coverage,
+                         merge_bars, merge_ranges, missing_ranges, save_cached_bars, slice_bars, timeframe_to_ms,
+                         week_anchor_ms)
+
+def bucket_anchor(timeframe):
+    """Return the offset from the epoch at which `timeframe` buckets start."""
+    if timeframe.endswith('M'):
+        raise ValueError(f"Monthly bars have no fixed length and cannot be resampled: {timeframe}")
+    return week_anchor_ms if timeframe.endswith('w') else 0
+
+def check_timeframes(timeframe, base_timeframe):
+    """Raise unless `timeframe` is a whole multiple of `base_timeframe`; return both in milliseconds."""
+    timeframe_ms = timeframe_to_ms(timeframe)
+    base_ms = timeframe_to_ms(base_timeframe)
+    if timeframe_ms <= base_ms or timeframe_ms % base_ms or bucket_anchor(timeframe) % base_ms:
+        raise ValueError(f"Cannot build {timeframe} bars from {base_timeframe} bars")
+    return timeframe_ms, base_ms
+
+def bucket_start(timestamp, timeframe_ms, anchor_ms=0):
+    """Return the open time of the bucket each millisecond timestamp falls in."""
+    return timestamp - (timestamp - anchor_ms) % timeframe_ms
+
+def resample_bars(bars, timeframe):
+    """Aggregate sorted base column arrays into `timeframe` bars.
+
+    Every bucket with at least one base bar produces a bar: open is the first
+    open, high the maximum, low the minimum, close the last close and volume
+    the sum. Use complete_ranges to tell which buckets had all their base bars.
+    """
+    timestamp = np.asarray(bars['timestamp'], dtype=np.int64)
+    if not len(timestamp):
+        return {col: np.asarray(bars[col])[:0] for col in columns}
+    buckets = bucket_start(timestamp, timeframe_to_ms(timeframe), bucket_anchor(timeframe))
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(buckets)] - 1
+    return {
+        'timestamp': buckets[starts],
+        'open': np.asarray(bars['open'])[starts],
+        'high': np.maximum.reduceat(bars['high'], starts),
+        'low': np.minimum.reduceat(bars['low'], starts),
+        'close': np.asarray(bars['close'])[ends],
+        'volume': np.add.reduceat(bars['volume'], starts),
+    }
+
+def complete_ranges(base_coverage, timeframe, base_timeframe):
+    """Turn base coverage ranges into the [first, last] bucket open times they fully cover."""
+    timeframe_ms, base_ms = check_timeframes(timeframe, base_timeframe)
+    anchor_ms = bucket_anchor(timeframe)
+    ranges = []
+    for start, end in base_coverage:
+        first = bucket_start(start + timeframe_ms - 1, timeframe_ms, anchor_ms)
+        last = bucket_start(end + base_ms, timeframe_ms, anchor_ms) - timeframe_ms
+        if first <= last:
+            ranges.append([first, last])
+    return ranges
+
+def base_range(timeframe, base_timeframe, since_ms, until_ms):
+    """Widen [since_ms, until_ms] to the base bars of every bucket it touches."""
+    timeframe_ms, base_ms = check_timeframes(timeframe, base_timeframe)
+    anchor_ms = bucket_anchor(timeframe)
+    return (bucket_start(since_ms, timeframe_ms, anchor_ms),
+            bucket_start(until_ms, timeframe_ms, anchor_ms) + timeframe_ms - base_ms)
+
+def resampled_key(timeframe, base_timeframe):
+    """Return the cache key derived bars are stored under, kept apart from downloaded klines."""
+    return f'{timeframe}_from_{base_timeframe}'
+
+def is_resample_cached(exchange_id, symbol, timeframe, base_timeframe, since_ms, until_ms,
+                       cache_dir=default_cache_dir):
+    """Return True if the range can be served without an exchange client, derived or from base bars."""
+    timeframe_ms, base_ms = check_timeframes(timeframe, base_timeframe)
+    coverage = load_coverage(exchange_id, symbol, resampled_key(timeframe, base_timeframe), cache_dir)
+    if not missing_ranges(coverage, since_ms, until_ms, timeframe_ms):
+        return True
+    base_since, base_until = base_range(timeframe, base_timeframe, since_ms, until_ms)
+    base_coverage = load_coverage(exchange_id, symbol, base_timeframe, cache_dir)
+    return not missing_ranges(base_coverage, base_since, base_until, base_ms)
+
+def fetch_resampled_bars(exchange, symbol, timeframe, since_ms, until_ms, base_timeframe='1m',
+                         exchange_id='binance', cache_dir=default_cache_dir, mmap=False):
+    """Return `timeframe` column arrays for the range, built from cached `base_timeframe` bars.
+
+    Buckets already derived are read from the cache. For the rest the base
+    bars are loaded with fetch_bars (downloading only what is missing, so
+    `exchange` may be None when they are cached) and aggregated. Only buckets
+    whose base bars are all covered are stored, so the still-forming bar is
+    rebuilt on the next call rather than cached half-finished.
+    """
+    timeframe_ms, base_ms = check_timeframes(timeframe, base_timeframe)
+    key = resampled_key(timeframe, base_timeframe)
+    bars, coverage = load_cached_bars(exchange_id, symbol, key, cache_dir, mmap=mmap)
+    gaps = missing_ranges(coverage, since_ms, until_ms, timeframe_ms)
+
+    if gaps:
+        new_bars = []
+        fetched = []
+        for start, end in gaps:
+            base_since, base_until = base_range(timeframe, base_timeframe, start, end)
+            base_bars = fetch_bars(exchange, symbol, base_timeframe, base_since, base_until,
+                                   exchange_id=exchange_id, cache_dir=cache_dir)
+            complete = [[max(first, base_since), min(last, base_until + base_ms - timeframe_ms)]
+                        for first, last in complete_ranges(load_coverage(exchange_id, symbol, base_timeframe,
+                                                                         cache_dir), timeframe, base_timeframe)
+                        if first <= base_until and last >= base_since]
+            if not complete:
+                continue
+            resampled = resample_bars(base_bars, timeframe)
+            # Keep only the buckets whose base bars are all covered
+            rows = np.searchsorted([first for first, _ in complete], resampled['timestamp'], side='right') - 1
+            keep = (rows >= 0) & (resampled['timestamp'] <= np.array([last for _, last in complete])[rows])
+            new_bars.append({col: resampled[col][keep] for col in columns})
+            fetched.extend(complete)
+        if fetched:
+            if bars is None:
+                bars = bars_from_list([])
+            for chunk in new_bars:
+                bars = merge_bars(bars, chunk)
+            coverage = merge_ranges(coverage + fetched, timeframe_ms)
+            save_cached_bars(exchange_id, symbol, key, bars, coverage, cache_dir)
+
+    if bars is None:
+        bars = bars_from_list([])
+    return slice_bars(bars, since_ms, until_ms)
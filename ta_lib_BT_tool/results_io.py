@@ -0,0 +1,102 @@
+# Compact back-test result files
+#
+# Besides the full CSV, a back-test can be exported as:
+#   'npz'     - only the result columns, stored as binary arrays in one np.savez
+#               call, which is a fraction of the CSV size and loads back quickly
+#   'summary' - a small JSON file with the executed trades and summary numbers,
+#               for large sweeps where the per-bar curve is not needed
+
+import json
+
+import numpy as np
+import pandas as pd
+
+from metrics import performance_metrics, periods_per_year
+
+result_formats = ['csv', 'npz', 'summary']
+result_extensions = {'csv': '.csv', 'npz': '.npz', 'summary': '.json'}
+result_columns = ['timestamp', 'close', 'indicator', 'signal', 'balance_usdt', 'balance_btc', 'total_balance']
+result_dtypes = {'signal': np.int8}
+
+def save_npz(df, filename):
+    """Write the result columns of a back-test DataFrame to an .npz file in one call."""
+    arrays = {col: df[col].to_numpy(dtype=result_dtypes.get(col, np.float64)) for col in result_columns[1:]}
+    arrays['timestamp'] = df['timestamp'].to_numpy().astype('datetime64[ms]').astype(np.int64)
+    np.savez(filename, **arrays)
+
+def trade_list(df):
+    """Return the buys and sells that actually changed the balances, one row per trade."""
+    balance_usdt = df['balance_usdt'].to_numpy(dtype=np.float64)
+    balance_btc = df['balance_btc'].to_numpy(dtype=np.float64)
+    btc_change = np.diff(balance_btc)
+    rows = np.flatnonzero(btc_change != 0) + 1  # A skipped buy or a sell with nothing held is not a trade
+    return pd.DataFrame({
+        'timestamp': df['timestamp'].to_numpy()[rows],
+        'side': np.where(btc_change[rows - 1] > 0, 'buy', 'sell'),
+        'price': df['close'].to_numpy(dtype=np.float64)[rows],
+        'btc': np.abs(btc_change[rows - 1]),
+        'usdt': np.abs(np.diff(balance_usdt)[rows - 1]),
+    })
+
+def summarize(df, trades=None, timeframe=None):
+    """Return the headline numbers and performance metrics of a back-test as a plain dict.
+
+    The Sharpe ratio is annualized when the bar `timeframe` is given, and per bar otherwise.
+    """
+    if trades is None:
+        trades = trade_list(df)
+    metrics = performance_metrics(df['balance_usdt'], df['balance_btc'], df['total_balance'],
+                                  periods_per_year(timeframe) if timeframe else 1.0)
+    total_balance = df['total_balance'].to_numpy(dtype=np.float64)
+    initial_balance = float(total_balance[0]) if len(total_balance) else float('nan')
+    final_balance = float(total_balance[-1]) if len(total_balance) else float('nan')
+    return {
+        'bars': len(df),
+        'start': str(df['timestamp'].iloc[0]) if len(df) else None,
+        'end': str(df['timestamp'].iloc[-1]) if len(df) else None,
+        'initial_balance': initial_balance,
+        'final_balance': final_balance,
+        'return_pct': (final_balance / initial_balance - 1) * 100,
+        'trades': len(trades),
+        'buys': int((trades['side'] == 'buy').sum()),
+        'sells': int((trades['side'] == 'sell').sum()),
+        'sharpe': metrics['sharpe'],
+        'max_drawdown_pct': metrics['max_drawdown_pct'],
+        'exposure_pct': metrics['exposure_pct'],
+        'win_rate_pct': metrics['win_rate_pct'],
+    }
+
+def save_summary(df, filename, **info):
+    """Write the trade list and summary of a back-test, plus any extra `info`, to a JSON file."""
+    trades = trade_list(df)
+    records = trades.assign(timestamp=trades['timestamp'].astype(str)).to_dict(orient='records')
+    with open(filename, 'w') as f:
+        json.dump({**info, 'summary': summarize(df, trades, info.get('timeframe')), 'trades': records}, f)
+
+def save_results(df, filename, results_format='csv', **info):
+    """Export a back-test DataFrame in the given format; `info` is only stored in summaries."""
+    if results_format == 'csv':
+        df.to_csv(filename, index=False)
+    elif results_format == 'npz':
+        save_npz(df, filename)
+    elif results_format == 'summary':
+        save_summary(df, filename, **info)
+    else:
+        raise ValueError(f"Unsupported results format: {results_format}")
+
+def load_results(filename):
+    """Load per-bar results written as CSV or .npz back into a DataFrame."""
+    if filename.endswith('.npz'):
+        with np.load(filename) as data:
+            df = pd.DataFrame({col: data[col] for col in result_columns})
+        df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
+        return df
+    return pd.read_csv(filename, parse_dates=['timestamp'])
+
+def load_summary(filename):
+    """Load a summary file back as (summary dict, trades DataFrame)."""
+    with open(filename) as f:
+        payload = json.load(f)
+    trades = pd.DataFrame(payload['trades'], columns=['timestamp', 'side', 'price', 'btc', 'usdt'])
+    trades['timestamp'] = pd.to_datetime(trades['timestamp'])
+    return payload['summary'], trades
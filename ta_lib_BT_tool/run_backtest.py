@@ -0,0 +1,41 @@
+# Command-line entry point for a single back-test
+#
+# Starts fast: ta_lib_backtest only imports ccxt (and key_file) when bars have
+# to be downloaded, TA-Lib for the indicators that use it and matplotlib when
+# charts are drawn. With --offline a run over cached bars needs no network or keys.
+
+import argparse
+
+import ta_lib_backtest as bt
+from results_io import result_formats
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run one TA-Lib back-test.')
+    parser.add_argument('--symbol', default='BTC/USDT')
+    parser.add_argument('--timeframe', default='1h')
+    parser.add_argument('--indicator', default='SMA', choices=list(bt.indicator_inputs))
+    parser.add_argument('--period', type=int, default=20)
+    parser.add_argument('--start', default='2024-06-01')
+    parser.add_argument('--end', default='2024-06-30')
+    parser.add_argument('--format', default='csv', choices=result_formats, help='Results export format')
+    parser.add_argument('--plot', action='store_true', help='Save the price and balance charts')
+    parser.add_argument('--show', action='store_true', help='Also open the charts in a window (implies --plot)')
+    parser.add_argument('--offline', action='store_true', help='Only use cached bars; never connect to Binance')
+    parser.add_argument('--cache-dir', default=bt.cache_dir)
+    parser.add_argument('--resample-from', default=bt.resample_from,
+                        help='Build the timeframe from cached bars of this base timeframe, e.g. 1m')
+    args = parser.parse_args(argv)
+
+    bt.offline = args.offline
+    bt.cache_dir = args.cache_dir
+    bt.resample_from = args.resample_from
+    df = bt.backtest_indicator(args.symbol, args.timeframe, args.indicator, args.period, args.start, args.end,
+                               plot=args.plot or args.show, show=args.show, results_format=args.format)
+    if len(df):
+        final_balance = df['total_balance'].iloc[-1]
+        print(f'Final balance: {final_balance:.2f} USDT '
+              f'({(final_balance / bt.initial_usdt_balance - 1) * 100:.2f}%) over {len(df)} bars')
+    return df
+
+if __name__ == '__main__':
+    main()
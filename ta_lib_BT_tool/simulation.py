@@ -0,0 +1,203 @@
+# Array-backed trade simulation for the TA-Lib back-test
+
+import numpy as np
+
+def signal_transitions(signal):
+    """Return boolean buy/sell masks for the bars where the signal flips."""
+    signal = np.asarray(signal)
+    buys = np.zeros(len(signal), dtype=bool)
+    sells = np.zeros(len(signal), dtype=bool)
+    buys[1:] = (signal[1:] == 1) & (signal[:-1] != 1)
+    sells[1:] = (signal[1:] == -1) & (signal[:-1] != -1)
+    return buys, sells
+
+def simulate_balances(close, signal, usd_per_trade, initial_usdt_balance, initial_btc_balance=0):
+    """Simulate trades on plain arrays and return (balance_usdt, balance_btc, total_balance)."""
+    close = np.asarray(close, dtype=np.float64)
+    n = len(close)
+    buys, sells = signal_transitions(signal)
+
+    balance_usdt = initial_usdt_balance  # Starting balance in USDT
+    balance_btc = initial_btc_balance  # Starting balance in BTC (or ETH, or SOL)
+    usdt_out = [balance_usdt] * n
+    btc_out = [balance_btc] * n
+
+    prices = close.tolist()
+    buy_flags = buys.tolist()
+    sell_flags = sells.tolist()
+    for i in range(1, n):
+        if buy_flags[i]:  # Buy signal
+            btc_to_buy = usd_per_trade / prices[i]
+            if balance_usdt >= usd_per_trade:
+                balance_btc += btc_to_buy
+                balance_usdt -= usd_per_trade
+        elif sell_flags[i]:  # Sell signal
+            usdt_to_sell = balance_btc * prices[i]
+            balance_usdt += usdt_to_sell
+            balance_btc = 0
+
+        usdt_out[i] = balance_usdt
+        btc_out[i] = balance_btc
+
+    balance_usdt = np.array(usdt_out, dtype=np.float64)
+    balance_btc = np.array(btc_out, dtype=np.float64)
+    total_balance = balance_usdt + balance_btc * close
+    return balance_usdt, balance_btc, total_balance
+
+def simulate_balances_sparse(close, signal, usd_per_trade, initial_usdt_balance, initial_btc_balance=0):
+    """Event-driven simulate_balances: only the bars where the signal flips are visited.
+
+    The balances after each buy/sell are forward-filled over the quiet bars in
+    one bulk call, so the Python work grows with the number of trades rather
+    than the number of bars. Results are identical to simulate_balances.
+    """
+    close = np.asarray(close, dtype=np.float64)
+    n = len(close)
+    buys, sells = signal_transitions(signal)
+    event_rows = np.flatnonzero(buys | sells)
+
+    balance_usdt = initial_usdt_balance  # Starting balance in USDT
+    balance_btc = initial_btc_balance  # Starting balance in BTC (or ETH, or SOL)
+    usdt_states = [balance_usdt]
+    btc_states = [balance_btc]
+
+    prices = close[event_rows].tolist()
+    is_buy = buys[event_rows].tolist()
+    for price, buy in zip(prices, is_buy):
+        if buy:  # Buy signal
+            btc_to_buy = usd_per_trade / price
+            if balance_usdt >= usd_per_trade:
+                balance_btc += btc_to_buy
+                balance_usdt -= usd_per_trade
+        else:  # Sell signal
+            usdt_to_sell = balance_btc * price
+            balance_usdt += usdt_to_sell
+            balance_btc = 0
+
+        usdt_states.append(balance_usdt)
+        btc_states.append(balance_btc)
+
+    # State k holds from event k up to the bar before event k + 1
+    run_lengths = np.diff(np.concatenate(([0], event_rows, [n])))
+    balance_usdt = np.repeat(np.array(usdt_states, dtype=np.float64), run_lengths)
+    balance_btc = np.repeat(np.array(btc_states, dtype=np.float64), run_lengths)
+    total_balance = balance_usdt + balance_btc * close
+    return balance_usdt, balance_btc, total_balance
+
+def simulate_balances_matrix(close, signals, usd_per_trade, initial_usdt_balance, initial_btc_balance=0):
+    """Simulate every column of a (bars x runs) signal matrix in one pass over the bars.
+
+    `close` is either one price series shared by every run (periods of one
+    symbol) or a (bars x runs) matrix giving each run its own prices (e.g.
+    Monte Carlo paths). Returns (balance_usdt, balance_btc, total_balance)
+    matrices shaped like `signals`; each column is identical to
+    simulate_balances on that column. Only bars where some column flips are
+    visited, the rest are forward-filled.
+    """
+    close = np.asarray(close, dtype=np.float64)
+    if close.ndim == 1:
+        close = close[:, None]
+    signals = np.asarray(signals)
+    n, runs = signals.shape
+    buys = np.zeros((n, runs), dtype=bool)
+    sells = np.zeros((n, runs), dtype=bool)
+    buys[1:] = (signals[1:] == 1) & (signals[:-1] != 1)
+    sells[1:] = (signals[1:] == -1) & (signals[:-1] != -1)
+    event_rows = np.flatnonzero(buys.any(axis=1) | sells.any(axis=1))
+
+    # Row 0 of the state tables holds the starting balances, row k the balances after event k
+    usdt_states = np.empty((len(event_rows) + 1, runs))
+    btc_states = np.empty((len(event_rows) + 1, runs))
+    usdt_states[0] = initial_usdt_balance
+    btc_states[0] = initial_btc_balance
+    balance_usdt = usdt_states[0].copy()
+    balance_btc = btc_states[0].copy()
+
+    for k, i in enumerate(event_rows, start=1):
+        price = np.broadcast_to(close[i], (runs,))
+        buy = buys[i] & (balance_usdt >= usd_per_trade)  # Buy signal with enough cash
+        balance_btc[buy] += usd_per_trade / price[buy]
+        balance_usdt[buy] -= usd_per_trade
+        sell = sells[i]  # Sell signal
+        balance_usdt[sell] += balance_btc[sell] * price[sell]
+        balance_btc[sell] = 0
+        usdt_states[k] = balance_usdt
+        btc_states[k] = balance_btc
+
+    state_index = np.searchsorted(event_rows, np.arange(n), side='right')
+    balance_usdt = usdt_states[state_index]
+    balance_btc = btc_states[state_index]
+    total_balance = balance_usdt + balance_btc * close
+    return balance_usdt, balance_btc, total_balance
+
+def simulate_portfolio(close, signals, usd_per_trade, initial_usdt_balance):
+    """Simulate several symbols sharing one USDT balance, on timestamp-aligned (bars x symbols) arrays.
+
+    Each symbol follows the same rules as simulate_balances, but every buy is
+    paid from the shared balance. On a bar where several symbols flip, sells
+    are filled first (freeing cash), then buys in column order. Only those bars
+    are visited. Returns (balance_usdt, holdings, total_balance): the shared
+    balance and the portfolio value per bar, and the (bars x symbols) holdings.
+    With a single symbol the result equals simulate_balances.
+    """
+    close = np.asarray(close, dtype=np.float64)
+    signals = np.asarray(signals)
+    n, n_symbols = signals.shape
+    buys = np.zeros((n, n_symbols), dtype=bool)
+    sells = np.zeros((n, n_symbols), dtype=bool)
+    buys[1:] = (signals[1:] == 1) & (signals[:-1] != 1)
+    sells[1:] = (signals[1:] == -1) & (signals[:-1] != -1)
+    event_rows = np.flatnonzero(buys.any(axis=1) | sells.any(axis=1))
+
+    balance_usdt = initial_usdt_balance  # Starting balance in USDT
+    holdings = [0] * n_symbols  # Starting balance of each coin
+    usdt_states = [balance_usdt]
+    holdings_states = [list(holdings)]
+
+    event_prices = close[event_rows].tolist()
+    event_buys = [np.flatnonzero(row).tolist() for row in buys[event_rows]]
+    event_sells = [np.flatnonzero(row).tolist() for row in sells[event_rows]]
+    for prices, buy_cols, sell_cols in zip(event_prices, event_buys, event_sells):
+        for j in sell_cols:  # Sell signal
+            usdt_to_sell = holdings[j] * prices[j]
+            balance_usdt += usdt_to_sell
+            holdings[j] = 0
+        for j in buy_cols:  # Buy signal
+            coins_to_buy = usd_per_trade / prices[j]
+            if balance_usdt >= usd_per_trade:
+                holdings[j] += coins_to_buy
+                balance_usdt -= usd_per_trade
+
+        usdt_states.append(balance_usdt)
+        holdings_states.append(list(holdings))
+
+    # State k holds from event k up to the bar before event k + 1
+    run_lengths = np.diff(np.concatenate(([0], event_rows, [n])))
+    balance_usdt = np.repeat(np.array(usdt_states, dtype=np.float64), run_lengths)
+    holdings = np.repeat(np.array(holdings_states, dtype=np.float64).reshape(-1, n_symbols), run_lengths, axis=0)
+    total_balance = balance_usdt + (holdings * close).sum(axis=1)
+    return balance_usdt, holdings, total_balance
+
+def simulate_trades_loop(df, usd_per_trade, initial_usdt_balance, initial_btc_balance=0):
+    """Reference row-by-row simulation (the original df.loc loop), kept for equivalence checks."""
+    balance_usdt = initial_usdt_balance  # Starting balance in USDT
+    balance_btc = initial_btc_balance  # Starting balance in BTC (or ETH, or SOL)
+    df['balance_usdt'] = float(balance_usdt)
+    df['balance_btc'] = float(balance_btc)
+
+    for i in range(1, len(df)):
+        if df.loc[i, 'signal'] == 1 and df.loc[i-1, 'signal'] != 1:  # Buy signal
+            btc_to_buy = usd_per_trade / df.loc[i, 'close']
+            if balance_usdt >= usd_per_trade:
+                balance_btc += btc_to_buy
+                balance_usdt -= usd_per_trade
+        elif df.loc[i, 'signal'] == -1 and df.loc[i-1, 'signal'] != -1:  # Sell signal
+            usdt_to_sell = balance_btc * df.loc[i, 'close']
+            balance_usdt += usdt_to_sell
+            balance_btc = 0
+
+        df.loc[i, 'balance_usdt'] = balance_usdt
+        df.loc[i, 'balance_btc'] = balance_btc
+
+    df['total_balance'] = df['balance_usdt'] + df['balance_btc'] * df['close']
+    return df
@@ -0,0 +1,238 @@
+# Streaming indicators updated in O(1) per bar for live bots
+#
+# Each class mirrors the arithmetic of its batch counterpart step for step, so
+# feeding it the same closes bar by bar gives bit-identical values. Where TA-Lib
+# builds differ (fused EMA steps, the RSI zero threshold) the installed one is
+# probed once and followed:
+#   StreamingSMA / StreamingEMA / StreamingRSI -> talib.SMA / EMA / RSI
+#   StreamingVWAP -> the cumulative VWAP in ta_lib_backtest.calculate_indicator
+#   StreamingVWMA -> the rolling-sum VWMA in own_tools/VWMA/VWMA_BT.py
+# Until enough bars have been seen, `value` is NaN, like the batch outputs.
+
+import math
+from collections import deque
+from functools import lru_cache
+
+nan = float('nan')
+
+def divide(numerator, denominator):
+    """Divide like NumPy does for float64: x / 0 gives +-inf and 0 / 0 gives NaN."""
+    if denominator == 0:
+        return nan if numerator == 0 or numerator != numerator else math.copysign(math.inf, numerator)
+    return numerator / denominator
+
+def fused_multiply_add(a, b, c):
+    """Return a * b + c rounded once, as an FMA instruction does; math.fma only arrived in Python 3.13."""
+    if not (math.isfinite(a) and math.isfinite(b) and math.isfinite(c)):
+        return a * b + c
+    # Finite floats are exact ratios with power-of-two denominators, and int / int rounds correctly
+    a_num, a_den = a.as_integer_ratio()
+    b_num, b_den = b.as_integer_ratio()
+    c_num, c_den = c.as_integer_ratio()
+    product_den = a_den * b_den
+    den = max(product_den, c_den)
+    return (a_num * b_num * (den // product_den) + c_num * (den // c_den)) / den
+
+def plain_ema_step(close, prev, k):
+    return ((close - prev) * k) + prev
+
+def fused_ema_step(close, prev, k):
+    return fused_multiply_add(close - prev, k, prev)
+
+@lru_cache(maxsize=None)
+def talib_ema_step():
+    """Return the EMA step the installed TA-Lib computes.
+
+    TA-Lib's C source is `((close - prev) * k) + prev`, but builds compiled
+    for FMA hardware fuse the multiply and add into one rounding, which
+    changes the last bit on some bars. A short probe against talib.EMA tells
+    the two apart; without TA-Lib the source order is used.
+    """
+    try:
+        import numpy as np
+        import talib
+    except ImportError:
+        return plain_ema_step
+    probe = [100 + 0.37 * ((i * 7919) % 113) for i in range(400)]
+    for step in (plain_ema_step, fused_ema_step):
+        if all(talib.EMA(np.array(probe), period).tolist()[period - 1:] == ema_values(probe, period, step)
+               for period in (2, 5, 11, 19, 23)):
+            return step
+    return plain_ema_step
+
+@lru_cache(maxsize=None)
+def talib_rsi_epsilon():
+    """Return the |gain + loss| below which the installed TA-Lib reports an RSI of 0.
+
+    TA-Lib 0.4 treats totals under 1e-8 as zero; later builds only an exact
+    zero. Without TA-Lib the 0.4 threshold is used.
+    """
+    try:
+        import numpy as np
+        import talib
+    except ImportError:
+        return 1e-8
+    return 1e-8 if talib.RSI(np.array([0.0, 1e-9, 0.0, 1e-9]), 2)[-1] == 0 else 0.0
+
+def ema_values(closes, period, step):
+    """Batch EMA of a list with the given step, for talib_ema_step's probe."""
+    stream = StreamingEMA(period, step)
+    return [stream.update(close) for close in closes][period - 1:]
+
+class StreamingSMA:
+    """Simple moving average; same running-total order as talib.SMA."""
+    __slots__ = ('period', 'window', 'total', 'value')
+
+    def __init__(self, period):
+        self.period = period
+        self.window = deque()
+        self.total = 0.0
+        self.value = nan
+
+    def update(self, close):
+        self.total += close
+        self.window.append(close)
+        if len(self.window) == self.period:
+            self.value = self.total / self.period
+            self.total -= self.window.popleft()
+        return self.value
+
+class StreamingEMA:
+    """Exponential moving average seeded with the SMA of the first `period` closes, like talib.EMA.
+
+    Each step rounds exactly as the installed TA-Lib does (see talib_ema_step),
+    unless `step` is given.
+    """
+    __slots__ = ('period', 'k', 'count', 'total', 'value', 'step')
+
+    def __init__(self, period, step=None):
+        self.period = period
+        self.k = 2.0 / (period + 1)
+        self.count = 0
+        self.total = 0.0
+        self.value = nan
+        self.step = talib_ema_step() if step is None else step
+
+    def update(self, close):
+        if self.count < self.period:
+            self.total += close
+            self.count += 1
+            if self.count == self.period:
+                self.value = self.total / self.period
+        else:
+            self.value = self.step(close, self.value, self.k)
+        return self.value
+
+class StreamingRSI:
+    """Wilder's RSI with the same averaging steps as talib.RSI."""
+    __slots__ = ('period', 'inv_period', 'count', 'prev_close', 'avg_gain', 'avg_loss', 'value', 'epsilon')
+
+    def __init__(self, period):
+        self.period = period
+        self.inv_period = 1.0 / period  # TA-Lib scales by the reciprocal rather than dividing
+        self.count = 0
+        self.prev_close = nan
+        self.avg_gain = 0.0
+        self.avg_loss = 0.0
+        self.value = nan
+        self.epsilon = talib_rsi_epsilon()
+
+    def update(self, close):
+        self.count += 1
+        if self.count == 1:
+            self.prev_close = close
+            return self.value
+
+        change = close - self.prev_close
+        self.prev_close = close
+        if self.count <= self.period + 1:
+            # Warm-up: plain sums of the first `period` changes, then averaged
+            if change < 0:
+                self.avg_loss -= change
+            else:
+                self.avg_gain += change
+            if self.count < self.period + 1:
+                return self.value
+            self.avg_loss *= self.inv_period
+            self.avg_gain *= self.inv_period
+        else:
+            self.avg_loss *= (self.period - 1)
+            self.avg_gain *= (self.period - 1)
+            if change < 0:
+                self.avg_loss -= change
+            else:
+                self.avg_gain += change
+            self.avg_loss *= self.inv_period
+            self.avg_gain *= self.inv_period
+
+        total = self.avg_gain + self.avg_loss
+        # A flat window gives 0, as in TA-Lib
+        self.value = 0.0 if total == 0 or -self.epsilon < total < self.epsilon else 100.0 * (self.avg_gain / total)
+        return self.value
+
+class StreamingVWAP:
+    """Cumulative VWAP of the typical price (high + low + close) / 3."""
+    __slots__ = ('cumulative_price_volume', 'cumulative_volume', 'value')
+
+    def __init__(self):
+        self.cumulative_price_volume = 0.0
+        self.cumulative_volume = 0.0
+        self.value = nan
+
+    def update(self, high, low, close, volume):
+        typical_price = (high + low + close) / 3
+        self.cumulative_price_volume += typical_price * volume
+        self.cumulative_volume += volume
+        self.value = divide(self.cumulative_price_volume, self.cumulative_volume)
+        return self.value
+
+class RollingSum:
+    """Fixed-window sum with the compensated add/remove steps pandas uses for rolling().sum()."""
+    __slots__ = ('period', 'window', 'total', 'add_compensation', 'remove_compensation',
+                 'same_value_count', 'prev_value')
+
+    def __init__(self, period):
+        self.period = period
+        self.window = deque()
+        self.total = 0.0
+        self.add_compensation = 0.0
+        self.remove_compensation = 0.0
+        self.same_value_count = 0
+        self.prev_value = nan
+
+    def update(self, value):
+        if len(self.window) == self.period:
+            y = -self.window.popleft() - self.remove_compensation
+            t = self.total + y
+            self.remove_compensation = t - self.total - y
+            self.total = t
+
+        y = value - self.add_compensation
+        t = self.total + y
+        self.add_compensation = t - self.total - y
+        self.total = t
+        # pandas returns value * n for a window of identical values to avoid rounding artifacts
+        self.same_value_count = self.same_value_count + 1 if value == self.prev_value else 1
+        self.prev_value = value
+        self.window.append(value)
+
+        if len(self.window) < self.period:
+            return nan
+        if self.same_value_count >= self.period:
+            return value * self.period
+        return self.total
+
+class StreamingVWMA:
+    """Volume weighted moving average: rolling sum(volume * close) / rolling sum(volume)."""
+    __slots__ = ('volume_sum', 'price_volume_sum', 'value')
+
+    def __init__(self, period):
+        self.volume_sum = RollingSum(period)
+        self.price_volume_sum = RollingSum(period)
+        self.value = nan
+
+    def update(self, close, volume):
+        cum_vol = self.volume_sum.update(volume)
+        cum_vol_close = self.price_volume_sum.update(volume * close)
+        self.value = divide(cum_vol_close, cum_vol)
+        return self.value
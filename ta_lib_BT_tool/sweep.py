@@ -0,0 +1,143 @@
+# Parallel parameter sweep over symbols, indicators and periods
+
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import ta_lib_backtest as bt
+from indicator_cache import data_fingerprint
+from indicator_matrix import signal_matrix
+from metrics import performance_metrics, periods_per_year
+from ohlcv_cache import bars_from_list, columns, load_cached_bars, slice_bars, bars_to_frame
+from simulation import simulate_balances_matrix
+
+# Per-worker bars and their fingerprints, filled once by init_worker and shared by every task in that process
+shared_bars = {}
+shared_fingerprints = {}
+shared_bars_per_year = None
+
+def parse_periods(specs):
+    """Expand period specs such as ['14', '5:200:5'] (inclusive ranges) into a sorted list."""
+    periods = set()
+    for spec in specs:
+        parts = [int(p) for p in str(spec).split(':')]
+        if len(parts) == 1:
+            periods.add(parts[0])
+        else:
+            start, stop = parts[0], parts[1]
+            step = parts[2] if len(parts) == 3 else 1
+            periods.update(range(start, stop + 1, step))
+    return sorted(periods)
+
+def build_tasks(symbols, indicators, periods, periods_per_task=25):
+    """Return (symbol, indicator, periods) tasks, each evaluating a block of periods at once; VWAP has no period."""
+    tasks = []
+    for symbol in symbols:
+        for indicator in indicators:
+            if indicator == 'VWAP':
+                tasks.append((symbol, indicator, (None,)))
+                continue
+            for i in range(0, len(periods), periods_per_task):
+                tasks.append((symbol, indicator, tuple(periods[i:i + periods_per_task])))
+    return tasks
+
+def init_worker(symbols, timeframe, since_ms, until_ms, exchange_id, cache_dir, resample_from=None):
+    """Memory-map each symbol's cached bars once per worker process.
+
+    The bars are read from the same cache key bt.load_bars filled, so with
+    `resample_from` they are the derived '<timeframe>_from_<base>' bars.
+    """
+    global shared_bars_per_year
+    shared_bars_per_year = periods_per_year(timeframe)
+    key = bt.bars_cache_key(timeframe, resample_from)
+    for symbol in symbols:
+        bars, _ = load_cached_bars(exchange_id, symbol, key, cache_dir, mmap=True)
+        if bars is None:  # Nothing could be stored, e.g. no complete bucket in the range
+            bars = bars_from_list([])
+        shared_bars[symbol] = slice_bars(bars, since_ms, until_ms)
+        shared_fingerprints[symbol] = data_fingerprint(*(shared_bars[symbol][col] for col in columns))
+
+def run_task(task):
+    """Back-test a block of periods on the worker's shared bars and summarize each one."""
+    symbol, indicator, periods = task
+    df = bars_to_frame(shared_bars[symbol])
+    close = df['close'].to_numpy(dtype='float64')
+    if indicator == 'VWAP':
+        df = bt.calculate_indicator(df, indicator, None, fingerprint=shared_fingerprints[symbol])
+        matrix = df['indicator'].to_numpy()[:, None]
+    else:
+        matrix = bt.calculate_indicator_matrix(df, indicator, periods, fingerprint=shared_fingerprints[symbol])
+    signals = signal_matrix(close, matrix, indicator)
+    balance_usdt, balance_btc, total_balance = simulate_balances_matrix(
+        close, signals, bt.usd_per_trade, bt.initial_usdt_balance)
+    metrics = performance_metrics(balance_usdt, balance_btc, total_balance, shared_bars_per_year)
+
+    if len(df):
+        final_balances = total_balance[-1]
+    else:
+        final_balances = np.full(len(periods), float(bt.initial_usdt_balance))
+    return [{
+        'symbol': symbol,
+        'indicator': indicator,
+        'period': period,
+        'bars': len(df),
+        'trades': int(metrics['trades'][j]),
+        'final_balance': float(final_balances[j]),
+        'return_pct': (float(final_balances[j]) / bt.initial_usdt_balance - 1) * 100,
+        'sharpe': float(metrics['sharpe'][j]),
+        'max_drawdown_pct': float(metrics['max_drawdown_pct'][j]),
+        'exposure_pct': float(metrics['exposure_pct'][j]),
+        'win_rate_pct': float(metrics['win_rate_pct'][j]),
+    } for j, period in enumerate(periods)]
+
+def run_sweep(symbols, timeframe, indicators, periods, start_date, end_date, workers=None, rank_by='final_balance'):
+    """Run every combination over a process pool and return a summary DataFrame ranked by `rank_by`."""
+    since_ms, until_ms = bt.date_range_ms(start_date, end_date)
+
+    # Fill the cache up front so workers only ever read bars from disk
+    for symbol in symbols:
+        bt.load_bars(symbol, timeframe, since_ms, until_ms)
+
+    tasks = build_tasks(symbols, indicators, periods)
+    workers = workers or os.cpu_count()
+    chunksize = max(1, len(tasks) // (workers * 4))
+    # Passed explicitly, as spawned workers start from the module defaults
+    initargs = (symbols, timeframe, since_ms, until_ms, bt.exchange_id, bt.cache_dir, bt.resample_from)
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=initargs) as executor:
+        results = [row for rows in executor.map(run_task, tasks, chunksize=chunksize) for row in rows]
+
+    summary = pd.DataFrame(results)
+    summary['period'] = summary['period'].astype('Int64')
+    # Lower is better for drawdown; NaN metrics (e.g. a Sharpe without trades) rank last
+    summary = summary.sort_values(rank_by, ascending=rank_by == 'max_drawdown_pct', ignore_index=True)
+    summary.insert(0, 'rank', range(1, len(summary) + 1))
+    return summary
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Sweep back-tests over symbols, indicators and periods.')
+    parser.add_argument('--symbols', nargs='+', default=['BTC/USDT'])
+    parser.add_argument('--indicators', nargs='+', default=['SMA', 'EMA', 'RSI'])
+    parser.add_argument('--periods', nargs='+', default=['5:200:5'],
+                        help="Periods or inclusive start:stop[:step] ranges, e.g. 14 5:200:5")
+    parser.add_argument('--timeframe', default='1h')
+    parser.add_argument('--start', default='2024-06-01')
+    parser.add_argument('--end', default='2024-06-30')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--resample-from', default=bt.resample_from,
+                        help='Build the timeframe from cached bars of this base timeframe, e.g. 1m')
+    parser.add_argument('--top', type=int, default=20, help='Rows of the ranked table to print')
+    parser.add_argument('--rank-by', default='final_balance',
+                        choices=['final_balance', 'sharpe', 'max_drawdown_pct', 'win_rate_pct'])
+    args = parser.parse_args()
+
+    bt.resample_from = args.resample_from
+    summary = run_sweep(args.symbols, args.timeframe, args.indicators, parse_periods(args.periods),
+                        args.start, args.end, workers=args.workers, rank_by=args.rank_by)
+
+    csv_filename = os.path.join(bt.output_dir, f'sweep_results_{args.timeframe}_{args.start}_{args.end}.csv')
+    summary.to_csv(csv_filename, index=False)
+    print(summary.head(args.top).to_string(index=False))
+    print(f'Sweep results exported to {csv_filename}')
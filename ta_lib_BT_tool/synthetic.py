@@ -0,0 +1,101 @@
+# Seeded synthetic market data (bars, order books, an exchange) for offline checks and benchmarks
+
+import asyncio
+
+import numpy as np
+import pandas as pd
+
+from ohlcv_cache import timeframe_to_ms
+
+def synthetic_ohlcv(n_bars, seed=42, start_price=60000.0, timeframe_ms=60_000, start='2024-06-01'):
+    """Generate a reproducible random-walk OHLCV DataFrame shaped like fetch_ohlcv output."""
+    rng = np.random.default_rng(seed)
+    returns = rng.normal(0.0, 0.002, n_bars)
+    close = start_price * np.exp(np.cumsum(returns))
+    open_ = np.empty(n_bars)
+    open_[0] = start_price
+    open_[1:] = close[:-1]
+    spread = np.abs(rng.normal(0.0, 0.001, n_bars)) * close
+    high = np.maximum(open_, close) + spread
+    low = np.minimum(open_, close) - spread
+    volume = rng.lognormal(2.0, 0.5, n_bars)
+
+    start_ms = int(pd.Timestamp(start).value // 1_000_000)
+    timestamp = start_ms + np.arange(n_bars, dtype=np.int64) * timeframe_ms
+
+    df = pd.DataFrame({
+        'timestamp': pd.to_datetime(timestamp, unit='ms'),
+        'open': open_,
+        'high': high,
+        'low': low,
+        'close': close,
+        'volume': volume,
+    })
+    return df
+
+def synthetic_order_book(timestamps, mid, depth=20, seed=42, tick=0.01, base_size=0.5):
+    """Generate reproducible L2 snapshots around `mid` as order_book.OrderBookStore arrays."""
+    rng = np.random.default_rng(seed)
+    n = len(timestamps)
+    spread = np.abs(rng.normal(0.0, 0.0001, n)) * mid + tick
+    steps = np.cumsum(rng.uniform(1, 5, (n, depth)), axis=1) * tick * 10
+    sizes = rng.lognormal(np.log(base_size), 0.7, (n, depth))
+    return {
+        'timestamp': np.asarray(timestamps, dtype=np.int64),
+        'bid_price': (mid - spread / 2)[:, None] - steps + steps[:, :1],
+        'bid_size': sizes,
+        'ask_price': (mid + spread / 2)[:, None] + steps - steps[:, :1],
+        'ask_size': sizes[:, ::-1].copy(),
+    }
+
+def synthetic_klines(timeframe, since, limit, now_ms):
+    """Return up to `limit` ccxt-style klines opening at or after `since`, like Binance, none opening after now_ms."""
+    timeframe_ms = timeframe_to_ms(timeframe)
+    first = -(-since // timeframe_ms) * timeframe_ms
+    timestamp = first + np.arange(limit, dtype=np.int64) * timeframe_ms
+    timestamp = timestamp[timestamp <= now_ms]
+    phase = timestamp / 86_400_000 * 2 * np.pi
+    close = 60000 + 1500 * np.sin(phase) + 300 * np.sin(phase * 7.3)
+    return [[int(t), c - 5, c + 20, c - 25, c, 1 + abs(c % 7)] for t, c in zip(timestamp.tolist(), close.tolist())]
+
+class SyntheticClient:
+    """Blocking stand-in for a ccxt exchange serving the same klines as SyntheticExchange, for fetch_bars."""
+
+    def __init__(self, now_ms):
+        self.now_ms = now_ms
+        self.calls = 0
+
+    def milliseconds(self):
+        return self.now_ms
+
+    def fetch_ohlcv(self, symbol, timeframe='1m', since=None, limit=1000):
+        self.calls += 1
+        return synthetic_klines(timeframe, since, limit, self.now_ms)
+
+class SyntheticExchange:
+    """Async stand-in for a ccxt.async_support exchange that serves synthetic klines.
+
+    Bars are a smooth function of their timestamp, so any page is consistent
+    with every other. `latency_s` delays each call and every `fail_every`-th
+    call raises ConnectionError, to exercise concurrency and retries offline.
+    """
+
+    def __init__(self, now_ms, latency_s=0.0, fail_every=0):
+        self.now_ms = now_ms
+        self.latency_s = latency_s
+        self.fail_every = fail_every
+        self.calls = 0
+
+    def milliseconds(self):
+        return self.now_ms
+
+    async def fetch_ohlcv(self, symbol, timeframe='1m', since=None, limit=1000):
+        self.calls += 1
+        call = self.calls
+        await asyncio.sleep(self.latency_s)
+        if self.fail_every and call % self.fail_every == 0:
+            raise ConnectionError('synthetic outage')
+        return synthetic_klines(timeframe, since, limit, self.now_ms)
+
+    async def close(self):
+        pass
@@ -1,18 +1,21 @@
 # Dynamic TA-Lib Back-Test Script for Binance
 
-import ccxt
-import key_file as k
-import pandas as pd
-import matplotlib.pyplot as plt
-import talib
+import numpy as np
 import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from indicator_cache import IndicatorCache, data_fingerprint
+from indicator_matrix import indicator_matrix
+from ohlcv_cache import fetch_bars, bars_to_frame, is_cached
+from resample import fetch_resampled_bars, is_resample_cached, resampled_key
+from results_io import result_extensions, save_results
+from simulation import simulate_balances_sparse
 
-# Initialize Binance exchange
-binance = ccxt.binance({
-    'enableRateLimit': True,
-    'apiKey': k.binance_api_key,
-    'secret': k.binance_api_secret
-})
+# Binance exchange, created on first use by get_exchange() so cached runs need no keys or network.
+# ccxt, TA-Lib and matplotlib are likewise only imported by the code paths that need them.
+exchange_id = 'binance'
+binance = None
+offline = False  # True never connects to the exchange; missing bars raise an error instead
 
 initial_usdt_balance = 1000  # Starting balance in USDT
 usd_per_trade = 100  # Amount in USD per trade
@@ -21,37 +24,117 @@ usd_per_trade = 100  # Amount in USD per trade
 output_dir = "backtests"
 os.makedirs(output_dir, exist_ok=True)
 
+# Downloaded bars are kept here so repeat back-tests do not hit the exchange
+cache_dir = "data_cache"
+# Set to a base timeframe such as '1m' to build every higher timeframe from its cached bars
+# (resample.py) instead of downloading each timeframe separately
+resample_from = None
+
+# Indicator results are memoized per (bars, indicator, period) so sweeps and reruns reuse them
+indicator_cache = IndicatorCache()
+indicator_inputs = {
+    'SMA': ['close'],
+    'EMA': ['close'],
+    'RSI': ['close'],
+    'VWAP': ['high', 'low', 'close', 'volume'],
+}
+
+def get_exchange():
+    """Return the Binance client, initializing it on first use."""
+    global binance
+    if binance is None:
+        import ccxt
+        import key_file as k
+        binance = ccxt.binance({
+            'enableRateLimit': True,
+            'apiKey': k.binance_api_key,
+            'secret': k.binance_api_secret
+        })
+    return binance
+
+def date_range_ms(start_date, end_date):
+    """Return inclusive millisecond bounds covering start_date through the end of end_date."""
+    def day_start_ms(date):
+        return int(datetime.strptime(date, '%Y-%m-%d').replace(tzinfo=timezone.utc).timestamp()) * 1000
+    return day_start_ms(start_date), day_start_ms(end_date) + 86_399_000
+
+def bars_cache_key(timeframe, base_timeframe=None):
+    """Return the cache key load_bars stores `timeframe` bars under when resampling from `base_timeframe`."""
+    if base_timeframe is not None and timeframe != base_timeframe:
+        return resampled_key(timeframe, base_timeframe)
+    return timeframe
+
+def load_bars(symbol, timeframe, since_ms, until_ms, mmap=False):
+    """Return cached column arrays for the range, connecting to Binance only if bars are missing."""
+    resample = resample_from is not None and timeframe != resample_from
+    if resample:
+        cached = is_resample_cached(exchange_id, symbol, timeframe, resample_from, since_ms, until_ms, cache_dir)
+    else:
+        cached = is_cached(exchange_id, symbol, timeframe, since_ms, until_ms, cache_dir)
+    if not cached and offline:
+        raise ValueError(f"{symbol} {timeframe} bars are not fully cached in {cache_dir} and offline mode is on")
+    exchange = None if cached else get_exchange()
+    if resample:
+        return fetch_resampled_bars(exchange, symbol, timeframe, since_ms, until_ms, base_timeframe=resample_from,
+                                    exchange_id=exchange_id, cache_dir=cache_dir, mmap=mmap)
+    return fetch_bars(exchange, symbol, timeframe, since_ms, until_ms,
+                      exchange_id=exchange_id, cache_dir=cache_dir, mmap=mmap)
+
 def fetch_ohlcv(symbol, timeframe, since, until):
-    """Fetch OHLCV data from Binance."""
-    since_timestamp = binance.parse8601(since + 'T00:00:00Z')
-    until_timestamp = binance.parse8601(until + 'T23:59:59Z')
-    bars = binance.fetch_ohlcv(symbol, timeframe=timeframe, since=since_timestamp)
-    
-    df = pd.DataFrame(bars, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
-    
-    # Filter data within the specified date range
-    df = df[(df['timestamp'] >= since) & (df['timestamp'] <= until)]
-    
-    return df
+    """Fetch OHLCV data from Binance, served from the local bar cache where possible."""
+    since_timestamp, until_timestamp = date_range_ms(since, until)
+    return bars_to_frame(load_bars(symbol, timeframe, since_timestamp, until_timestamp))
 
-def calculate_indicator(df, indicator, period):
-    """Calculate the specified TA-Lib indicator."""
+def compute_indicator(df, indicator, period):
+    """Compute the indicator columns for df as a dict of arrays."""
+    close = df['close'].to_numpy(dtype='float64')
+    if indicator in ['SMA', 'EMA', 'RSI']:
+        import talib
     if indicator == 'SMA':
-        df['indicator'] = talib.SMA(df['close'], timeperiod=period)
+        return {'indicator': talib.SMA(close, timeperiod=period)}
     elif indicator == 'EMA':
-        df['indicator'] = talib.EMA(df['close'], timeperiod=period)
+        return {'indicator': talib.EMA(close, timeperiod=period)}
     elif indicator == 'RSI':
-        df['indicator'] = talib.RSI(df['close'], timeperiod=period)
+        return {'indicator': talib.RSI(close, timeperiod=period)}
     elif indicator == 'VWAP':
-        typical_price = (df['high'] + df['low'] + df['close']) / 3
-        df['cumulative_price_volume'] = (typical_price * df['volume']).cumsum()
-        df['cumulative_volume'] = df['volume'].cumsum()
-        df['indicator'] = df['cumulative_price_volume'] / df['cumulative_volume']
-    else:
+        high = df['high'].to_numpy(dtype='float64')
+        low = df['low'].to_numpy(dtype='float64')
+        volume = df['volume'].to_numpy(dtype='float64')
+        typical_price = (high + low + close) / 3
+        cumulative_price_volume = np.cumsum(typical_price * volume)
+        cumulative_volume = np.cumsum(volume)
+        return {
+            'cumulative_price_volume': cumulative_price_volume,
+            'cumulative_volume': cumulative_volume,
+            'indicator': cumulative_price_volume / cumulative_volume,
+        }
+    raise ValueError(f"Unsupported indicator: {indicator}")
+
+def calculate_indicator(df, indicator, period, fingerprint=None):
+    """Calculate the specified TA-Lib indicator, reusing cached results for the same bars.
+
+    Pass `fingerprint` (see indicator_cache.data_fingerprint) when calling many
+    times on the same bars to skip hashing the input columns on every call.
+    """
+    if indicator not in indicator_inputs:
         raise ValueError(f"Unsupported indicator: {indicator}")
+    if fingerprint is None:
+        fingerprint = data_fingerprint(*(df[col].to_numpy(dtype='float64') for col in indicator_inputs[indicator]))
+    key = (fingerprint, indicator, None if indicator == 'VWAP' else period)
+    columns = indicator_cache.get_or_compute(key, lambda: compute_indicator(df, indicator, period))
+    for name, values in columns.items():
+        df[name] = values
     return df
 
+def calculate_indicator_matrix(df, indicator, periods, fingerprint=None):
+    """Calculate an SMA/EMA/RSI (bars x periods) float64 matrix in one batched pass, memoized like calculate_indicator."""
+    if fingerprint is None:
+        fingerprint = data_fingerprint(df['close'].to_numpy(dtype='float64'))
+    key = (fingerprint, indicator, tuple(int(p) for p in periods))
+    columns = indicator_cache.get_or_compute(
+        key, lambda: {'matrix': indicator_matrix(df['close'].to_numpy(dtype='float64'), indicator, periods)})
+    return columns['matrix']
+
 def generate_signals(df, indicator):
     """Generate trading signals based on the specified indicator."""
     df['signal'] = 0
@@ -64,86 +147,51 @@ def generate_signals(df, indicator):
     return df
 
 def simulate_trades(df, usd_per_trade, initial_usdt_balance):
-    """Simulate trades based on the signals."""
-    balance_usdt = initial_usdt_balance  # Starting balance in USDT
-    balance_btc = 0  # Starting balance in BTC (or ETH, or SOL)
+    """Simulate trades based on the signals, visiting only the bars where the signal flips."""
+    balance_usdt, balance_btc, total_balance = simulate_balances_sparse(
+        df['close'].to_numpy(dtype='float64'), df['signal'].to_numpy(), usd_per_trade, initial_usdt_balance)
     df['balance_usdt'] = balance_usdt
     df['balance_btc'] = balance_btc
-
-    for i in range(1, len(df)):
-        if df.loc[i, 'signal'] == 1 and df.loc[i-1, 'signal'] != 1:  # Buy signal
-            btc_to_buy = usd_per_trade / df.loc[i, 'close']
-            if balance_usdt >= usd_per_trade:
-                balance_btc += btc_to_buy
-                balance_usdt -= usd_per_trade
-        elif df.loc[i, 'signal'] == -1 and df.loc[i-1, 'signal'] != -1:  # Sell signal
-            usdt_to_sell = balance_btc * df.loc[i, 'close']
-            balance_usdt += usdt_to_sell
-            balance_btc = 0
-
-        df.loc[i, 'balance_usdt'] = balance_usdt
-        df.loc[i, 'balance_btc'] = balance_btc
-
-    df['total_balance'] = df['balance_usdt'] + df['balance_btc'] * df['close']
+    df['total_balance'] = total_balance
     return df
 
-def backtest_indicator(symbol, timeframe, indicator, period, start_date, end_date):
-    """Run the back-test for a given symbol, timeframe, indicator, and date range."""
+def backtest_indicator(symbol, timeframe, indicator, period, start_date, end_date, plot=True, show=True, chart_pool=None,
+                       results_format='csv'):
+    """Run the back-test for a given symbol, timeframe, indicator, and date range.
+
+    plot=False runs headless and skips the charts. With a chart_pool (e.g. a
+    ProcessPoolExecutor) the charts are rendered from the exported results in a
+    background process instead of blocking this run. results_format picks the
+    export: 'csv' (every column), 'npz' (result columns only, binary) or
+    'summary' (trade list and summary numbers only, see results_io).
+    """
     df = fetch_ohlcv(symbol, timeframe, start_date, end_date)
     df = calculate_indicator(df, indicator, period)
     df = generate_signals(df, indicator)
     df = simulate_trades(df, usd_per_trade, initial_usdt_balance)
     
-    # Export to CSV
-    csv_filename = os.path.join(output_dir, f'{indicator}_backtest_results_{symbol.replace("/", "_")}_{timeframe}_{start_date}_{end_date}.csv')
-    df.to_csv(csv_filename, index=False)
-    print(f'Back-test results exported to {csv_filename}')
+    # Export results
+    results_filename = os.path.join(output_dir, f'{indicator}_backtest_results_{symbol.replace("/", "_")}_{timeframe}_{start_date}_{end_date}{result_extensions[results_format]}')
+    save_results(df, results_filename, results_format, symbol=symbol, timeframe=timeframe, indicator=indicator,
+                 period=period, start_date=start_date, end_date=end_date)
+    print(f'Back-test results exported to {results_filename}')
     
     # Plot results
-    fig, ax1 = plt.subplots(figsize=(12, 6))
-    
-    # Plot price and indicator in the first chart
-    ax1.plot(df['timestamp'], df['close'], label='Close Price')
-    ax1.plot(df['timestamp'], df['indicator'], label=indicator)
-    
-    # Plot buy signals
-    buy_signals = df[df['signal'] == 1]
-    ax1.plot(buy_signals['timestamp'], buy_signals['close'], '^', markersize=10, color='g', label='Buy Signal')
-    
-    # Plot sell signals
-    sell_signals = df[df['signal'] == -1]
-    ax1.plot(sell_signals['timestamp'], sell_signals['close'], 'v', markersize=10, color='r', label='Sell Signal')
-    
-    ax1.legend()
-    ax1.set_title(f'{indicator} Back-Test Results for {symbol} ({timeframe})')
-    ax1.set_xlabel('Date')
-    ax1.set_ylabel('Price')
-    ax1.grid()
-    
-    # Save the price and indicator chart
-    plt_filename_price = os.path.join(output_dir, f'{indicator}_backtest_results_price_{symbol.replace("/", "_")}_{timeframe}_{start_date}_{end_date}.png')
-    plt.savefig(plt_filename_price)
-    print(f'Back-test price chart saved to {plt_filename_price}')
-    
-    # Plot total balance in a separate chart
-    fig, ax2 = plt.subplots(figsize=(12, 6))
-    ax2.plot(df['timestamp'], df['total_balance'], label='Total Balance')
-    ax2.legend()
-    ax2.set_title(f'Balance Over Time for {symbol} ({timeframe})')
-    ax2.set_xlabel('Date')
-    ax2.set_ylabel('Total Balance')
-    ax2.grid()
-    
-    # Save the balance chart
-    plt_filename_balance = os.path.join(output_dir, f'{indicator}_backtest_results_balance_{symbol.replace("/", "_")}_{timeframe}_{start_date}_{end_date}.png')
-    plt.savefig(plt_filename_balance)
-    print(f'Back-test balance chart saved to {plt_filename_balance}')
-    
-    plt.show()
+    if not plot:
+        return df
+    from charts import plot_backtest, render_from_results, report_chart_failure
+    if chart_pool is not None and results_format != 'summary':
+        future = chart_pool.submit(render_from_results, results_filename, symbol, timeframe, indicator, start_date, end_date, output_dir)
+        future.add_done_callback(report_chart_failure)
+    else:
+        # A summary holds no per-bar curve to render from, so those charts are drawn here
+        plot_backtest(df, symbol, timeframe, indicator, start_date, end_date, output_dir, show=show)
+    return df
 
 if __name__ == '__main__':
-    # Example usage
-    backtest_indicator('BTC/USDT', '1h', 'SMA', 20, '2024-06-01', '2024-06-30')
-    backtest_indicator('ETH/USDT', '1h', 'EMA', 20, '2024-06-01', '2024-06-30')
-    backtest_indicator('SOL/USDT', '1h', 'RSI', 14, '2024-06-01', '2024-06-30')
-    backtest_indicator('BTC/USDT', '1h', 'VWAP', 20, '2024-06-01', '2024-06-30')
+    # Example usage: charts are rendered by a background pool while the next back-test runs
+    with ProcessPoolExecutor(max_workers=2) as chart_pool:
+        backtest_indicator('BTC/USDT', '1h', 'SMA', 20, '2024-06-01', '2024-06-30', chart_pool=chart_pool)
+        backtest_indicator('ETH/USDT', '1h', 'EMA', 20, '2024-06-01', '2024-06-30', chart_pool=chart_pool)
+        backtest_indicator('SOL/USDT', '1h', 'RSI', 14, '2024-06-01', '2024-06-30', chart_pool=chart_pool)
+        backtest_indicator('BTC/USDT', '1h', 'VWAP', 20, '2024-06-01', '2024-06-30', chart_pool=chart_pool)
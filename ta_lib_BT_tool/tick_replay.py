@@ -0,0 +1,154 @@
+# Tick-replay back-test over aggTrades recorded by bootcamp_tools/recent_trades.py
+#
+# Trades are read one line at a time through generators and rolled up into
+# bars on the fly. Each closed bar goes through the streaming indicators, the
+# generate_signals rules and the simulate_trades rules, and its result row is
+# written out right away, so memory stays constant however large the file is.
+# On the same bars the output matches ta_lib_backtest's batch pipeline; the
+# EMA does so by rounding each step as the installed TA-Lib build does (see
+# streaming_indicators.talib_ema_step).
+
+import argparse
+import csv
+import glob
+import os
+
+import ta_lib_backtest as bt
+from ohlcv_cache import timeframe_to_ms
+from streaming_indicators import StreamingEMA, StreamingRSI, StreamingSMA, StreamingVWAP
+
+# recent_trades.py starts a new binance_trades_<date>.csv every day; the names sort in time order
+default_trades_files = sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bootcamp_tools',
+                                                     'binance_trades*.csv')))
+result_fields = ['timestamp', 'open', 'high', 'low', 'close', 'volume', 'trades', 'indicator', 'signal',
+                 'balance_usdt', 'balance_btc', 'total_balance']
+
+def read_trades(filenames, symbol=None):
+    """Yield (trade_time_ms, symbol, price, quantity, is_buyer_maker) for each trade recorded in `filenames`.
+
+    recent_trades.py writes 7 fields per row (event time, symbol, aggregate
+    trade id, price, quantity, trade time, is buyer maker) under an 8-name
+    header, so the fields are read by position. Rows that also carry the
+    first trade id are accepted too.
+    """
+    wanted = symbol.replace('/', '').upper() if symbol else None
+    for filename in [filenames] if isinstance(filenames, str) else filenames:
+        with open(filename, newline='') as f:
+            for row in csv.reader(f):
+                if not row or row[0].startswith('Event Time'):
+                    continue
+                row_symbol = row[1].strip()
+                if wanted and row_symbol != wanted:
+                    continue
+                trade_time, is_buyer_maker = (row[5], row[6]) if len(row) == 7 else (row[6], row[7])
+                yield int(trade_time), row_symbol, float(row[3]), float(row[4]), is_buyer_maker.strip() == 'True'
+
+def build_bars(trades, timeframe):
+    """Roll a trade stream up into [timestamp, open, high, low, close, volume, trades] bars.
+
+    A bar is yielded as soon as a trade for a later bar arrives (and the last
+    one at the end of the stream). Periods without trades produce no bar. A
+    trade arriving after its bar was closed is added to the current bar.
+    """
+    timeframe_ms = timeframe_to_ms(timeframe)
+    bar = None
+    for trade_time, _, price, quantity, _ in trades:
+        bar_time = trade_time - trade_time % timeframe_ms
+        if bar is None or bar_time > bar[0]:
+            if bar is not None:
+                yield bar
+            bar = [bar_time, price, price, price, price, quantity, 1]
+        else:
+            bar[2] = max(bar[2], price)
+            bar[3] = min(bar[3], price)
+            bar[4] = price
+            bar[5] += quantity
+            bar[6] += 1
+    if bar is not None:
+        yield bar
+
+def streaming_indicator(indicator, period):
+    """Return a function that takes a bar and returns the indicator value after it."""
+    if indicator == 'VWAP':
+        vwap = StreamingVWAP()
+        return lambda bar: vwap.update(bar[2], bar[3], bar[4], bar[5])
+    streams = {'SMA': StreamingSMA, 'EMA': StreamingEMA, 'RSI': StreamingRSI}
+    if indicator not in streams:
+        raise ValueError(f"Unsupported indicator: {indicator}")
+    stream = streams[indicator](period)
+    return lambda bar: stream.update(bar[4])
+
+def bar_signal(indicator, close, value):
+    """Return the generate_signals signal (1 buy, -1 sell, 0 hold) for one bar."""
+    signal = 0
+    if indicator in ['SMA', 'EMA', 'VWAP']:
+        if close > value:
+            signal = 1  # Buy signal
+        if close < value:
+            signal = -1 # Sell signal
+    elif indicator == 'RSI':
+        if value < 30:
+            signal = 1  # Buy signal
+        if value > 70:
+            signal = -1 # Sell signal
+    return signal
+
+def replay(bars, indicator, period, usd_per_trade, initial_usdt_balance):
+    """Run the indicator, signal and trade rules over a bar stream, yielding one result row per bar."""
+    update_indicator = streaming_indicator(indicator, period)
+    balance_usdt = initial_usdt_balance  # Starting balance in USDT
+    balance_btc = 0  # Starting balance in BTC (or ETH, or SOL)
+    prev_signal = None
+    for bar in bars:
+        price = bar[4]
+        value = update_indicator(bar)
+        signal = bar_signal(indicator, price, value)
+        if prev_signal is not None:
+            if signal == 1 and prev_signal != 1:  # Buy signal
+                btc_to_buy = usd_per_trade / price
+                if balance_usdt >= usd_per_trade:
+                    balance_btc += btc_to_buy
+                    balance_usdt -= usd_per_trade
+            elif signal == -1 and prev_signal != -1:  # Sell signal
+                usdt_to_sell = balance_btc * price
+                balance_usdt += usdt_to_sell
+                balance_btc = 0
+        prev_signal = signal
+        yield bar + [value, signal, balance_usdt, balance_btc, balance_usdt + balance_btc * price]
+
+def replay_backtest(filenames, symbol, timeframe, indicator, period, output_filename):
+    """Replay recorded trades for one symbol into a results CSV and return a small summary."""
+    bars = build_bars(read_trades(filenames, symbol), timeframe)
+    summary = {'bars': 0, 'trades': 0, 'final_balance': float(bt.initial_usdt_balance), 'max_drawdown_pct': 0.0}
+    peak = float('-inf')
+    prev_btc = 0
+    with open(output_filename, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(result_fields)
+        for row in replay(bars, indicator, period, bt.usd_per_trade, bt.initial_usdt_balance):
+            writer.writerow(row)
+            balance_btc, total_balance = row[-2], row[-1]
+            summary['bars'] += 1
+            summary['trades'] += balance_btc != prev_btc
+            prev_btc = balance_btc
+            peak = max(peak, total_balance)
+            summary['max_drawdown_pct'] = max(summary['max_drawdown_pct'], (1 - total_balance / peak) * 100)
+            summary['final_balance'] = total_balance
+    summary['return_pct'] = (summary['final_balance'] / bt.initial_usdt_balance - 1) * 100
+    return summary
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Back-test an indicator on recorded aggTrades.')
+    parser.add_argument('--file', nargs='+', default=default_trades_files,
+                        help='Trades CSV files written by recent_trades.py, oldest first')
+    parser.add_argument('--symbol', default='BTCUSDT')
+    parser.add_argument('--timeframe', default='1m', help='Bar size to build, e.g. 5s, 1m, 1h')
+    parser.add_argument('--indicator', default='SMA', choices=list(bt.indicator_inputs))
+    parser.add_argument('--period', type=int, default=20)
+    args = parser.parse_args()
+
+    csv_filename = os.path.join(bt.output_dir, f'{args.indicator}_replay_results_{args.symbol.replace("/", "_")}_{args.timeframe}.csv')
+    summary = replay_backtest(args.file, args.symbol, args.timeframe, args.indicator, args.period, csv_filename)
+    print(f'Replay results exported to {csv_filename}')
+    print(f"{summary['bars']} bars, {summary['trades']} trades, final balance {summary['final_balance']:.2f} USDT "
+          f"({summary['return_pct']:.2f}%), max drawdown {summary['max_drawdown_pct']:.2f}%")
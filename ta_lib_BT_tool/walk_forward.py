@@ -0,0 +1,109 @@
+# Walk-forward (rolling out-of-sample) evaluation of indicator periods
+
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import ta_lib_backtest as bt
+from indicator_matrix import signal_matrix
+from ohlcv_cache import bars_to_frame
+from simulation import simulate_balances_matrix
+from sweep import parse_periods
+
+# Per-worker copies of the full-series arrays, set once by init_worker
+shared_close = None
+shared_signals = None
+
+def make_folds(n_bars, train_bars, test_bars, step_bars=None):
+    """Return (train_start, test_start, test_end) row bounds for each rolling fold."""
+    step_bars = step_bars or test_bars
+    folds = []
+    start = 0
+    while start + train_bars + test_bars <= n_bars:
+        folds.append((start, start + train_bars, start + train_bars + test_bars))
+        start += step_bars
+    return folds
+
+def init_worker(close, signals):
+    """Keep the full-series close and signal matrix in the worker for every fold."""
+    global shared_close, shared_signals
+    shared_close = close
+    shared_signals = signals
+
+def run_fold(fold):
+    """Pick the best period on the train rows and run it on the following test rows."""
+    train_start, test_start, test_end = fold
+    _, _, train_total = simulate_balances_matrix(
+        shared_close[train_start:test_start], shared_signals[train_start:test_start],
+        bt.usd_per_trade, bt.initial_usdt_balance)
+    best = int(np.argmax(train_total[-1]))
+
+    _, _, test_total = simulate_balances_matrix(
+        shared_close[test_start:test_end], shared_signals[test_start:test_end, best:best + 1],
+        bt.usd_per_trade, bt.initial_usdt_balance)
+    return best, float(train_total[-1, best]), float(test_total[-1, 0])
+
+def walk_forward(symbol, timeframe, indicator, periods, start_date, end_date, train_bars, test_bars,
+                 step_bars=None, workers=None):
+    """Run a walk-forward evaluation and return one row per fold as a DataFrame.
+
+    The indicator is computed once over the whole history and sliced per fold,
+    so every fold sees the same warmed-up values a live run would have had.
+    """
+    since_ms, until_ms = bt.date_range_ms(start_date, end_date)
+    # Loaded once here, through bt.resample_from like every back-test; the workers only get the arrays
+    df = bars_to_frame(bt.load_bars(symbol, timeframe, since_ms, until_ms))
+
+    close = df['close'].to_numpy(dtype='float64')
+    matrix = bt.calculate_indicator_matrix(df, indicator, periods)
+    signals = signal_matrix(close, matrix, indicator)
+
+    folds = make_folds(len(df), train_bars, test_bars, step_bars)
+    if not folds:
+        raise ValueError(f"{len(df)} bars is not enough for one fold of {train_bars} train + {test_bars} test bars")
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(close, signals)) as executor:
+        results = list(executor.map(run_fold, folds))
+
+    rows = []
+    for (train_start, test_start, test_end), (best, train_balance, test_balance) in zip(folds, results):
+        rows.append({
+            'train_start': df['timestamp'].iloc[train_start],
+            'test_start': df['timestamp'].iloc[test_start],
+            'test_end': df['timestamp'].iloc[test_end - 1],
+            'period': periods[best],
+            'train_return_pct': (train_balance / bt.initial_usdt_balance - 1) * 100,
+            'test_final_balance': test_balance,
+            'test_return_pct': (test_balance / bt.initial_usdt_balance - 1) * 100,
+        })
+    return pd.DataFrame(rows)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Walk-forward evaluation of indicator periods.')
+    parser.add_argument('--symbol', default='BTC/USDT')
+    parser.add_argument('--timeframe', default='1h')
+    parser.add_argument('--indicator', default='SMA', choices=['SMA', 'EMA', 'RSI'])
+    parser.add_argument('--periods', nargs='+', default=['5:200:5'],
+                        help="Periods or inclusive start:stop[:step] ranges, e.g. 14 5:200:5")
+    parser.add_argument('--start', default='2024-01-01')
+    parser.add_argument('--end', default='2024-06-30')
+    parser.add_argument('--train-bars', type=int, default=24 * 30)
+    parser.add_argument('--test-bars', type=int, default=24 * 7)
+    parser.add_argument('--step-bars', type=int, default=None, help='Defaults to --test-bars')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--resample-from', default=bt.resample_from,
+                        help='Build the timeframe from cached bars of this base timeframe, e.g. 1m')
+    args = parser.parse_args()
+
+    bt.resample_from = args.resample_from
+    folds = walk_forward(args.symbol, args.timeframe, args.indicator, parse_periods(args.periods),
+                         args.start, args.end, args.train_bars, args.test_bars,
+                         step_bars=args.step_bars, workers=args.workers)
+
+    csv_filename = os.path.join(bt.output_dir, f'{args.indicator}_walk_forward_{args.symbol.replace("/", "_")}_{args.timeframe}_{args.start}_{args.end}.csv')
+    folds.to_csv(csv_filename, index=False)
+    print(folds.to_string(index=False))
+    print(f"Mean out-of-sample return: {folds['test_return_pct'].mean():.2f}% over {len(folds)} folds")
+    print(f'Walk-forward results exported to {csv_filename}')